@@ -0,0 +1,115 @@
+# Room stats collection for researchers through the Synapse admin API
+# Reads the joined rooms of every participant and the details of every room (member counts,
+# state size) concurrently with the admin token, instead of logging in as each participant.
+# The rows of the participants whose rooms could be read replace theirs in the room_stats_snapshot
+# table (dbs.RoomStatsTable); participants whose request failed keep their previous rows.
+
+import asyncio
+import os
+from datetime import datetime
+from m_monitor import SYNAPSE_URL, ADMIN_ACCESS_TOKEN, get_shared_client
+
+ADMIN_COLLECT_CONCURRENCY = int(os.getenv("ADMIN_COLLECT_CONCURRENCY", "20"))  # admin requests in flight
+
+
+class AdminStatsCollector:
+    """
+    Collects the joined rooms and room details of many participants with the Synapse admin API.
+    """
+
+    def __init__(self, synapse_url=None, admin_token=None, concurrency=ADMIN_COLLECT_CONCURRENCY):
+        self.synapse_url = synapse_url or SYNAPSE_URL
+        self.admin_token = admin_token or ADMIN_ACCESS_TOKEN
+        self.concurrency = concurrency
+        # Remove port if present in domain
+        self.domain = self.synapse_url.split('//')[1].split(':')[0] if self.synapse_url else None
+
+    async def _get(self, client, semaphore, path):
+        async with semaphore:
+            response = await client.get(
+                f"{self.synapse_url}{path}",
+                headers={"Authorization": f"Bearer {self.admin_token}"}
+            )
+        if response.status_code != 200:
+            print(f"Admin API request {path} failed: {response.status_code} - {response.text}")
+            return None
+        return response.json()
+
+    async def get_joined_rooms(self, client, semaphore, user_id):
+        """
+        Room IDs the participant has joined, or None if the request failed.
+        """
+        try:
+            data = await self._get(client, semaphore, f"/_synapse/admin/v1/users/@{user_id}:{self.domain}/joined_rooms")
+            return data.get("joined_rooms", []) if data is not None else None
+        except Exception as e:
+            print(f"Error while getting joined rooms of {user_id}: {str(e)}")
+            return None
+
+    async def get_room_details(self, client, semaphore, room_id):
+        try:
+            return await self._get(client, semaphore, f"/_synapse/admin/v1/rooms/{room_id}")
+        except Exception as e:
+            print(f"Error while getting details of room {room_id}: {str(e)}")
+            return None
+
+    def configured(self):
+        return bool(self.admin_token and self.synapse_url)
+
+    async def collect(self, user_ids, known_chats=None, progress=None):
+        """
+        Return (rows, failed_user_ids) for the given participants: snapshot rows with joined=True for
+        every room a participant has joined, and joined=False for the participant's known chats
+        (an iterable of (chat_id, user_id)) they are not in. Participants whose joined rooms could not
+        be read get no rows and are returned in failed_user_ids.
+        Each room is looked up once, however many participants share it.
+        progress(stage, done, total) is called as requests finish.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not self.configured():
+            print("Admin access token or Synapse URL not set. Cannot collect room stats.")
+            return [], user_ids
+        progress = progress or (lambda stage, done, total: None)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        client = get_shared_client()
+        done = 0
+
+        async def tracked(stage, total, coro):
+            nonlocal done
+            result = await coro
+            done += 1
+            progress(stage, done, total)
+            return result
+
+        joined = await asyncio.gather(*(
+            tracked("Participants", len(user_ids), self.get_joined_rooms(client, semaphore, user_id)) for user_id in user_ids
+        ))
+        joined = dict(zip(user_ids, joined))
+        failed_user_ids = [user_id for user_id, rooms in joined.items() if rooms is None]
+        memberships = {(user_id, room_id): True for user_id, rooms in joined.items() for room_id in rooms or []}
+        for chat_id, user_id in known_chats or []:
+            if joined.get(user_id) is not None:
+                memberships.setdefault((user_id, chat_id), False)
+        room_ids = list(dict.fromkeys(room_id for _, room_id in memberships))
+        done = 0
+        details = await asyncio.gather(*(
+            tracked("Rooms", len(room_ids), self.get_room_details(client, semaphore, room_id)) for room_id in room_ids
+        ))
+        details = {room_id: detail or {} for room_id, detail in zip(room_ids, details)}
+
+        collected_at = datetime.now()
+        rows = []
+        for (user_id, room_id), is_joined in memberships.items():
+            detail = details[room_id]
+            rows.append({
+                "chatid": room_id,
+                "userid": user_id,
+                "roomname": detail.get("name"),
+                "joined": is_joined,
+                "joinedmembers": detail.get("joined_members"),
+                "localmembers": detail.get("joined_local_members"),
+                "stateevents": detail.get("state_events"),
+                "collectedat": collected_at,
+            })
+        print(f"Collected room stats: {len(user_ids) - len(failed_user_ids)} of {len(user_ids)} participants, {len(room_ids)} rooms, {len(rows)} rows")
+        return rows, failed_user_ids
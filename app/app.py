@@ -9,10 +9,14 @@ st.set_page_config(
 )
 
 import bcrypt
+import uuid
 import pandas as pd
 from user_app import user_app
 from researcher_app import researcher_app
+from monitor_pool import monitor_pool
+import connectors
 import dbs
+import async_dbs
 
 
 # Custom CSS for styling
@@ -55,11 +59,21 @@ st.markdown("""
 
 db_name = "VoxPopuli" 
 
+# Reads of this browser session stay on the primary right after its own writes (read-your-writes),
+# while other sessions keep reading from the replicas
+if "db_caller" not in st.session_state:
+    st.session_state["db_caller"] = uuid.uuid4().hex
+connectors.set_caller(st.session_state["db_caller"])
+
 tables_dict = {
     "Users": dbs.UsersTable(),
     "Chats": dbs.ChatsTable(),
     "ChatsBlacklist": dbs.ChatsBlacklistTable(),
     "MessagesTable": dbs.MessagesTable(),
+    "RoomStats": dbs.RoomStatsTable(),
+    "AsyncUsers": async_dbs.AsyncUsersTable(),
+    "AsyncChats": async_dbs.AsyncChatsTable(),
+    "AsyncChatsBlacklist": async_dbs.AsyncChatsBlacklistTable(),
 }
 
 users, chats, chats_blacklist = (
@@ -96,6 +110,10 @@ if not st.session_state["logged_in"]:
         # Role selection and login
         # role = st.selectbox("Select Role", ["User", "Researcher"], key="role_select")
 
+        # Shown once, e.g. when the chat server session expired
+        if st.session_state.get("login_message"):
+            st.warning(st.session_state.pop("login_message"))
+
         # Set default user and password to blank when first entering the site
         userid = st.text_input("Username", key="userid_input", value="")
         password = st.text_input("Password", type="password", key="password_input", value="")
@@ -121,13 +139,17 @@ if not st.session_state["logged_in"]:
                         try:
                             # Check if the provided password matches the hashed password
                             if bcrypt.checkpw(password.encode('utf-8'), stored_hashed_password.encode('utf-8')):
-                                # Login successful for both user and researcher roles
-                                st.session_state["logged_in"] = True
-                                st.session_state["role"] = user_role
-                                st.session_state["user"] = user_data['UserID']
-                                st.session_state['password'] = password
-                                st.success("Login successful!")
-                                st.rerun()
+                                # Users log in to Matrix here, later page entries reuse the session
+                                # (see monitor_pool.py), so the password is not kept in the session state
+                                if user_role == "User" and monitor_pool.get(user_data['UserID'], password) is None:
+                                    st.error("Could not log in to the chat server. Please try again later.")
+                                else:
+                                    # Login successful for both user and researcher roles
+                                    st.session_state["logged_in"] = True
+                                    st.session_state["role"] = user_role
+                                    st.session_state["user"] = user_data['UserID']
+                                    st.success("Login successful!")
+                                    st.rerun()
                             else:
                                 st.error("Invalid password.")
                         except Exception as e:
@@ -161,7 +183,7 @@ if not st.session_state["logged_in"]:
 else:
     # Redirect to the appropriate app based on role
     if st.session_state["role"] == "User":
-        user_app(st.session_state["user"], tables_dict, st.session_state['password'])
+        user_app(st.session_state["user"], tables_dict)
     elif st.session_state["role"] == "Researcher":
         researcher_app(st.session_state["user"], tables_dict)
 
@@ -170,7 +192,6 @@ else:
         st.session_state["logged_in"] = False
         st.session_state["role"] = None
         st.session_state["user"] = None
-        st.session_state["password"] = None
         st.session_state["registration_mode"] = False
         st.session_state["registration_success"] = False
         st.session_state["registered_role"] = None
@@ -0,0 +1,164 @@
+from sqlalchemy import select, insert, update, not_
+from datetime import datetime
+import connectors
+import dbs
+
+# Async variants of the table classes in dbs.py, on the asyncpg driver.
+# They share the table definitions and lookup caches with dbs.py, so a write through either
+# layer invalidates the same cache entries. Every method opens its own AsyncSession, which lets
+# callers run several table calls and Matrix calls concurrently with asyncio.gather.
+
+AsyncSession = connectors.AsyncSession
+
+
+class AsyncUsersTable:
+    def __init__(self):
+        self.users_table = dbs.users_table
+        self.cache = dbs.users_cache
+
+    async def delete_user(self, user_id):
+        """
+        Soft-delete a user by setting the 'deleted' column to True.
+        """
+        async with AsyncSession() as session:
+            try:
+                stmt = update(self.users_table).where(self.users_table.c.userid == user_id).values(
+                    deleted=True,
+                    lastupdate=datetime.now()
+                )
+                await session.execute(stmt)
+                await session.commit()
+                self.cache.invalidate(user_id)
+            except Exception as e:
+                await session.rollback()
+                print(f"Error in async delete_user: {e}")
+
+
+class AsyncChatsTable:
+    """
+    Async table handler for chat records in the database.
+    """
+    def __init__(self):
+        self.chats_table = dbs.chats_table
+        self.cache = dbs.chats_cache
+
+    def _invalidate(self, user_id, chat_id=None):
+        """
+        Drop cached lookups for a user's chats (same keys as dbs.ChatsTable).
+        """
+        if chat_id is None:
+            self.cache.invalidate_where(lambda key: key[0] == user_id)
+        else:
+            self.cache.invalidate((user_id, chat_id), (user_id, None))
+
+    async def update_all_chats(self, chats_dict, userid):
+        """
+        Update all chats in the provided list/dict. Adds new chats if not present, updates names if changed.
+        Existing chats are read with one query and all changes are written in one transaction.
+        """
+        chats_dict = list(chats_dict)
+        if not chats_dict:
+            return
+        chat_ids = [chat.get("ChatID") for chat in chats_dict]
+        async with AsyncSession() as session:
+            try:
+                existing = (await session.execute(
+                    select(self.chats_table.c.chatid, self.chats_table.c.chatname).where(
+                        (self.chats_table.c.userid == userid) & (self.chats_table.c.chatid.in_(chat_ids))
+                    )
+                )).fetchall()
+                existing_names = {row[0]: row[1] for row in existing}
+                now = datetime.now()
+                new_chats = []
+                for chat in chats_dict:
+                    chat_id = chat.get("ChatID")
+                    chat_name = chat.get("Chat Name") or "Unknown Chat"
+                    if chat_id in existing_names:  # check if needed to update chat name
+                        if existing_names[chat_id] != chat_name:
+                            await session.execute(update(self.chats_table).where(
+                                (self.chats_table.c.chatid == chat_id) & (self.chats_table.c.userid == userid)
+                            ).values(chatname=chat_name, updatedat=now))
+                    else:  # if chat not in db, add it
+                        existing_names[chat_id] = chat_name
+                        new_chats.append({
+                            'chatid': chat_id,
+                            'chatname': chat_name,
+                            'platform': chat.get("Platform"),
+                            'userid': userid,
+                            'createdat': now,
+                            'updatedat': now,
+                        })
+                if new_chats:
+                    await session.execute(insert(self.chats_table), new_chats)
+                await session.commit()
+            except Exception as e:
+                await session.rollback()
+                print(f"Error in async update_all_chats: {e}")
+            finally:
+                self._invalidate(userid)
+
+    async def change_active_status_for_chats(self, chat_ids, user_id):
+        """
+        Toggle the active status of several chats of a user in one transaction.
+        Returns {chat_id: new status} for the chats that exist.
+        """
+        chat_ids = list(chat_ids)
+        if not chat_ids:
+            return {}
+        condition = (self.chats_table.c.chatid.in_(chat_ids)) & (self.chats_table.c.userid == user_id)
+        async with AsyncSession() as session:
+            try:
+                await session.execute(update(self.chats_table).where(condition).values(
+                    active=not_(self.chats_table.c.active),
+                    updatedat=datetime.now()
+                ))
+                result = (await session.execute(
+                    select(self.chats_table.c.chatid, self.chats_table.c.active).where(condition)
+                )).fetchall()
+                await session.commit()
+                return {row[0]: row[1] for row in result}
+            except Exception as e:
+                await session.rollback()
+                print(f"Error in async change_active_status_for_chats: {e}")
+                return {}
+            finally:
+                self._invalidate(user_id)
+
+    async def disable_all_rooms_for_user(self, userid):
+        """
+        Disable all rooms for a user.
+        """
+        async with AsyncSession() as session:
+            try:
+                stmt = update(self.chats_table).where(self.chats_table.c.userid == userid).values(active=False, updatedat=datetime.now())
+                await session.execute(stmt)
+                await session.commit()
+                self._invalidate(userid)
+            except Exception as e:
+                await session.rollback()
+                print(f"Error in async disable_all_rooms_for_user: {e}")
+
+
+class AsyncChatsBlacklistTable:
+    def __init__(self):
+        self.chats_blacklist_table = dbs.chats_blacklist_table
+        self.cache = dbs.blacklist_cache
+
+    async def get_all_ids(self, userid):
+        """
+        Fetch the set of chat IDs in the blacklist for a specific user, served from the lookup cache when possible.
+        """
+        hit, value = self.cache.lookup(userid)
+        if hit:
+            return value
+        async with AsyncSession() as session:
+            try:
+                result = (await session.execute(
+                    select(self.chats_blacklist_table.c.chatid)
+                    .where(self.chats_blacklist_table.c.userid == userid)
+                )).fetchall()
+            except Exception as e:
+                await session.rollback()
+                print(f"Error in async get_all_ids: {e}")
+                return set()
+        return self.cache.store(userid, {row[0] for row in result}, value)
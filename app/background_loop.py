@@ -0,0 +1,122 @@
+# BackgroundLoop: a long-lived asyncio event loop in a daemon thread
+# Streamlit reruns the page script in a new thread for every interaction, so tasks and connections
+# that must outlive one rerun (sync workers, pooled HTTP clients) are scheduled on this loop instead.
+
+import asyncio
+import atexit
+import queue
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+
+class BackgroundLoop:
+    """
+    An event loop running forever in its own daemon thread. Coroutines are submitted from any
+    thread and their results are waited for with concurrent.futures.
+    """
+
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        """
+        Start the loop thread if it is not running yet, and return the loop.
+        """
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.loop = asyncio.new_event_loop()
+                started = threading.Event()
+                self.thread = threading.Thread(target=self._run, args=(self.loop, started), name=self.name, daemon=True)
+                self.thread.start()
+                started.wait()
+            return self.loop
+
+    @staticmethod
+    def _run(loop, started):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def submit(self, coro):
+        """
+        Schedule coro on the loop and return a concurrent.futures.Future with its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.start())
+
+    def run(self, coro, timeout=None):
+        """
+        Run coro on the loop and block the calling thread until it is done.
+        """
+        if self.thread is threading.current_thread():
+            raise RuntimeError("BackgroundLoop.run() called from the loop thread, await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def stop(self):
+        """
+        Cancel the pending tasks and stop the loop thread.
+        """
+        with self.lock:
+            loop, thread = self.loop, self.thread
+            self.loop = self.thread = None
+        if loop is None or not loop.is_running():
+            return
+
+        async def cancel_tasks():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_tasks(), loop).result(5)
+        except Exception as e:
+            print(f"Error while stopping {self.name}: {str(e)}")
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+
+
+_background_loop = BackgroundLoop("matrix-loop")
+atexit.register(_background_loop.stop)
+
+
+def get_background_loop():
+    """
+    The process-wide background loop, started on first use.
+    """
+    _background_loop.start()
+    return _background_loop
+
+
+def run_async(coro, timeout=None):
+    """
+    Run a coroutine from synchronous (Streamlit) code on the background loop and return its result.
+    Use this instead of asyncio.run(): the loop and its pooled HTTP and database connections
+    outlive the call, and so do tasks it starts.
+    """
+    return get_background_loop().run(coro, timeout)
+
+
+def run_async_with_progress(coro_factory, progress):
+    """
+    Like run_async, for a coroutine that reports progress: coro_factory(report) builds the coroutine,
+    and every report(*args) call is passed on to progress(*args) in the calling thread, because
+    Streamlit elements can only be updated from the script thread.
+    """
+    updates = queue.SimpleQueue()
+    future = get_background_loop().submit(coro_factory(lambda *args: updates.put(args)))
+    while True:
+        try:
+            future.result(timeout=0.1)
+            finished = True
+        except FutureTimeoutError:
+            finished = False
+        while not updates.empty():
+            progress(*updates.get())
+        if finished:
+            return future.result()
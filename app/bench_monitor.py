@@ -0,0 +1,116 @@
+# Load test harness for MultiPlatformMessageMonitor against the in-process MockSynapse (mock_synapse.py)
+# Times room listing, invite approval and QR code retrieval for users with 10 to 10,000 rooms:
+#   python bench_monitor.py --rooms 10 100 1000 10000 --latency 0.005
+#   python bench_monitor.py --rooms 1000 --rate-limit 20   # Synapse-like rate limiting of joins and messages
+# No homeserver, bridges or database are needed. Room caches and tokens go to a temporary directory.
+
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import tempfile
+import time
+
+MOCK_URL = "http://mock-synapse"
+PLATFORMS = ["whatsapp", "signal", "telegram"]
+
+# Set before m_monitor and room_cache read them at import time: the bots must be the mock's, and
+# the benchmark users' room caches and tokens must not end up next to the real ones
+BENCH_DIR = tempfile.mkdtemp(prefix="voxpopuli_bench_")
+os.environ["ROOM_CACHE_DIR"] = os.path.join(BENCH_DIR, "room_cache")
+os.environ["TOKEN_STORE_DIR"] = os.path.join(BENCH_DIR, "tokens")
+for platform in PLATFORMS:
+    os.environ[f"{platform.upper()}_BOT_MXID"] = f"@{platform}bot:{MOCK_URL.split('//')[1]}"
+
+from m_monitor import MultiPlatformMessageMonitor  # noqa: E402
+from mock_synapse import MockSynapse  # noqa: E402
+
+
+class Timer:
+    """
+    Times monitor calls and counts the requests the mock served for each of them.
+    """
+
+    def __init__(self, mock, verbose=False):
+        self.mock = mock
+        self.verbose = verbose
+        self.rows = []
+
+    def output(self):
+        # The monitor prints every room it lists, keep that out of the results unless asked for
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    async def __call__(self, label, coro):
+        self.mock.reset_stats()
+        with self.output():
+            start = time.perf_counter()
+            result = await coro
+            elapsed = (time.perf_counter() - start) * 1000
+        self.rows.append((label, elapsed, sum(self.mock.requests.values()), self.mock.rate_limited))
+        return result
+
+
+async def bench_rooms(mock, count, qr_runs, verbose):
+    """
+    Seed a user with `count` joined rooms and `count` pending invites, then time the monitor calls.
+    """
+    username = f"bench_{count}"
+    user_id = mock.add_user(username, "password")
+    mock.add_rooms(user_id, count, membership="join", seed=count)
+    invites = mock.add_rooms(user_id, count, membership="invite", seed=count + 1)
+    timer = Timer(mock, verbose)
+    with timer.output():
+        monitor = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL, platforms=PLATFORMS)
+
+    if not await timer("login", monitor.login()):
+        print(f"Login of {username} failed")
+        return timer.rows
+    joined = await timer("list_rooms joined (cold cache)", monitor.list_rooms("joined"))
+    await timer("list_rooms joined (warm cache)", monitor.list_rooms("joined"))
+    invited = await timer("list_rooms invited", monitor.list_rooms("invited"))
+    approved = await timer(f"approve_rooms ({len(invites)} invites)", monitor.approve_rooms(invites))
+    await timer("list_rooms joined (after approve)", monitor.list_rooms("joined"))
+    qr_codes = [await timer(f"generate_qr whatsapp (run {run + 1})", monitor.generate_qr("whatsapp")) for run in range(qr_runs)]
+
+    if len(joined) != count or len(invited) != count:
+        print(f"  ! listed {len(joined)} joined rooms and {len(invited)} invites, expected {count} each")
+    if sum(approved.values()) != len(invites):
+        print(f"  ! approved {sum(approved.values())} of {len(invites)} invites")
+    if any(qr is None for qr in qr_codes):
+        print(f"  ! {sum(qr is None for qr in qr_codes)} of {qr_runs} QR codes not received")
+    return timer.rows
+
+
+async def run_benchmark(args):
+    mock = MockSynapse(MOCK_URL, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                       rate_limit_burst=args.rate_limit_burst, bot_delay=args.bot_delay)
+    async with mock.installed():
+        for count in args.rooms:
+            print(f"\nRooms: {count} joined + {count} invited")
+            rows = await bench_rooms(mock, count, args.qr_runs, args.verbose)
+            for label, elapsed, requests, rate_limited in rows:
+                print(f"  {label:<38} {elapsed:10.1f} ms  requests={requests:<6} rate limited={rate_limited}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Matrix monitor against an in-process mock Synapse")
+    parser.add_argument("--rooms", type=int, nargs="+", default=[10, 100, 1000, 10000], help="Rooms per user to test (default: 10 100 1000 10000)")
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds the mock waits per request (default: 0.005)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency variation as a fraction (default: 0.2)")
+    parser.add_argument("--rate-limit", type=float, default=None, help="POST/PUT requests per second per user before 429s (default: no limit)")
+    parser.add_argument("--rate-limit-burst", type=int, default=10, help="Burst size of the rate limit (default: 10)")
+    parser.add_argument("--bot-delay", type=float, default=0.05, help="Seconds before a bridge bot replies (default: 0.05)")
+    parser.add_argument("--qr-runs", type=int, default=3, help="QR codes requested per room count (default: 3)")
+    parser.add_argument("--verbose", action="store_true", help="Show the monitor's output and the HTTP request log")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    print(f"Mock Synapse: latency={args.latency}s rate limit={args.rate_limit or 'none'} bot delay={args.bot_delay}s (scratch files in {BENCH_DIR})")
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
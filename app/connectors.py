@@ -1,9 +1,16 @@
 from google.cloud.sql.connector import Connector
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, MetaData, event, make_url
+from sqlalchemy.orm import sessionmaker, Session as OrmSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import asyncio
+import contextvars
+import itertools
+import threading
+import time
 from dotenv import load_dotenv
 import os
 from google.cloud import storage
+from query_stats import query_stats
 
 load_dotenv()
 bucket_name = os.getenv("BUCKET_NAME")
@@ -11,6 +18,21 @@ users_db_user = os.getenv("users_db_user")
 users_db_pass = os.getenv("users_db_pass")
 db_name = os.getenv("db_name") 
 matrix_db_connection_string = os.getenv("matrix-db-connection-string")
+# Database backend for the primary:
+#   cloudsql - Cloud SQL connector with pg8000 (default)
+#   postgres - any PostgreSQL reachable through DATABASE_URL (e.g. a local instance)
+#   sqlite   - a local SQLite file at SQLITE_PATH, for offline development and benchmarking
+database_url = os.getenv("DATABASE_URL")
+db_backend = os.getenv("DB_BACKEND", "postgres" if database_url else "cloudsql").lower()
+sqlite_path = os.getenv("SQLITE_PATH", "voxpopuli.db")
+# Optional read replicas: comma-separated SQLAlchemy URLs and/or Cloud SQL connection names
+read_replica_urls = [u.strip() for u in os.getenv("READ_REPLICA_URLS", "").split(",") if u.strip()]
+read_replica_connection_names = [n.strip() for n in os.getenv("READ_REPLICA_CONNECTION_NAMES", "").split(",") if n.strip()]
+# Seconds after a commit during which reads stay on the primary (read-your-writes)
+replica_lag_grace = float(os.getenv("REPLICA_LAG_GRACE", "5"))
+# Connection pool of the async engine: kept connections and extra connections under load
+async_pool_size = int(os.getenv("ASYNC_POOL_SIZE", "5"))
+async_max_overflow = int(os.getenv("ASYNC_MAX_OVERFLOW", "10"))
 
  
 class gcp_connector:
@@ -26,23 +48,147 @@ class gcp_connector:
     
 
 
-def getconn():
-    with Connector() as connector:
-        conn = connector.connect(
-            matrix_db_connection_string,  # Cloud SQL connection name
-            "pg8000",
-            user=users_db_user,
-            password=users_db_pass,
-            db=db_name
-        )
-        return conn
+def cloud_sql_creator(connection_name):
+    """
+    Return a DBAPI connection factory for the given Cloud SQL instance.
+    """
+    def getconn():
+        with Connector() as connector:
+            conn = connector.connect(
+                connection_name,  # Cloud SQL connection name
+                "pg8000",
+                user=users_db_user,
+                password=users_db_pass,
+                db=db_name
+            )
+            return conn
+    return getconn
 
-engine = create_engine(
-    "postgresql+pg8000://",
-    creator=getconn,
-)
+getconn = cloud_sql_creator(matrix_db_connection_string)
+
+def enable_sqlite_wal(dbapi_connection, connection_record):
+    """
+    Let readers and the writer work concurrently on the SQLite file.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+if db_backend == "cloudsql":
+    engine = create_engine(
+        "postgresql+pg8000://",
+        creator=getconn,
+    )
+elif db_backend == "postgres":
+    if not database_url:
+        raise ValueError("DB_BACKEND=postgres requires DATABASE_URL")
+    engine = create_engine(database_url)
+elif db_backend == "sqlite":
+    # The module-level session is shared by Streamlit's script threads
+    engine = create_engine(f"sqlite:///{sqlite_path}", connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", enable_sqlite_wal)
+else:
+    raise ValueError(f"Unsupported DB_BACKEND: {db_backend} (expected cloudsql, postgres or sqlite)")
+
+# Replicas only serve reads, so they run in autocommit mode and never hold a transaction open
+replica_engines = [create_engine(url, isolation_level="AUTOCOMMIT") for url in read_replica_urls] + [
+    create_engine("postgresql+pg8000://", creator=cloud_sql_creator(name), isolation_level="AUTOCOMMIT")
+    for name in read_replica_connection_names
+]
 
 Session = sessionmaker(bind=engine)
 session = Session()
+read_sessions = [sessionmaker(bind=replica_engine)() for replica_engine in replica_engines]
 metadata = MetaData()
 
+# Caller (e.g. a Streamlit browser session) on whose behalf statements run, set with set_caller().
+# Coroutines submitted to the background loop inherit it, so async commits are attributed too.
+current_caller = contextvars.ContextVar("current_caller", default=None)
+last_write_at = {}  # caller -> time of its last commit, only kept within the replica lag grace
+last_write_lock = threading.Lock()
+replica_counter = itertools.count()
+
+
+def set_caller(caller):
+    """
+    Attribute the following commits and reads of this thread (or task) to the given caller.
+    """
+    current_caller.set(caller)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def mark_write(committed_session):
+    """
+    Record the time of the caller's last commit (sync or async session) for read-your-writes routing.
+    """
+    now = time.monotonic()
+    with last_write_lock:
+        for caller in [c for c, at in last_write_at.items() if now - at >= replica_lag_grace]:
+            del last_write_at[caller]
+        last_write_at[current_caller.get()] = now
+
+
+def get_read_session(caller=None):
+    """
+    Return the session to use for read-only queries of the given caller (default: the current one).
+    Reads go to the replicas round-robin, except when no replica is configured or the caller
+    committed within the replica lag grace window, in which case they stay on the primary.
+    Commits of other callers do not move the reads off the replicas.
+    """
+    if not read_sessions:
+        return session
+    caller = current_caller.get() if caller is None else caller
+    with last_write_lock:
+        written_at = last_write_at.get(caller)
+    if written_at is not None and time.monotonic() - written_at < replica_lag_grace:
+        return session
+    return read_sessions[next(replica_counter) % len(read_sessions)]
+
+
+async_connector = None  # Cloud SQL connector of the background loop, reused for every async connection
+
+
+async def getconn_async():
+    global async_connector
+    if async_connector is None:
+        async_connector = Connector(loop=asyncio.get_running_loop())
+    conn = await async_connector.connect_async(
+        matrix_db_connection_string,  # Cloud SQL connection name
+        "asyncpg",
+        user=users_db_user,
+        password=users_db_pass,
+        db=db_name
+    )
+    return conn
+
+# Async engine for code paths that interleave DB and Matrix I/O in one event loop.
+# asyncpg and aiosqlite connections are bound to the loop that opened them, so the async tables
+# are only used from the background loop (background_loop.run_async), which lets the pool keep
+# connections open across UI actions.
+async_pool_options = dict(pool_size=async_pool_size, max_overflow=async_max_overflow, pool_pre_ping=True, pool_recycle=1800)
+if db_backend == "cloudsql":
+    async_engine = create_async_engine(
+        "postgresql+asyncpg://",
+        async_creator=getconn_async,
+        **async_pool_options,
+    )
+elif db_backend == "postgres":
+    async_engine = create_async_engine(
+        make_url(database_url).set(drivername="postgresql+asyncpg"),
+        **async_pool_options,
+    )
+else:
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{sqlite_path}",
+        **async_pool_options,
+    )
+
+AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+# Per-statement timing, row counts, pool wait and slow-query log (see query_stats.py)
+query_stats.instrument(engine, "primary")
+for i, replica_engine in enumerate(replica_engines):
+    query_stats.instrument(replica_engine, f"replica-{i + 1}")
+query_stats.instrument(async_engine.sync_engine, "async")
+
@@ -1,10 +1,13 @@
-from sqlalchemy import Table, Column, String, Boolean, Date, select, insert, update, delete,ForeignKeyConstraint
+from sqlalchemy import Table, Column, String, Boolean, Date, DateTime, Integer, select, insert, update, delete,ForeignKeyConstraint, func, distinct, null, literal, union_all, tuple_
 import pandas as pd
 from datetime import datetime
 import connectors
 import os
 from dotenv import load_dotenv
 from io import StringIO
+from cachetools import TTLCache
+import threading
+import copy
 load_dotenv()
 
 
@@ -45,10 +48,190 @@ chats_blacklist_table = Table(
     Column('userid', String, primary_key=True)
 )
 
+
+# Room stats collected with the Synapse admin API (admin_collector.py), replaced per participant on every collection
+room_stats_table = Table(
+    'room_stats_snapshot', metadata,
+    Column('chatid', String, primary_key=True),
+    Column('userid', String, primary_key=True),
+    Column('roomname', String),
+    Column('joined', Boolean),
+    Column('joinedmembers', Integer),
+    Column('localmembers', Integer),
+    Column('stateevents', Integer),
+    Column('collectedat', DateTime)
+)
+
+room_stats_columns_renaming = {
+    'chatid': 'ChatID',
+    'userid': 'UserID',
+    'roomname': 'Room Name',
+    'joined': 'Joined',
+    'joinedmembers': 'Members',
+    'localmembers': 'Local Members',
+    'stateevents': 'State Events',
+    'collectedat': 'Collected At',
+}
+
+chats_columns_renaming = {
+    'chatid': 'ChatID',
+    'chatname': 'Chat Name',
+    'platform': 'Platform',
+    'userid': 'UserID',
+    'active': 'Donated',
+    'createdat': 'CreatedAt',
+    'updatedat': 'UpdatedAt',
+}
+
+
+def user_row_to_dict(row):
+    """
+    Convert a users row to the dict returned by get_user_by_id.
+    """
+    d = dict(row._mapping)
+    return {
+        'UserID': d.get('userid'),
+        'HashedPassword': d.get('hashedpassword'),
+        'Role': d.get('role'),
+        'Creator': d.get('creator'),
+        'Active': d.get('active'),
+        'CreatedAt': d.get('createdat'),
+        'Deleted': d.get('deleted'),
+    }
+
+
+def chat_row_to_dict(row):
+    """
+    Convert a chats row to the dict returned by get_chat_by_id.
+    """
+    d = dict(row._mapping)
+    return {
+        'ChatID': d.get('chatid'),
+        'Chat Name': d.get('chatname'),
+        'Platform': d.get('platform'),
+        'UserID': d.get('userid'),
+        'CreatedAt': d.get('createdat'),
+        'UpdatedAt': d.get('updatedat')
+    }
+
+
+def user_chats_to_df(result):
+    """
+    Convert the chats rows of a user to the DataFrame returned by get_chats_by_user.
+    """
+    chats_df = pd.DataFrame(result) if result else pd.DataFrame(columns=['ChatID', 'Chat Name', 'Platform', 'UserID', 'Donated', 'CreatedAt', 'UpdatedAt',])
+    return chats_df.rename(columns=chats_columns_renaming)
+
+
+class LookupCache:
+    """
+    Thread-safe read-through cache for table lookups, bounded by TTL and size.
+    Write methods invalidate the keys they touch. Hit/miss counters are kept so
+    the effect of the cache can be inspected with cache_stats().
+    """
+    def __init__(self, name, maxsize=1024, ttl=60):
+        self.name = name
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.lock = threading.RLock()
+        self.generation = 0  # bumped on every invalidation, guards against storing stale loads
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for key, or call loader() and cache its result.
+        None results are not cached. Callers get a copy, so they may mutate it freely.
+        """
+        hit, value = self.lookup(key)
+        if hit:
+            return value
+        return self.store(key, loader(), value)
+
+    def lookup(self, key):
+        """
+        Return (True, value) on a hit, or (False, generation) on a miss.
+        The generation must be passed to store() once the value is loaded; this split lets
+        async callers await the load themselves.
+        """
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                return True, copy.copy(self.cache[key])
+            self.misses += 1
+            return False, self.generation
+
+    def store(self, key, value, generation):
+        """
+        Cache a value loaded after a lookup() miss and return a copy of it.
+        """
+        if value is None:
+            return None
+        with self.lock:
+            if generation == self.generation:  # skip if a write happened while loading
+                self.cache[key] = value
+        return copy.copy(value)
+
+    def invalidate(self, *keys):
+        """
+        Drop the given keys from the cache.
+        """
+        with self.lock:
+            self.generation += 1
+            for key in keys:
+                self.cache.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """
+        Drop every key for which predicate(key) is true.
+        """
+        with self.lock:
+            self.generation += 1
+            for key in [k for k in list(self.cache.keys()) if predicate(k)]:
+                self.cache.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+
+    def stats(self):
+        """
+        Return hit/miss counters and current size of the cache.
+        """
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'Cache': self.name,
+                'Hits': self.hits,
+                'Misses': self.misses,
+                'Hit Rate': round(self.hits / total, 3) if total else 0.0,
+                'Size': len(self.cache),
+                'Max Size': self.cache.maxsize,
+                'TTL (s)': self.cache.ttl,
+            }
+
+
+# Module-level caches so they survive Streamlit reruns (dbs is imported once per process)
+cache_ttl = int(os.getenv("DB_CACHE_TTL", "60"))
+cache_maxsize = int(os.getenv("DB_CACHE_MAXSIZE", "2048"))
+users_cache = LookupCache('users', maxsize=cache_maxsize, ttl=cache_ttl)
+chats_cache = LookupCache('chats', maxsize=cache_maxsize, ttl=cache_ttl)
+blacklist_cache = LookupCache('chats_blacklist', maxsize=cache_maxsize, ttl=cache_ttl)
+room_stats_cache = LookupCache('room_stats', maxsize=1, ttl=cache_ttl)
+
+
+def cache_stats():
+    """
+    Return hit/miss statistics for all lookup caches as a DataFrame.
+    """
+    return pd.DataFrame([users_cache.stats(), chats_cache.stats(), blacklist_cache.stats(), room_stats_cache.stats()])
+
+
 class UsersTable:
     def __init__(self):
         self.users_table = users_table
         self.chats = chats_table
+        self.cache = users_cache
 
     def add_user(self, user_id, hashed_password, creator_id, role='User', active=True):
         """
@@ -65,16 +248,54 @@ class UsersTable:
             )
             session.execute(stmt)
             session.commit()
+            self.cache.invalidate(user_id)
         except Exception as e:
             session.rollback()
             print(f"Error in add_user: {e}")
 
+    def add_users(self, users, creator_id, role='User', active=True):
+        """
+        Add many users in one transaction. users is a list of (user_id, hashed_password) pairs.
+        Returns the list of user_ids that were added. If the batch fails (e.g. one user already exists),
+        the users are added one by one so only the conflicting rows are skipped.
+        """
+        if not users:
+            return []
+        now = datetime.now()
+        rows = [{
+            'userid': user_id,
+            'hashedpassword': hashed_password,
+            'role': role,
+            'creator': creator_id,
+            'active': active,
+            'createdat': now,
+        } for user_id, hashed_password in users]
+        try:
+            session.execute(insert(self.users_table), rows)
+            session.commit()
+            added = [row['userid'] for row in rows]
+        except Exception as e:
+            session.rollback()
+            print(f"Error in add_users, adding users one by one: {e}")
+            added = []
+            for row in rows:
+                try:
+                    session.execute(insert(self.users_table).values(**row))
+                    session.commit()
+                    added.append(row['userid'])
+                except Exception as row_error:
+                    session.rollback()
+                    print(f"Error in add_users for {row['userid']}: {row_error}")
+        self.cache.invalidate(*added)
+        return added
+
     def get_users(self):
         """
         Fetch all users as a DataFrame.
         """
+        read_session = connectors.get_read_session()
         # Fetch from SQLAlchemy, then rename columns as required
-        result = session.execute(select(
+        result = read_session.execute(select(
             self.users_table.c.userid,
             self.users_table.c.role,
             self.users_table.c.creator,
@@ -88,6 +309,51 @@ class UsersTable:
         else:
             df = pd.DataFrame(columns=columns)
         return df
+
+    def get_user_ids(self):
+        """
+        Fetch only the IDs of all users that are not deleted.
+        """
+        read_session = connectors.get_read_session()
+        try:
+            result = read_session.execute(
+                select(self.users_table.c.userid).where(self.users_table.c.deleted==False)
+            ).scalars().all()
+            return list(result)
+        except Exception as e:
+            read_session.rollback()
+            print(f"Error in get_user_ids: {e}")
+            return []
+
+    def get_users_page(self, after=None, limit=50, search=None, role=None, active=None):
+        """
+        Fetch one page of users using keyset pagination on userid.
+        Search (case-insensitive substring of userid) and filters are applied in SQL, so only
+        `limit` rows are transferred per call.
+        Returns (DataFrame, next_cursor); next_cursor is None on the last page.
+        """
+        read_session = connectors.get_read_session()
+        columns = ['UserID', 'Role', 'Creator', 'Active', 'CreatedAt', 'UpdatedAt']
+        c = self.users_table.c
+        stmt = select(c.userid, c.role, c.creator, c.active, c.createdat, c.lastupdate).where(c.deleted == False)
+        if after is not None:
+            stmt = stmt.where(c.userid > after)
+        if search:
+            stmt = stmt.where(c.userid.icontains(search, autoescape=True))
+        if role:
+            stmt = stmt.where(c.role == role)
+        if active is not None:
+            stmt = stmt.where(c.active == active)
+        stmt = stmt.order_by(c.userid).limit(limit + 1)  # one extra row tells us if there is a next page
+        try:
+            result = read_session.execute(stmt).fetchall()
+        except Exception as e:
+            read_session.rollback()
+            print(f"Error in get_users_page: {e}")
+            return pd.DataFrame(columns=columns), None
+        next_cursor = result[limit - 1][0] if len(result) > limit else None
+        df = pd.DataFrame(result[:limit], columns=columns) if result else pd.DataFrame(columns=columns)
+        return df, next_cursor
     
     def change_active_status_for_user(self, user_id):
         """
@@ -107,6 +373,7 @@ class UsersTable:
                 )
                 session.execute(stmt)
                 session.commit()
+                self.cache.invalidate(user_id)
                 return new_status
             return None
         except Exception as e:
@@ -116,23 +383,21 @@ class UsersTable:
 
     def get_user_by_id(self, user_id):
         """
-        Fetch a single user by their user_id.
+        Fetch a single user by their user_id, served from the lookup cache when possible.
+        """
+        return self.cache.get_or_load(user_id, lambda: self._load_user_by_id(user_id))
+
+    def _load_user_by_id(self, user_id):
+        """
+        Fetch a single user by their user_id from the database.
+        Always reads the primary: login and status checks must see the latest writes.
         """
         try:
             result = session.execute(
                 select(self.users_table).where(self.users_table.c.userid == user_id)
             ).fetchone()
             if result:
-                d = dict(result._mapping)
-                return {
-                    'UserID': d.get('userid'),
-                    'HashedPassword': d.get('hashedpassword'),
-                    'Role': d.get('role'),
-                    'Creator': d.get('creator'),
-                    'Active': d.get('active'),
-                    'CreatedAt': d.get('createdat'),
-                    'Deleted': d.get('deleted'),
-                }
+                return user_row_to_dict(result)
             return None
         except Exception as e:
             session.rollback()
@@ -146,15 +411,18 @@ class UsersTable:
         # If you have an Email column, implement this
         return None
 
-    def get_users_by_ids(self, user_ids):
+    def get_users_by_ids(self, user_ids, primary=False):
         """
         Fetch multiple users by a list of user_ids.
+        Pass primary=True when the result decides a write (e.g. whether a username is taken),
+        so replica lag cannot hide a user that was just added.
         Returns a list of user dicts, or an empty list if none found.
         """
+        read_session = session if primary else connectors.get_read_session()
         if not user_ids:
             return []
         try:
-            result = session.execute(
+            result = read_session.execute(
                 select(self.users_table).where(self.users_table.c.userid.in_(user_ids))
             ).fetchall()
             users = []
@@ -169,7 +437,7 @@ class UsersTable:
                 })
             return users
         except Exception as e:
-            session.rollback()
+            read_session.rollback()
             print(f"Error in get_users_by_ids: {e}")
             return []
         
@@ -184,6 +452,7 @@ class UsersTable:
             )
             session.execute(stmt)
             session.commit()
+            self.cache.invalidate(user_id)
         except Exception as e:
             session.rollback()
             print(f"Error in change_user_password: {e}")
@@ -199,6 +468,7 @@ class UsersTable:
             )
             session.execute(stmt)
             session.commit()
+            self.cache.invalidate(user_id)
         except Exception as e:
             session.rollback()
             print(f"Error in delete_user: {e}")
@@ -211,6 +481,17 @@ class ChatsTable:
     """
     def __init__(self):
         self.chats_table = chats_table
+        self.cache = chats_cache
+
+    def _invalidate(self, user_id, chat_id=None):
+        """
+        Drop cached lookups for a user's chats. If chat_id is None, drop all of the user's chats.
+        Keys are (user_id, chat_id) for single chats and (user_id, None) for the user's chat list.
+        """
+        if chat_id is None:
+            self.cache.invalidate_where(lambda key: key[0] == user_id)
+        else:
+            self.cache.invalidate((user_id, chat_id), (user_id, None))
 
     def add_chat(self, chat_id, chat_name, platform, user_id):
         """
@@ -229,6 +510,7 @@ class ChatsTable:
             )
             session.execute(stmt)
             session.commit()
+            self._invalidate(user_id, chat_id)
         except Exception as e:
             session.rollback()
             print(f"Error in add_chat: {e}")
@@ -245,6 +527,7 @@ class ChatsTable:
             ).values(chatname=chat_name, updatedat=datetime.now())
             session.execute(stmt)
             session.commit()
+            self._invalidate(user_id, chat_id)
         except Exception as e:
             session.rollback()
             print(f"Error in update_chat_name: {e}")
@@ -259,6 +542,7 @@ class ChatsTable:
             ).values(updatedat=datetime.now())
             session.execute(stmt)
             session.commit()
+            self._invalidate(user_id, chat_id)
         except Exception as e:
             session.rollback()
             print(f"Error in update_chat_donation: {e}")
@@ -284,25 +568,130 @@ class ChatsTable:
         """
         Fetch all chats as a DataFrame with renamed columns.
         """
-        result = session.execute(select(self.chats_table)).fetchall()
+        read_session = connectors.get_read_session()
+        result = read_session.execute(select(self.chats_table)).fetchall()
         if not result:
             return pd.DataFrame()
         df = pd.DataFrame(result, columns=result[0]._mapping.keys())
-        columns_renaming = {
-            'chatid': 'ChatID',
-            'chatname': 'Chat Name',
-            'platform': 'Platform',
-            'userid': 'UserID',
-            'active': 'Donated',
-            'createdat': 'CreatedAt',
-            'updatedat': 'UpdatedAt',
-        }
-        df = df.rename(columns=columns_renaming)
+        df = df.rename(columns=chats_columns_renaming)
         return df
 
+    def get_chats_by_keys(self, keys, batch_size=500):
+        """
+        Fetch only the chats with the given (chatid, userid) keys as a DataFrame with renamed columns.
+        The keys are sent in batches of `batch_size` to keep each IN list bounded.
+        """
+        read_session = connectors.get_read_session()
+        columns = ['ChatID', 'Chat Name', 'Platform', 'UserID', 'CreatedAt', 'UpdatedAt', 'Donated']
+        c = self.chats_table.c
+        keys = list(dict.fromkeys((str(chat_id), str(user_id)) for chat_id, user_id in keys))
+        rows = []
+        try:
+            for start in range(0, len(keys), batch_size):
+                stmt = select(c.chatid, c.chatname, c.platform, c.userid, c.createdat, c.updatedat, c.active).where(
+                    tuple_(c.chatid, c.userid).in_(keys[start:start + batch_size])
+                )
+                rows.extend(read_session.execute(stmt).fetchall())
+        except Exception as e:
+            read_session.rollback()
+            print(f"Error in get_chats_by_keys: {e}")
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame(columns=columns)
+
+    def get_chats_page(self, after=None, limit=50, search=None, platform=None, donated=None, user_id=None):
+        """
+        Fetch one page of chats using keyset pagination on the (chatid, userid) primary key.
+        Search (case-insensitive substring of the chat name) and filters are applied in SQL.
+        `after` is the (chatid, userid) cursor returned by the previous call.
+        Returns (DataFrame, next_cursor); next_cursor is None on the last page.
+        """
+        read_session = connectors.get_read_session()
+        columns = ['ChatID', 'Chat Name', 'Platform', 'UserID', 'CreatedAt', 'UpdatedAt', 'Donated']
+        c = self.chats_table.c
+        stmt = select(c.chatid, c.chatname, c.platform, c.userid, c.createdat, c.updatedat, c.active)
+        if after is not None:
+            stmt = stmt.where(tuple_(c.chatid, c.userid) > tuple_(*after))
+        if search:
+            stmt = stmt.where(c.chatname.icontains(search, autoescape=True))
+        if platform:
+            stmt = stmt.where(c.platform.in_(platform) if isinstance(platform, (list, tuple, set)) else c.platform == platform)
+        if donated is not None:
+            stmt = stmt.where(c.active == donated)
+        if user_id:
+            stmt = stmt.where(c.userid == user_id)
+        stmt = stmt.order_by(c.chatid, c.userid).limit(limit + 1)
+        try:
+            result = read_session.execute(stmt).fetchall()
+        except Exception as e:
+            read_session.rollback()
+            print(f"Error in get_chats_page: {e}")
+            return pd.DataFrame(columns=columns), None
+        next_cursor = (result[limit - 1][0], result[limit - 1][3]) if len(result) > limit else None
+        df = pd.DataFrame(result[:limit], columns=columns) if result else pd.DataFrame(columns=columns)
+        return df, next_cursor
+
+    def get_project_metrics(self):
+        """
+        Compute the project metrics in SQL instead of loading the chats table into pandas.
+        A single statement returns one totals row and one row per platform, so only a handful
+        of rows are transferred regardless of the table size.
+        Returns a dict with unique/total (donated) chat counts, unique users and a Series
+        of donated chats per platform.
+        """
+        read_session = connectors.get_read_session()
+        c = self.chats_table.c
+        donated = c.active == True
+
+        def aggregate(platform, is_total):
+            return select(
+                platform.label('platform'),
+                literal(is_total).label('is_total'),
+                func.count(distinct(c.chatid)).label('unique_chats'),
+                func.count(distinct(c.chatid)).filter(donated).label('unique_donated_chats'),
+                func.count().label('total_chats'),
+                func.count().filter(donated).label('total_donated_chats'),
+                func.count(distinct(c.userid)).label('unique_users'),
+            )
+
+        metrics = {
+            'unique_chats': 0,
+            'unique_donated_chats': 0,
+            'total_chats': 0,
+            'total_donated_chats': 0,
+            'unique_users': 0,
+            'platform_counts': pd.Series(dtype=int, name='Platform'),
+        }
+        try:
+            stmt = union_all(
+                aggregate(null(), True),
+                aggregate(c.platform, False).group_by(c.platform),
+            )
+            rows = read_session.execute(stmt).fetchall()
+        except Exception as e:
+            read_session.rollback()
+            print(f"Error in get_project_metrics: {e}")
+            return metrics
+        platform_counts = {}
+        for row in rows:
+            d = row._mapping
+            if d['is_total']:
+                for key in ['unique_chats', 'unique_donated_chats', 'total_chats', 'total_donated_chats', 'unique_users']:
+                    metrics[key] = d[key] or 0
+            elif d['total_donated_chats']:
+                platform_counts[d['platform']] = d['total_donated_chats']
+        metrics['platform_counts'] = pd.Series(platform_counts, dtype=int, name='Platform').sort_values(ascending=False)
+        return metrics
+
     def get_chat_by_id(self, chat_id, user_id):
         """
-        Fetch a single chat by its chat_id and user_id.
+        Fetch a single chat by its chat_id and user_id, served from the lookup cache when possible.
+        """
+        return self.cache.get_or_load((user_id, chat_id), lambda: self._load_chat_by_id(chat_id, user_id))
+
+    def _load_chat_by_id(self, chat_id, user_id):
+        """
+        Fetch a single chat by its chat_id and user_id from the database.
+        Always reads the primary, since update_all_chats writes based on the result.
         """
         result = session.execute(
             select(self.chats_table).where(
@@ -310,34 +699,23 @@ class ChatsTable:
             )
         ).fetchone()
         if result:
-            d = dict(result._mapping)
-            return {
-                'ChatID': d.get('chatid'),
-                'Chat Name': d.get('chatname'),
-                'Platform': d.get('platform'),
-                'UserID': d.get('userid'),
-                'CreatedAt': d.get('createdat'),
-                'UpdatedAt': d.get('updatedat')
-            }
+            return chat_row_to_dict(result)
         return None
 
     def get_chats_by_user(self, user_id):
         """
-        Fetch all chats for a given user_id.
+        Fetch all chats for a given user_id, served from the lookup cache when possible.
+        """
+        return self.cache.get_or_load((user_id, None), lambda: self._load_chats_by_user(user_id))
+
+    def _load_chats_by_user(self, user_id):
+        """
+        Fetch all chats for a given user_id from the database.
+        Always read from the primary: participants must see the chats and donations they just changed,
+        whatever the replica lag, and the lookup cache already keeps this off the hot path.
         """
         result = session.execute(select(self.chats_table).where(self.chats_table.c.userid == user_id)).fetchall()
-        chats_df = pd.DataFrame(result) if result else pd.DataFrame(columns=['ChatID', 'Chat Name', 'Platform', 'UserID', 'Donated', 'CreatedAt', 'UpdatedAt',])
-        columns_renaming = {
-            'chatname': 'Chat Name',
-            'chatid': 'ChatID',
-            'platform': 'Platform',
-            'userid': 'UserID',
-            'active': 'Donated',
-            'createdat': 'CreatedAt',
-            'updatedat': 'UpdatedAt',
-        }
-        chats_df = chats_df.rename(columns=columns_renaming)
-        return chats_df
+        return user_chats_to_df(result)
     
     def change_active_status_for_chat(self, chat_id, user_id):
         """
@@ -362,6 +740,7 @@ class ChatsTable:
                 )
                 session.execute(stmt)
                 session.commit()
+                self._invalidate(user_id, chat_id)
                 return new_status
             return None
         except Exception as e:
@@ -379,6 +758,7 @@ class ChatsTable:
             )
             session.execute(stmt)
             session.commit()
+            self._invalidate(user_id, chat_id)
         except Exception as e:
             session.rollback()
             print(f"Error in delete_chat_by_id: {e}")
@@ -386,6 +766,7 @@ class ChatsTable:
     def get_whitelisted_rooms_by_user(self, userid):
         """
         Return a list of chat IDs (strings) of the user that appear in chat_projects.
+        Always reads the primary, it is sent to the server right after the donation changes are saved.
         """
         try:
             # Get all chat IDs for this user from chats table
@@ -412,6 +793,7 @@ class ChatsTable:
             stmt = update(self.chats_table).where(self.chats_table.c.userid == userid).values(active=False, updatedat=datetime.now())
             session.execute(stmt)
             session.commit()
+            self._invalidate(userid)
         except Exception as e:
             session.rollback()
             print(f"Error in disable_rooms_by_user: {e}")
@@ -420,21 +802,27 @@ class ChatsTable:
 class ChatsBlacklistTable:
     def __init__(self):
         self.chats_blacklist_table = chats_blacklist_table
+        self.cache = blacklist_cache
 
     def get_all_ids(self, userid):
         """
-        Fetch all chat IDs in the blacklist for a specific user.
+        Fetch the set of chat IDs in the blacklist for a specific user, served from the lookup cache when possible.
         """
+        chat_ids = self.cache.get_or_load(userid, lambda: self._load_all_ids(userid))
+        return chat_ids if chat_ids is not None else set()
+
+    def _load_all_ids(self, userid):
+        read_session = connectors.get_read_session()
         try:
-            result = session.execute(
+            result = read_session.execute(
                 select(self.chats_blacklist_table.c.chatid)
                 .where(self.chats_blacklist_table.c.userid == userid)
             ).fetchall()
-            return [row[0] for row in result] if result else []
+            return {row[0] for row in result}
         except Exception as e:
-            session.rollback()
+            read_session.rollback()
             print(f"Error in get_all_ids: {e}")
-            return []
+            return None
 
     def add_chat(self, chat_id, userid):
         """
@@ -450,6 +838,59 @@ class ChatsBlacklistTable:
             session.rollback()
             if 'duplicate key' not in str(e):
                 print(f"Error in add_id: {e}")
+        finally:
+            self.cache.invalidate(userid)
+
+
+class RoomStatsTable:
+    """
+    Snapshot of per-participant room stats from the Synapse admin API, joined into the Chats Overview.
+    The table is created by migrations/001_room_stats_snapshot.sql.
+    """
+    def __init__(self):
+        self.room_stats_table = room_stats_table
+        self.cache = room_stats_cache
+
+    def replace_snapshot(self, rows, user_ids, batch_size=500):
+        """
+        Replace the snapshot rows of the given participants with the given rows (dicts with the table's
+        column names) in one transaction. Rows of other participants are kept.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        try:
+            for start in range(0, len(user_ids), batch_size):
+                session.execute(delete(self.room_stats_table).where(self.room_stats_table.c.userid.in_(user_ids[start:start + batch_size])))
+            if rows:
+                session.execute(insert(self.room_stats_table), rows)
+            session.commit()
+            return True
+        except Exception as e:
+            session.rollback()
+            print(f"Error in replace_snapshot: {e}")
+            return False
+        finally:
+            self.cache.clear()
+
+    def get_df(self):
+        """
+        Return the snapshot as a DataFrame, served from the lookup cache when possible.
+        An empty DataFrame is returned if it cannot be read (e.g. the migration was not applied yet).
+        """
+        df = self.cache.get_or_load('all', self._load_df)
+        return df if df is not None else pd.DataFrame(columns=list(room_stats_columns_renaming.values()))
+
+    def _load_df(self):
+        read_session = connectors.get_read_session()
+        columns = list(room_stats_columns_renaming.values())
+        try:
+            result = read_session.execute(select(self.room_stats_table)).fetchall()
+        except Exception as e:
+            read_session.rollback()
+            print(f"Error in room stats get_df: {e}")
+            return None
+        if not result:
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame(result, columns=[c.name for c in self.room_stats_table.columns]).rename(columns=room_stats_columns_renaming)
 
 
 class MessagesTable:
@@ -9,8 +9,15 @@ from datetime import datetime, timezone
 import logging
 import sys
 import re
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
+from room_cache import RoomMetadataCache
+from token_store import token_store
+from resilient_http import ResilientClient
 # from io import BytesIO
 import qrcode
 # import argparse
@@ -33,6 +40,72 @@ TELEGRAM_BOT_MXID = os.getenv("TELEGRAM_BOT_MXID")
 SIGNAL_BOT_MXID = os.getenv("SIGNAL_BOT_MXID")
 ADMIN_ACCESS_TOKEN = os.getenv("ADMIN_ACCESS_TOKEN")
 
+# HTTP client settings for Synapse
+try:
+    import h2  # noqa: F401 -- HTTP/2 support for httpx
+    HTTP2_ENABLED = os.getenv("MATRIX_HTTP2", "true").lower() == "true"
+except ImportError:
+    HTTP2_ENABLED = False
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("MATRIX_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("MATRIX_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("MATRIX_KEEPALIVE_EXPIRY", "30")),
+)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+# Rooms whose metadata is fetched at the same time when listing rooms
+ROOM_FETCH_CONCURRENCY = int(os.getenv("ROOM_FETCH_CONCURRENCY", "20"))
+
+# Joins/leaves in flight for batch room approval and leave (approve_rooms, leave_rooms)
+ROOM_ACTION_CONCURRENCY = int(os.getenv("ROOM_ACTION_CONCURRENCY", "10"))
+# Joined rooms checked for a bridge bot direct chat that is neither cached nor in m.direct
+BOT_DM_SCAN_LIMIT = int(os.getenv("BOT_DM_SCAN_LIMIT", "50"))
+# Seconds to wait for the bridge bot's QR code, and for its reply to the first message
+QR_TIMEOUT = float(os.getenv("QR_TIMEOUT", "60"))
+BOT_REPLY_TIMEOUT = float(os.getenv("BOT_REPLY_TIMEOUT", "10"))
+# Seconds before its expiry that an access token is refreshed
+TOKEN_REFRESH_MARGIN = 60
+
+# How detect_room_platform finds the bridge of a joined room: "snapshot" reads the members once
+# (see snapshot_room), "probe" asks for the membership of each bridge bot in turn
+ROOM_PLATFORM_DETECTION = os.getenv("ROOM_PLATFORM_DETECTION", "snapshot").lower()
+
+# Bridge info state events set by the mautrix bridges (MSC2346), they name the bridged protocol
+BRIDGE_STATE_TYPES = ["m.bridge", "uk.half-shot.bridge"]
+ROOM_STATE_TYPES = ["m.room.name", "m.room.member"] + BRIDGE_STATE_TYPES
+# /sync filter for room discovery: only the state needed for the room list. Member events are
+# lazy-loaded, so the response does not carry every member of large group chats. State changes of
+# incremental syncs arrive in the timeline, so it is limited to the same event types.
+ROOM_DISCOVERY_FILTER = json.dumps({
+    "presence": {"types": []},
+    "account_data": {"types": []},
+    "room": {
+        "state": {"types": ROOM_STATE_TYPES, "lazy_load_members": True},
+        "timeline": {"types": ROOM_STATE_TYPES, "limit": 20, "lazy_load_members": True},
+        "ephemeral": {"types": []},
+        "account_data": {"types": []},
+    },
+})
+
+# One pooled client per event loop (and TLS verification setting), shared by all monitors on that loop.
+# httpx connections are bound to the loop that opened them, so a client is never reused across loops.
+# It is wrapped in a ResilientClient: retries, rate limit handling and circuit breaking (resilient_http.py).
+_shared_clients = weakref.WeakKeyDictionary()  # loop -> {verify: ResilientClient}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_client(verify=False):
+    """
+    Return the pooled httpx client for the running event loop, creating it if needed.
+    """
+    loop = asyncio.get_running_loop()
+    with _shared_clients_lock:
+        clients = _shared_clients.setdefault(loop, {})
+        client = clients.get(verify)
+        if client is None or client.is_closed:
+            client = ResilientClient(httpx.AsyncClient(verify=verify, timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=HTTP2_ENABLED))
+            clients[verify] = client
+        return client
+
 
 class BridgeConfig:
     """
@@ -56,10 +129,16 @@ class MultiPlatformMessageMonitor:
         self.username = username
         self.password = password
         self.access_token = None
+        self.refresh_token = None
+        self.token_expires_at = None  # time.time() at which the access token expires, None if it does not
         self.user_id = None
         self.next_batch = None
         self.bridge_rooms = {}  # Dict of room_id -> bridge_info mappings
         self.synapse_url = server_url if server_url else SYNAPSE_URL
+        self.user_key = f"{self.synapse_url}|{self.username}"
+        # Room names, platforms and member counts with the /sync token, persisted per user
+        self.room_cache = RoomMetadataCache(self.user_key)
+        self._sync_task = None
 
         # Configure supported platforms
         if platforms is None:
@@ -102,7 +181,15 @@ class MultiPlatformMessageMonitor:
         print("Configured bridges:")
         for platform, config in self.bridge_configs.items():
             print(f"  - {config.name}: {config.bot_mxid}")
-            
+
+    @asynccontextmanager
+    async def _client_session(self, verify=False):
+        """
+        Yield the shared pooled HTTP client. Unlike a fresh httpx.AsyncClient per call, the
+        client is not closed on exit, so keep-alive connections to Synapse are reused.
+        """
+        yield get_shared_client(verify=verify)
+
     async def register(self, username, password):
         """
         Register a new user on the Matrix server using admin access token.
@@ -123,7 +210,7 @@ class MultiPlatformMessageMonitor:
             "deactivated": False
         }
 
-        async with httpx.AsyncClient(verify=True, timeout=30.0) as client:
+        async with self._client_session(verify=True) as client:
             try:
                 logger.info(f"Sending registration request to {register_url}")
                 response = await client.put(register_url, headers=headers, json=payload)
@@ -144,6 +231,28 @@ class MultiPlatformMessageMonitor:
             except Exception as e:
                 logger.error(f"Exception during registration: {str(e)}")
                 return None
+
+    async def user_exists(self, username):
+        """
+        Check with the Synapse Admin API whether a Matrix account exists (deactivated accounts included).
+        The admin PUT used by register() is an upsert, so it must not be sent for an existing account.
+        Returns True or False, or None if the check failed.
+        """
+        headers = {"Authorization": f"Bearer {ADMIN_ACCESS_TOKEN}"}
+        domain = self.synapse_url.split("//")[1].split(":")[0]
+        user_url = f"{self.synapse_url}/_synapse/admin/v2/users/@{username}:{domain}"
+        async with self._client_session(verify=True) as client:
+            try:
+                response = await client.get(user_url, headers=headers)
+                if response.status_code == 200:
+                    return True
+                if response.status_code == 404:
+                    return False
+                logger.error(f"User lookup failed: {response.status_code} - {response.text}")
+                return None
+            except Exception as e:
+                logger.error(f"Exception during user lookup: {str(e)}")
+                return None
             
     async def login(self):
         """
@@ -162,10 +271,11 @@ class MultiPlatformMessageMonitor:
                 "type": "m.id.user",
                 "user": self.username
             },
-            "password": self.password
+            "password": self.password,
+            "refresh_token": True
         }
 
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        async with self._client_session() as client:
             try:
                 print(f"Sending login request to {login_url}")
                 response = await client.post(login_url, json=payload)
@@ -173,9 +283,7 @@ class MultiPlatformMessageMonitor:
                 print(f"Login response status: {response.status_code}")
 
                 if response.status_code == 200:
-                    data = response.json()
-                    self.access_token = data.get("access_token")
-                    self.user_id = data.get("user_id")
+                    self._set_tokens(response.json())
                     print(f"Successfully logged in as {self.user_id}")
                     return True
                 else:
@@ -186,86 +294,275 @@ class MultiPlatformMessageMonitor:
                 print(f"Exception during login: {str(e)}")
                 return False
 
-    async def send_message_to_telegram_bot(self, message):
+    def _set_tokens(self, data):
         """
-        Send a text message to the Telegram bot in the existing direct chat.
+        Use the tokens of a /login or /refresh response and persist them in the token store.
+        """
+        self.access_token = data.get("access_token")
+        # /refresh may not rotate the refresh token, then the current one stays valid
+        self.refresh_token = data.get("refresh_token", self.refresh_token)
+        expires_in_ms = data.get("expires_in_ms")
+        self.token_expires_at = time.time() + expires_in_ms / 1000 if expires_in_ms else None
+        self.user_id = data.get("user_id", self.user_id)
+        token_store.save(self.user_key, {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            "expires_at": self.token_expires_at,
+            "user_id": self.user_id,
+        })
+
+    def _forget_tokens(self):
+        self.access_token = self.refresh_token = self.token_expires_at = None
+        token_store.delete(self.user_key)
+
+    async def refresh_access_token(self):
+        """
+        Get a new access token with the refresh token. Returns False if there is none or it was rejected.
+        """
+        if not self.refresh_token:
+            return False
+        async with self._client_session() as client:
+            try:
+                response = await client.post(
+                    f"{self.synapse_url}/_matrix/client/v3/refresh",
+                    json={"refresh_token": self.refresh_token}
+                )
+                if response.status_code == 200:
+                    self._set_tokens(response.json())
+                    print(f"Refreshed access token of {self.user_id}")
+                    return True
+                print(f"Token refresh failed: {response.status_code} - {response.text}")
+                if response.status_code in [401, 403]:
+                    self._forget_tokens()
+                return False
+            except Exception as e:
+                print(f"Error while refreshing access token: {str(e)}")
+                return False
+
+    async def restore_session(self):
+        """
+        Reuse the tokens stored by an earlier login instead of logging in with the password.
+        The access token is checked with /whoami and refreshed if it expired.
+        """
+        tokens = token_store.load(self.user_key)
+        if not tokens or not tokens.get("access_token"):
+            return False
+        self.access_token = tokens["access_token"]
+        self.refresh_token = tokens.get("refresh_token")
+        self.token_expires_at = tokens.get("expires_at")
+        self.user_id = tokens.get("user_id")
+        if not await self.ensure_session():
+            return False
+        async with self._client_session() as client:
+            try:
+                response = await client.get(
+                    f"{self.synapse_url}/_matrix/client/v3/account/whoami",
+                    headers={"Authorization": f"Bearer {self.access_token}"}
+                )
+                if response.status_code == 401 and await self.refresh_access_token():
+                    print(f"Restored session of {self.user_id} after refreshing the access token")
+                    return True
+                if response.status_code == 200 and response.json().get("user_id") == self.user_id:
+                    print(f"Restored session of {self.user_id}")
+                    return True
+                print(f"Stored access token of {self.username} rejected: {response.status_code}")
+                if response.status_code in [200, 401, 403]:
+                    self._forget_tokens()
+                else:
+                    self.access_token = None
+                return False
+            except Exception as e:
+                print(f"Error while restoring session of {self.username}: {str(e)}")
+                self.access_token = None
+                return False
+
+    async def ensure_session(self):
+        """
+        Refresh the access token if it is about to expire, or log in again if it cannot be refreshed.
+        Returns False if the user has to log in with the password.
+        """
+        if not self.access_token:
+            return False
+        if self.token_expires_at is None or time.time() < self.token_expires_at - TOKEN_REFRESH_MARGIN:
+            return True
+        if await self.refresh_access_token():
+            return True
+        if self.password:
+            return await self.login()
+        self.access_token = None
+        return False
+
+    async def _get_direct_rooms(self, client):
+        """
+        Return the user's m.direct account data (MXID -> list of direct chat room_ids).
+        """
+        direct_url = f"{self.synapse_url}/_matrix/client/v3/user/{self.user_id}/account_data/m.direct"
+        response = await client.get(
+            direct_url,
+            headers={"Authorization": f"Bearer {self.access_token}"}
+        )
+        if response.status_code == 200:
+            return response.json()
+        if response.status_code != 404:  # 404 means m.direct was never set
+            print(f"Failed to get m.direct: {response.status_code} - {response.text}")
+        return {}
+
+    async def _add_direct_room(self, client, bot_mxid, room_id):
+        """
+        Record a direct chat with a bot in m.direct, like Matrix clients do, so it is found with one request later.
+        """
+        direct = await self._get_direct_rooms(client)
+        rooms = direct.setdefault(bot_mxid, [])
+        if room_id in rooms:
+            return
+        rooms.append(room_id)
+        direct_url = f"{self.synapse_url}/_matrix/client/v3/user/{self.user_id}/account_data/m.direct"
+        response = await client.put(
+            direct_url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            json=direct
+        )
+        if response.status_code != 200:
+            print(f"Failed to update m.direct: {response.status_code} - {response.text}")
+
+    async def _is_bot_dm(self, client, semaphore, room_id, bot_mxid):
+        async with semaphore:
+            members_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/joined_members"
+            members_resp = await client.get(
+                members_url,
+                headers={"Authorization": f"Bearer {self.access_token}"}
+            )
+            if members_resp.status_code != 200:
+                return False
+            members = set(members_resp.json().get("joined", {}))
+            return members == {bot_mxid, self.user_id}
+
+    async def find_bot_dm_room(self, client, bot_mxid, scan=True):
+        """
+        Return the room_id of the direct chat (only you and the bot) with a bridge bot, or None.
+        Looks in the room cache first, then in m.direct account data. With scan=True it then checks
+        up to BOT_DM_SCAN_LIMIT joined rooms that may have two members, for chats created before
+        m.direct was kept up to date.
+        """
+        room_id = self.room_cache.get_direct_room(bot_mxid)
+        if room_id:
+            return room_id
+        joined_rooms_url = f"{self.synapse_url}/_matrix/client/v3/joined_rooms"
+        direct, response = await asyncio.gather(
+            self._get_direct_rooms(client),
+            client.get(joined_rooms_url, headers={"Authorization": f"Bearer {self.access_token}"})
+        )
+        if response.status_code != 200:
+            print(f"Failed to fetch joined rooms: {response.status_code} - {response.text}")
+            return None
+        joined = response.json().get("joined_rooms", [])
+        joined_set = set(joined)
+        candidates = [rid for rid in reversed(direct.get(bot_mxid, [])) if rid in joined_set]  # newest first
+        if not candidates and scan:
+            # Group chats known from the room cache are skipped, the rest is checked at most
+            # ROOM_FETCH_CONCURRENCY at a time
+            to_check = [rid for rid in joined if self.room_cache.get(rid, "num_members") in (None, 2)][:BOT_DM_SCAN_LIMIT]
+            semaphore = asyncio.Semaphore(ROOM_FETCH_CONCURRENCY)
+            is_dm = await asyncio.gather(*(self._is_bot_dm(client, semaphore, rid, bot_mxid) for rid in to_check))
+            candidates = [rid for rid, dm in zip(to_check, is_dm) if dm]
+            if candidates:
+                await self._add_direct_room(client, bot_mxid, candidates[0])
+        if not candidates:
+            return None
+        room_id = candidates[0]
+        print(f"Found direct chat with {bot_mxid}: {room_id}")
+        self.room_cache.set_direct_room(bot_mxid, room_id)
+        self.room_cache.save()
+        return room_id
+
+    async def create_bot_dm_room(self, client, bot_mxid):
+        """
+        Create a direct chat with a bridge bot and record it in m.direct and the room cache.
+        Returns the room_id, or None on failure.
+        """
+        create_room_url = f"{self.synapse_url}/_matrix/client/v3/createRoom"
+        create_room_payload = {
+            "is_direct": True,
+            "invite": [bot_mxid],
+            "preset": "trusted_private_chat"
+        }
+        create_room_response = await client.post(
+            create_room_url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            json=create_room_payload
+        )
+        if create_room_response.status_code != 200:
+            print(f"Failed to create direct chat: {create_room_response.status_code} - {create_room_response.text}")
+            return None
+        room_id = create_room_response.json().get("room_id")
+        print(f"Direct chat created with {bot_mxid}. Room ID: {room_id}")
+        await self._add_direct_room(client, bot_mxid, room_id)
+        self.room_cache.set_direct_room(bot_mxid, room_id)
+        self.room_cache.save()
+        return room_id
+
+    async def send_message_to_bot(self, bot_mxid, message):
+        """
+        Send a text message to a bridge bot in the existing direct chat.
         If no direct chat exists, create one.
-        Returns room_id if sent successfully, False otherwise.
+        Returns True if sent successfully, False otherwise.
         """
         if not self.access_token:
             print("Not logged in. Cannot send message.")
             return False
 
-        bot_mxid = TELEGRAM_BOT_MXID
         message_url_template = f"{self.synapse_url}/_matrix/client/v3/rooms/{{room_id}}/send/m.room.message"
-
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            # Find existing direct chat with the bot: must be a room with only you and the bot
-            joined_rooms_url = f"{self.synapse_url}/_matrix/client/v3/joined_rooms"
-            response = await client.get(
-                joined_rooms_url,
-                headers={"Authorization": f"Bearer {self.access_token}"}
-            )
-            room_id = None
-            if response.status_code == 200:
-                room_ids = response.json().get("joined_rooms", [])
-                for rid in room_ids:
-                    members_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{rid}/members"
-                    members_resp = await client.get(
-                        members_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"}
-                    )
-                    if members_resp.status_code == 200:
-                        members = [event["state_key"] for event in members_resp.json().get("chunk", []) if event["type"] == "m.room.member"]
-                        if bot_mxid in members and self.user_id in members and len(members) == 2:
-                            print(f"Found direct chat with Telegram bot: {rid}")
-                            room_id = rid
-                            break
-
-            # If no direct chat, create one
+        payload = {
+            "msgtype": "m.text",
+            "body": message
+        }
+        async with self._client_session() as client:
+            room_id = await self.find_bot_dm_room(client, bot_mxid)
+            created = False
             if not room_id:
-                print("No direct chat with Telegram bot found. Creating one...")
-                create_room_url = f"{self.synapse_url}/_matrix/client/v3/createRoom"
-                create_room_payload = {
-                    "is_direct": True,
-                    "invite": [bot_mxid],
-                    "preset": "trusted_private_chat"
-                }
-                create_room_response = await client.post(
-                    create_room_url,
-                    headers={"Authorization": f"Bearer {self.access_token}"},
-                    json=create_room_payload
-                )
-                if create_room_response.status_code == 200:
-                    room_id = create_room_response.json().get("room_id")
-                    print(f"Direct chat created with Telegram bot. Room ID: {room_id}")
-                    await asyncio.sleep(5)  # Wait for the room to be ready
-                else:
-                    print(f"Failed to create direct chat: {create_room_response.status_code} - {create_room_response.text}")
+                print(f"No direct chat with {bot_mxid} found. Creating one...")
+                room_id = await self.create_bot_dm_room(client, bot_mxid)
+                if not room_id:
                     return False
+                created = True
+                await asyncio.sleep(5)  # Wait for the room to be ready
 
-            # Send the message to the bot
-            message_url = message_url_template.format(room_id=room_id)
-            payload = {
-                "msgtype": "m.text",
-                "body": message
-            }
             send_resp = await client.post(
-                message_url,
+                message_url_template.format(room_id=room_id),
                 headers={"Authorization": f"Bearer {self.access_token}"},
                 json=payload
             )
+            if send_resp.status_code == 403 and not created:
+                # The cached chat was left in the meantime: forget it and use a new one
+                print(f"Direct chat {room_id} is no longer joined, creating a new one...")
+                self.room_cache.set_direct_room(bot_mxid, None)
+                room_id = await self.create_bot_dm_room(client, bot_mxid)
+                if not room_id:
+                    return False
+                await asyncio.sleep(5)  # Wait for the room to be ready
+                send_resp = await client.post(
+                    message_url_template.format(room_id=room_id),
+                    headers={"Authorization": f"Bearer {self.access_token}"},
+                    json=payload
+                )
             if send_resp.status_code == 200:
-                print("Message sent to Telegram bot.")
+                print(f"Message sent to {bot_mxid}.")
                 return True
             else:
                 print(f"Failed to send message: {send_resp.status_code} - {send_resp.text}")
                 return False
-            
-    async def get_last_telegram_bot_message(self):
+
+    async def send_message_to_telegram_bot(self, message):
         """
-        Retrieve the last message sent by the Telegram bot in the direct chat.
-        
+        Send a text message to the Telegram bot in the existing direct chat.
+        If no direct chat exists, create one.
+        """
+        return await self.send_message_to_bot(TELEGRAM_BOT_MXID, message)
+
+    async def get_last_bot_message(self, bot_mxid):
+        """
+        Retrieve the last text message sent by a bridge bot in the direct chat.
+
         Returns:
             str: The body of the last message from the bot, or None if no message found
         """
@@ -273,34 +570,10 @@ class MultiPlatformMessageMonitor:
             print("Not logged in. Cannot retrieve bot messages.")
             return None
 
-        bot_mxid = TELEGRAM_BOT_MXID
-
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            # Find existing direct chat with the bot
-            joined_rooms_url = f"{self.synapse_url}/_matrix/client/v3/joined_rooms"
-            response = await client.get(
-                joined_rooms_url,
-                headers={"Authorization": f"Bearer {self.access_token}"}
-            )
-            
-            room_id = None
-            if response.status_code == 200:
-                room_ids = response.json().get("joined_rooms", [])
-                for rid in room_ids:
-                    members_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{rid}/members"
-                    members_resp = await client.get(
-                        members_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"}
-                    )
-                    if members_resp.status_code == 200:
-                        members = [event["state_key"] for event in members_resp.json().get("chunk", []) if event["type"] == "m.room.member"]
-                        if bot_mxid in members and self.user_id in members and len(members) == 2:
-                            print(f"Found direct chat with Telegram bot: {rid}")
-                            room_id = rid
-                            break
-
+        async with self._client_session() as client:
+            room_id = await self.find_bot_dm_room(client, bot_mxid)
             if not room_id:
-                print("No direct chat with Telegram bot found.")
+                print(f"No direct chat with {bot_mxid} found.")
                 return None
 
             # Get the most recent messages from the room
@@ -310,30 +583,120 @@ class MultiPlatformMessageMonitor:
                 headers={"Authorization": f"Bearer {self.access_token}"},
                 params={"limit": 20, "dir": "b"}  # Get last 20 messages, backward from most recent
             )
-            
+
             if messages_resp.status_code != 200:
                 print(f"Failed to get messages: {messages_resp.status_code} - {messages_resp.text}")
+                if messages_resp.status_code == 403:
+                    self.room_cache.set_direct_room(bot_mxid, None)
                 return None
 
             messages = messages_resp.json().get("chunk", [])
-            
+
             # Find the most recent message from the bot
             for message in messages:
-                if (message.get("sender") == bot_mxid and 
-                    message.get("type") == "m.room.message" and 
+                if (message.get("sender") == bot_mxid and
+                    message.get("type") == "m.room.message" and
                     message.get("content", {}).get("msgtype") == "m.text"):
-                    
+
                     bot_message = message.get("content", {}).get("body")
-                    print(f"Found last message from Telegram bot: {bot_message}")
+                    print(f"Found last message from {bot_mxid}: {bot_message}")
                     return bot_message
-                    
-            print("No messages from Telegram bot found in the chat history.")
+
+            print(f"No messages from {bot_mxid} found in the chat history.")
+            return None
+
+    async def get_last_telegram_bot_message(self):
+        """
+        Retrieve the last message sent by the Telegram bot in the direct chat.
+        """
+        return await self.get_last_bot_message(TELEGRAM_BOT_MXID)
+
+    def _bot_room_filter(self, room_id, bot_mxid):
+        """
+        /sync filter that only returns the bot's messages in one room.
+        """
+        return json.dumps({
+            "presence": {"types": []},
+            "account_data": {"types": []},
+            "room": {
+                "rooms": [room_id],
+                "timeline": {"types": ["m.room.message"], "senders": [bot_mxid], "limit": 20},
+                "state": {"types": []},
+                "ephemeral": {"types": []},
+                "account_data": {"types": []},
+            },
+        })
+
+    async def _sync_position(self, client, sync_filter):
+        """
+        Return a /sync token for "now", so a later long-poll only sees events sent after this point.
+        """
+        response = await client.get(
+            f"{self.synapse_url}/_matrix/client/v3/sync",
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            params={"filter": sync_filter, "timeout": 0}
+        )
+        if response.status_code != 200:
+            print(f"Failed to sync: {response.status_code} - {response.text}")
+            return None
+        return response.json().get("next_batch")
+
+    async def wait_for_bot_event(self, client, room_id, sync_filter, since, predicate, deadline):
+        """
+        Long-poll /sync with a filter for the bot room until an event matching predicate arrives
+        or the loop time reaches deadline. Returns (event or None, next since token).
+        """
+        loop = asyncio.get_running_loop()
+        while since:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            poll_ms = int(min(remaining, 30) * 1000)
+            try:
+                response = await client.get(
+                    f"{self.synapse_url}/_matrix/client/v3/sync",
+                    headers={"Authorization": f"Bearer {self.access_token}"},
+                    params={"filter": sync_filter, "since": since, "timeout": poll_ms},
+                    timeout=httpx.Timeout(poll_ms / 1000 + 10, connect=10.0)
+                )
+            except httpx.TimeoutException:
+                continue
+            if response.status_code != 200:
+                print(f"Failed to sync bot room: {response.status_code} - {response.text}")
+                await asyncio.sleep(min(1.0, max(0.0, deadline - loop.time())))
+                continue
+            data = response.json()
+            since = data.get("next_batch", since)
+            events = data.get("rooms", {}).get("join", {}).get(room_id, {}).get("timeline", {}).get("events", [])
+            for event in events:
+                if predicate(event):
+                    return event, since
+        return None, since
+
+    @staticmethod
+    def _make_qr_image(payload):
+        """
+        Render a login payload (e.g. the body of the bot's QR image message) as a QR code image.
+        """
+        try:
+            qr = qrcode.QRCode()
+            qr.add_data(payload.strip())
+            qr.make(fit=True)
+            img = qr.make_image(fill="black", back_color="white")
+            print("QR code successfully generated.")
+            return img
+        except Exception as e:
+            print(f"Failed to generate QR code: {str(e)}")
             return None
 
-    async def generate_qr(self, platform='whatsapp'):
+    async def generate_qr(self, platform='whatsapp', timeout=QR_TIMEOUT):
         """
         Send a message to the bridge bot to create a room, then retrieve and return the QR code.
         If a direct chat with the bot exists, leave it first.
+        The bot's replies are awaited with a long-poll /sync on the bot room, so the QR code is
+        returned as soon as it arrives, or None after `timeout` seconds.
+        For Telegram the login commands are sent by the Telegram login flow, so only the QR code
+        is awaited in the existing direct chat.
         """
         if not self.access_token:
             print("Not logged in. Cannot generate QR code.")
@@ -343,216 +706,125 @@ class MultiPlatformMessageMonitor:
         if platform == 'signal':
             bot_mxid = SIGNAL_BOT_MXID
             login_command = "login qr"
-            qr_prefix = "sgnl://"
         elif platform == 'whatsapp':
             bot_mxid = WHATSAPP_BOT_MXID
             login_command = "login qr"
-            qr_prefix = "whatsapp://"
         elif platform == 'telegram':
             bot_mxid = TELEGRAM_BOT_MXID
-            login_command = "login"
-            qr_prefix = "tg://"
+            login_command = None
         else:
             print(f"Unsupported platform: {platform}")
             return None
 
-        if platform != 'telegram':
-            create_room_url = f"{self.synapse_url}/_matrix/client/v3/createRoom"
-            message_url_template = f"{self.synapse_url}/_matrix/client/v3/rooms/{{room_id}}/send/m.room.message"
-            # Step 0: Check for existing direct chat with the bot and leave it
-            async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-                joined_rooms_url = f"{self.synapse_url}/_matrix/client/v3/joined_rooms"
-                response = await client.get(
-                    joined_rooms_url,
-                    headers={"Authorization": f"Bearer {self.access_token}"}
-                )
-                if response.status_code == 200:
-                    room_ids = response.json().get("joined_rooms", [])
-                    for room_id in room_ids:
-                        member_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/state/m.room.member/{bot_mxid}"
-                        member_resp = await client.get(
-                            member_url,
-                            headers={"Authorization": f"Bearer {self.access_token}"}
-                        )
-                        if member_resp.status_code == 200:
-                            state_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/state/m.room.create"
-                            state_resp = await client.get(
-                                state_url,
-                                headers={"Authorization": f"Bearer {self.access_token}"}
-                            )
-                            if state_resp.status_code == 200 and state_resp.json().get("is_direct", False):
-                                print(f"Leaving existing direct chat with {platform} bot: {room_id}")
-                                await self._leave_room(client, room_id)
-                room_id = None
-                try:
-                    # Step 1: Create a direct chat with the bot
-                    print(f"Creating a direct chat with the {platform} bot: {bot_mxid}")
-                    create_room_payload = {
-                        "is_direct": True,
-                        "invite": [bot_mxid],
-                        "preset": "trusted_private_chat"
-                    }
-                    create_room_response = await client.post(
-                        create_room_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"},
-                        json=create_room_payload
-                    )
-
-                    if create_room_response.status_code != 200:
-                        print(f"Failed to create a direct chat: {create_room_response.status_code} - {create_room_response.text}")
-                        return None
-
-                    room_id = create_room_response.json().get("room_id")
-                    print(f"Direct chat created with {platform} bot. Room ID: {room_id}")
-
-                    # Step 2: Send the starting message to the bot
-                    print(f"Requesting QR code from the {platform} bot...")
-                    message_url = message_url_template.format(room_id=room_id)
-                    login_message_payload = {
-                        "msgtype": "m.text",
-                        "body": "Hello"
-                    }
-                    login_message_response = await client.post(
-                        message_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"},
-                        json=login_message_payload
-                    )
-
-                    if login_message_response.status_code != 200:
-                        print(f"Failed to send initial message: {login_message_response.status_code} - {login_message_response.text}")
-                        return None
-                    
-                    print("Waiting for the bot to respond...")
-                    await asyncio.sleep(5)  
-
-                    # Step 3: Send the login command to the bot
-                    print(f"Sending '{login_command}' to the {platform} bot...")
-                    login_message_payload = {
-                        "msgtype": "m.text",
-                        "body": login_command
-                    }
-                    login_message_response = await client.post(
-                        message_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"},
-                        json=login_message_payload
-                    )
-                        
-                    if login_message_response.status_code != 200:
-                        print(f"Failed to send '{login_command}' message: {login_message_response.status_code} - {login_message_response.text}")
-                        return None
-
-                    print("Waiting for QR code message...")
-                    await asyncio.sleep(10)  # Wait for the QR code message to arrive
-
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        is_qr_image = lambda event: event.get("sender") == bot_mxid and event.get("content", {}).get("msgtype") == "m.image"
+        message_url_template = f"{self.synapse_url}/_matrix/client/v3/rooms/{{room_id}}/send/m.room.message"
 
-                    # Step 4: Retrieve the QR code from the room's messages
-                    room_events_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/messages"
+        async with self._client_session() as client:
+            if platform == 'telegram':
+                room_id = await self.find_bot_dm_room(client, bot_mxid)
+                if not room_id:
+                    print("No direct chat with Telegram bot found.")
+                    return None
+                try:
+                    sync_filter = self._bot_room_filter(room_id, bot_mxid)
+                    since = await self._sync_position(client, sync_filter)
+                    # The QR code may already be there
                     response = await client.get(
-                        room_events_url,
+                        f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/messages",
                         headers={"Authorization": f"Bearer {self.access_token}"},
                         params={"limit": 10, "dir": "b"}  # Fetch the last 10 messages
                     )
-                    print("retriving for QR code message...")
-                    if response.status_code != 200:
-                        print(f"Failed to fetch room messages: {response.status_code} - {response.text}")
+                    if response.status_code == 200:
+                        for event in response.json().get("chunk", []):
+                            if is_qr_image(event):
+                                return self._make_qr_image(event.get("content", {}).get("body", ""))
+                    print("Waiting for QR code message...")
+                    event, _ = await self.wait_for_bot_event(client, room_id, sync_filter, since, is_qr_image, deadline)
+                    if event is None:
+                        print("QR code message not found.")
                         return None
-
-                    events = response.json().get("chunk", [])
-                    for event in events:
-                        content = event.get("content", {})
-                        msgtype = content.get("msgtype")
-                        sender = event.get("sender", "")
-                        body = content.get("body", "")
-
-                        # WhatsApp: If the body looks like a QR payload (3-4 base64 segments separated by commas), use it directly
-                        if (
-                            platform == 'whatsapp' and
-                            sender == bot_mxid and
-                            msgtype == "m.image"
-                            # re.match(r"^[A-Za-z0-9+/=]+,[A-Za-z0-9+/=]+,[A-Za-z0-9+/=]+(,[A-Za-z0-9+/=]+)?$", body.strip())
-                        ):
-                            try:
-                                qr = qrcode.QRCode()
-                                qr.add_data(body.strip())
-                                qr.make(fit=True)
-                                img = qr.make_image(fill="black", back_color="white")
-                                print("WhatsApp QR code generated from string payload.")
-                                return img
-                            except Exception as e:
-                                print(f"Failed to generate WhatsApp QR code from string: {str(e)}")
-                                return None
-
-                        # Signal/Telegram: QR is a link in the body
-                        if sender == bot_mxid and msgtype == "m.image":
-                            qr_link = body
-                            try:
-                                qr = qrcode.QRCode()
-                                qr.add_data(qr_link)
-                                qr.make(fit=True)
-                                img = qr.make_image(fill="black", back_color="white")
-                                print("QR code successfully generated.")
-                                return img
-                            except Exception as e:
-                                print(f"Failed to generate QR code: {str(e)}")
-                                return None
-
-                    print("QR code message not found.")
-                    return None
-
+                    return self._make_qr_image(event.get("content", {}).get("body", ""))
                 except Exception as e:
                     print(f"Error during QR code generation: {str(e)}")
                     return None
-                finally:
-                    if room_id:
-                        await self._leave_room(client, room_id)
 
-        if platform == 'telegram':
-            try: # for telegram messages were already sent, just need to fetch the qr
-                print("Waiting for QR code message...")
-                await asyncio.sleep(10)  # Wait for the QR code message to arrive
+            # Step 0: Check for an existing direct chat with the bot (cache and m.direct) and leave it
+            room_id = await self.find_bot_dm_room(client, bot_mxid, scan=False)
+            if room_id:
+                print(f"Leaving existing direct chat with {platform} bot: {room_id}")
+                await self._leave_room(client, room_id)
+                self.room_cache.set_direct_room(bot_mxid, None)
+            room_id = None
+            try:
+                # Step 1: Create a direct chat with the bot
+                print(f"Creating a direct chat with the {platform} bot: {bot_mxid}")
+                create_room_response = await client.post(
+                    f"{self.synapse_url}/_matrix/client/v3/createRoom",
+                    headers={"Authorization": f"Bearer {self.access_token}"},
+                    json={
+                        "is_direct": True,
+                        "invite": [bot_mxid],
+                        "preset": "trusted_private_chat"
+                    }
+                )
+                if create_room_response.status_code != 200:
+                    print(f"Failed to create a direct chat: {create_room_response.status_code} - {create_room_response.text}")
+                    return None
+                room_id = create_room_response.json().get("room_id")
+                print(f"Direct chat created with {platform} bot. Room ID: {room_id}")
+                # Recorded as the bot chat until it is left below, so a failed leave is found again next time
+                self.room_cache.set_direct_room(bot_mxid, room_id)
+                message_url = message_url_template.format(room_id=room_id)
+                sync_filter = self._bot_room_filter(room_id, bot_mxid)
+                since = await self._sync_position(client, sync_filter)
+
+                # Step 2: Send the starting message to the bot and wait for its first reply
+                print(f"Requesting QR code from the {platform} bot...")
+                login_message_response = await client.post(
+                    message_url,
+                    headers={"Authorization": f"Bearer {self.access_token}"},
+                    json={"msgtype": "m.text", "body": "Hello"}
+                )
+                if login_message_response.status_code != 200:
+                    print(f"Failed to send initial message: {login_message_response.status_code} - {login_message_response.text}")
+                    return None
+                print("Waiting for the bot to respond...")
+                reply, since = await self.wait_for_bot_event(
+                    client, room_id, sync_filter, since,
+                    lambda event: event.get("sender") == bot_mxid,
+                    min(deadline, loop.time() + BOT_REPLY_TIMEOUT)
+                )
+                if reply is None:
+                    print("No reply from the bot yet, sending the login command anyway")
 
-                # Step 4: Retrieve the QR code from the room's messages
-                room_events_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/messages"
-                response = await client.get(
-                    room_events_url,
+                # Step 3: Send the login command to the bot
+                print(f"Sending '{login_command}' to the {platform} bot...")
+                login_message_response = await client.post(
+                    message_url,
                     headers={"Authorization": f"Bearer {self.access_token}"},
-                    params={"limit": 10, "dir": "b"}  # Fetch the last 10 messages
+                    json={"msgtype": "m.text", "body": login_command}
                 )
-                print("retriving for QR code message...")
-                if response.status_code != 200:
-                    print(f"Failed to fetch room messages: {response.status_code} - {response.text}")
+                if login_message_response.status_code != 200:
+                    print(f"Failed to send '{login_command}' message: {login_message_response.status_code} - {login_message_response.text}")
                     return None
 
-                events = response.json().get("chunk", [])
-                for event in events:
-                    content = event.get("content", {})
-                    msgtype = content.get("msgtype")
-                    sender = event.get("sender", "")
-                    body = content.get("body", "")
-
-                    # Signal/Telegram: QR is a link in the body
-                    if sender == bot_mxid and msgtype == "m.image":
-                        qr_link = body
-                        try:
-                            qr = qrcode.QRCode()
-                            qr.add_data(qr_link)
-                            qr.make(fit=True)
-                            img = qr.make_image(fill="black", back_color="white")
-                            print("QR code successfully generated.")
-                            return img
-                        except Exception as e:
-                            print(f"Failed to generate QR code: {str(e)}")
-                            return None
-
-                print("QR code message not found.")
-                return None
+                # Step 4: Wait for the QR code image from the bot
+                print("Waiting for QR code message...")
+                event, _ = await self.wait_for_bot_event(client, room_id, sync_filter, since, is_qr_image, deadline)
+                if event is None:
+                    print("QR code message not found.")
+                    return None
+                return self._make_qr_image(event.get("content", {}).get("body", ""))
 
             except Exception as e:
                 print(f"Error during QR code generation: {str(e)}")
                 return None
             finally:
                 if room_id:
-                    await self._leave_room(client, room_id)
+                    await self._leave_room(client, room_id)  # also forgets it as the bot chat
+                    self.room_cache.save()
 
     async def _leave_room(self, client, room_id):
         """
@@ -566,17 +838,63 @@ class MultiPlatformMessageMonitor:
             )
             if response.status_code == 200:
                 print(f"Successfully left the room {room_id}")
+                self.room_cache.remove(room_id)
+                return True
             else:
                 print(f"Failed to leave the room {room_id}: {response.status_code} - {response.text}")
+                return False
         except Exception as e:
             print(f"Exception while leaving the room {room_id}: {str(e)}")
+            return False
+
+    async def _join_room(self, client, room_id):
+        """
+        Join the Matrix room with the given room_id (accepts a pending invite).
+        """
+        try:
+            join_url = f"{self.synapse_url}/_matrix/client/v3/join/{room_id}"
+            response = await client.post(
+                join_url,
+                headers={"Authorization": f"Bearer {self.access_token}"}
+            )
+            if response.status_code == 200:
+                print(f"Successfully approved (joined) room: {room_id}")
+                self.room_cache.update(room_id, membership="join")
+                self.room_cache.invalidate(room_id, "num_members")
+                return True
+            else:
+                print(f"Failed to approve room {room_id}: {response.status_code} - {response.text}")
+                return False
+        except Exception as e:
+            print(f"Error while approving room {room_id}: {str(e)}")
+            return False
+
+    async def _room_batch(self, action, room_ids, concurrency):
+        """
+        Run action(client, room_id) for every room, at most `concurrency` at a time. Returns {room_id: result}.
+        """
+        room_ids = list(dict.fromkeys(room_ids))
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(client, room_id):
+            async with semaphore:
+                return await action(client, room_id)
+
+        async with self._client_session() as client:
+            results = await asyncio.gather(*(run(client, room_id) for room_id in room_ids))
+        self.room_cache.save()
+        return dict(zip(room_ids, results))
 
 
     async def detect_room_platform(self, room_id, client, invite_state=None):
         """
         Detect the platform of a room by checking for the presence of bridge bot MXIDs as members,
         or by checking the invite event's sender if provided.
+        Results are kept in the room cache.
         """
+        cached_platform = self.room_cache.get(room_id, "platform")
+        if cached_platform or self.room_cache.fresh(room_id, "platform"):
+            return cached_platform
         # If invite_state is provided (for invites), check sender of invite events
         if invite_state:
             for event in invite_state:
@@ -584,7 +902,12 @@ class MultiPlatformMessageMonitor:
                 if sender:
                     for plat, config in self.bridge_configs.items():
                         if sender == config.bot_mxid:
+                            self.room_cache.store(room_id, "platform", plat)
                             return plat
+        if ROOM_PLATFORM_DETECTION == "snapshot":
+            snapshot = await self.snapshot_room(room_id, client)
+            if snapshot is not None:
+                return snapshot["platform"]
         # Fallback: check for bot as member (works for joined rooms)
         for plat, config in self.bridge_configs.items():
             member_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/state/m.room.member/{config.bot_mxid}"
@@ -593,89 +916,225 @@ class MultiPlatformMessageMonitor:
                 headers={"Authorization": f"Bearer {self.access_token}"}
             )
             if member_resp.status_code == 200:
+                self.room_cache.store(room_id, "platform", plat)
                 return plat
+        self.room_cache.store(room_id, "platform", None)
+        return None
+
+    async def snapshot_room(self, room_id, client):
+        """
+        Fetch the room's members (and its name, if not known from the sync) with one request and derive
+        name, platform and member count from it. The platform is the bridge whose bot is a joined member.
+        Uses /joined_members when the name is cached, otherwise the full /state. Returns None on failure.
+        """
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        name_known = bool(self.room_cache.get(room_id, "membership")) or self.room_cache.fresh(room_id, "name")
+        if name_known:
+            response = await client.get(f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/joined_members", headers=headers)
+            if response.status_code != 200:
+                print(f"Failed to get members of {room_id}: {response.status_code} - {response.text}")
+                return None
+            members = set(response.json().get("joined", {}))
+            room_name = self.room_cache.get(room_id, "name")
+            platform = None
+        else:
+            response = await client.get(f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/state", headers=headers)
+            if response.status_code != 200:
+                print(f"Failed to get state of {room_id}: {response.status_code} - {response.text}")
+                return None
+            members = set()
+            room_name = None
+            platform = None
+            for event in response.json():
+                event_type = event.get("type")
+                if event_type == "m.room.member" and event.get("content", {}).get("membership") == "join":
+                    members.add(event.get("state_key"))
+                elif event_type == "m.room.name":
+                    room_name = event.get("content", {}).get("name")
+                elif event_type in BRIDGE_STATE_TYPES and platform is None:
+                    platform = self._platform_from_event(event)
+            self.room_cache.store(room_id, "name", room_name)
+        if platform is None:
+            bots = {config.bot_mxid: plat for plat, config in self.bridge_configs.items() if config.bot_mxid}
+            bridged = bots.keys() & members
+            platform = bots[bridged.pop()] if bridged else None
+        self.room_cache.store(room_id, "platform", platform)
+        self.room_cache.store(room_id, "num_members", len(members))
+        return {"name": room_name, "platform": platform, "num_members": len(members)}
+
+    def _platform_from_event(self, event):
+        """
+        Return the platform a state event points to: a bridge info event, or a membership event
+        sent by or about a bridge bot. None if the event says nothing about the platform.
+        """
+        event_type = event.get("type")
+        if event_type in BRIDGE_STATE_TYPES:
+            protocol = (event.get("content", {}).get("protocol") or {}).get("id", "")
+            if protocol in self.bridge_configs:
+                return protocol
+        if event_type in BRIDGE_STATE_TYPES or event_type == "m.room.member":
+            for plat, config in self.bridge_configs.items():
+                if config.bot_mxid and config.bot_mxid in (event.get("sender"), event.get("state_key")):
+                    return plat
         return None
 
-    async def list_rooms(self, room_type="joined", group=False, chats_blacklist=[]):
+    def _apply_room_events(self, room_id, events):
+        """
+        Update the cached room from its state events: name, platform, and member count invalidation.
+        """
+        cache = self.room_cache
+        for event in events:
+            event_type = event.get("type")
+            if event_type == "m.room.name" and "state_key" in event:
+                cache.update(room_id, name=event.get("content", {}).get("name"))
+            elif event_type == "m.room.member":
+                cache.invalidate(room_id, "num_members")
+            if cache.get(room_id, "platform") is None:
+                platform = self._platform_from_event(event)
+                if platform:
+                    cache.update(room_id, platform=platform)
+
+    def _apply_sync(self, data):
+        """
+        Merge a /sync response into the room cache and remember its next_batch token.
+        """
+        cache = self.room_cache
+        rooms = data.get("rooms", {})
+        for room_id, room_data in rooms.get("join", {}).items():
+            cache.update(room_id, membership="join")
+            # State before the timeline, then state changes in the timeline (incremental syncs)
+            events = room_data.get("state", {}).get("events", []) + room_data.get("timeline", {}).get("events", [])
+            self._apply_room_events(room_id, events)
+            # The room summary carries the joined member count whenever it changed (and on full syncs)
+            joined_count = room_data.get("summary", {}).get("m.joined_member_count")
+            if joined_count is not None:
+                cache.store(room_id, "num_members", joined_count)
+        for room_id, room_data in rooms.get("invite", {}).items():
+            cache.update(room_id, membership="invite")
+            self._apply_room_events(room_id, room_data.get("invite_state", {}).get("events", []))
+        for room_id in rooms.get("leave", {}):
+            cache.remove(room_id)
+        cache.set_next_batch(data.get("next_batch"))
+
+    async def sync_rooms(self, client, timeout=0):
+        """
+        Bring the room cache up to date with one filtered /sync. A full sync rebuilds the cache when it
+        is empty or older than its TTL, otherwise next_batch is passed and only changed rooms are returned.
+        Concurrent callers on the same event loop share one request.
+        With a timeout (ms) the incremental sync is a long-poll that returns as soon as something changes
+        (used by the background sync worker); long-polls are never shared with other callers.
+        """
+        if timeout:
+            return await self._sync_rooms(client, timeout)
+        task = self._sync_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = self._sync_task = asyncio.ensure_future(self._sync_rooms(client))
+        return await asyncio.shield(task)
+
+    async def _sync_rooms(self, client, timeout=0):
+        sync_url = f"{self.synapse_url}/_matrix/client/v3/sync"
+        full_sync = self.room_cache.needs_full_sync()
+        params = {"filter": ROOM_DISCOVERY_FILTER, "timeout": 0}
+        request_timeout = HTTP_TIMEOUT
+        if not full_sync:
+            params["since"] = self.room_cache.next_batch
+            if timeout:
+                params["timeout"] = timeout
+                request_timeout = httpx.Timeout(timeout / 1000 + HTTP_TIMEOUT.read, connect=HTTP_TIMEOUT.connect)
+        response = await client.get(
+            sync_url,
+            headers={"Authorization": f"Bearer {self.access_token}"},
+            params=params,
+            timeout=request_timeout
+        )
+        if response.status_code != 200 and not full_sync:
+            # The token may have expired on the server: start over with a full sync
+            print(f"Incremental sync failed ({response.status_code}), running a full sync")
+            full_sync = True
+            params.pop("since")
+            params["timeout"] = 0
+            response = await client.get(
+                sync_url,
+                headers={"Authorization": f"Bearer {self.access_token}"},
+                params=params
+            )
+        if response.status_code != 200:
+            print(f"Failed to sync rooms: {response.status_code} - {response.text}")
+            return False
+        if full_sync:
+            self.room_cache.start_full_sync()
+        self._apply_sync(response.json())
+        self.room_cache.save()
+        return True
+
+    async def _check_room_platform(self, client, semaphore, room_id):
+        async with semaphore:
+            await self.detect_room_platform(room_id, client)
+
+    async def resolve_platforms(self, client, room_ids):
+        """
+        Look for the bridge bots in joined rooms whose platform the sync did not reveal,
+        at most ROOM_FETCH_CONCURRENCY at a time.
+        """
+        cache = self.room_cache
+        unknown = [
+            room_id for room_id in room_ids
+            if cache.get(room_id, "membership") == "join" and cache.get(room_id, "platform") is None and not cache.fresh(room_id, "platform")
+        ]
+        if unknown:
+            semaphore = asyncio.Semaphore(ROOM_FETCH_CONCURRENCY)
+            await asyncio.gather(*(self._check_room_platform(client, semaphore, room_id) for room_id in unknown))
+            cache.save()
+
+    def cached_rooms(self, membership, chats_blacklist=None):
+        """
+        Rooms of the room cache with the given membership ('join' or 'invite'), as chat rows.
+        """
+        cache = self.room_cache
+        chats_blacklist = chats_blacklist or ()
+        return [{
+            "ChatID": room_id,
+            "Chat Name": room["name"],
+            "Platform": room["platform"],
+            "UserID": self.username,
+            "Donated": membership == "join",
+        } for room_id, room in list(cache.rooms.items()) if room["membership"] == membership and room_id not in chats_blacklist]
+
+    async def list_rooms(self, room_type="joined", group=False, chats_blacklist=None):
         """
         List rooms of a given type: 'joined' or 'invited'.
         If group=True, return only group rooms. Adds platform info.
-        Filters out blacklisted rooms.
+        Blacklisted rooms (a set of room IDs) are dropped before any per-room requests.
+        Rooms are discovered with an incremental, filtered /sync (see sync_rooms) and served from the room cache.
         """
+        chats_blacklist = chats_blacklist if isinstance(chats_blacklist, (set, frozenset)) else set(chats_blacklist or ())
         print(f"MMonitor: Listing rooms for user {self.username}")
         if not self.access_token:
             print(f"Not logged in. Cannot list {room_type} rooms.")
             return []
 
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        membership = "invite" if room_type == "invited" else "join"
+        cache = self.room_cache
+        async with self._client_session() as client:
             try:
-                if room_type == "invited":
-                    # Invited rooms (pending invites)
-                    invites_url = f"{self.synapse_url}/_matrix/client/v3/sync"
-                    response = await client.get(
-                        invites_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"},
-                        params={"timeout": 10000}
-                    )
-                    if response.status_code != 200:
-                        print(f"Failed to fetch invites: {response.status_code} - {response.text}")
-                        return []
-                    data = response.json()
-                    rooms = data.get("rooms", {}).get("invite", {})
-                    result = []
-                    for room_id, room_data in rooms.items():
-                        if room_id in chats_blacklist:
-                            continue
-                        room_name = None
-                        invite_state = room_data.get("invite_state", {}).get("events", [])
-                        for event in invite_state:
-                            if event.get("type") == "m.room.name":
-                                room_name = event.get("content", {}).get("name")
-                                break
-                        platform = await self.detect_room_platform(room_id, client, invite_state=invite_state)
-                        if group:
-                            is_group = await self.is_group_room(room_name)
-                            if not is_group:
-                                continue
-                        result.append({"ChatID": room_id, "Chat Name": room_name, "Platform": platform, 'UserID': self.username, "Donated": False})
-                    print("Pending invites:")
-                    for invite in result:
-                        print(f"  - {invite['ChatID']} ({invite['Chat Name'] or 'Unnamed'}) [Platform: {invite['Platform'] or 'unknown'}]")
-                    return result
-                else:
-                    # Joined rooms
-                    joined_rooms_url = f"{self.synapse_url}/_matrix/client/v3/joined_rooms"
-                    response = await client.get(
-                        joined_rooms_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"}
-                    )
-                    if response.status_code != 200:
-                        print(f"Failed to fetch joined rooms: {response.status_code} - {response.text}")
-                        return []
-                    room_ids = response.json().get("joined_rooms", [])
-                    result = []
-                    for room_id in room_ids:
-                        if room_id in chats_blacklist:
-                            continue
-                        name_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/state/m.room.name"
-                        name_resp = await client.get(
-                            name_url,
-                            headers={"Authorization": f"Bearer {self.access_token}"}
-                        )
-                        if name_resp.status_code == 200:
-                            room_name = name_resp.json().get("name")
-                        else:
-                            room_name = None
-                        if group:
-                            is_group = await self.is_group_room(room_name)
-                            if not is_group:
-                                continue
-                        platform = await self.detect_room_platform(room_id, client)
-                        result.append({"ChatID": room_id, "Chat Name": room_name, "Platform": platform, 'UserID': self.username, "Donated": True})
-                    print("Joined rooms:")
-                    for room in result:
-                        print(f"  - {room['ChatID']} ({room['Chat Name'] or 'Unnamed'}) [Platform: {room['Platform'] or 'unknown'}]")
-                    return result
+                if not await self.sync_rooms(client):
+                    return []
+                room_ids = [room["ChatID"] for room in self.cached_rooms(membership, chats_blacklist)]
+                if group:
+                    room_ids = [room_id for room_id in room_ids if await self.is_group_room(cache.get(room_id, "name"))]
+                # Joined rooms without bridge state in the sync: look for the bridge bots
+                await self.resolve_platforms(client, room_ids)
+                result = [{
+                    "ChatID": room_id,
+                    "Chat Name": cache.get(room_id, "name"),
+                    "Platform": cache.get(room_id, "platform"),
+                    "UserID": self.username,
+                    "Donated": membership == "join",
+                } for room_id in room_ids]
+                print("Joined rooms:" if membership == "join" else "Pending invites:")
+                for room in result:
+                    print(f"  - {room['ChatID']} ({room['Chat Name'] or 'Unnamed'}) [Platform: {room['Platform'] or 'unknown'}]")
+                return result
             except Exception as e:
                 print(f"Error while listing {room_type} rooms: {str(e)}")
                 return []
@@ -710,22 +1169,26 @@ class MultiPlatformMessageMonitor:
         if not self.access_token:
             print("Not logged in. Cannot approve room.")
             return False
-        join_url = f"{self.synapse_url}/_matrix/client/v3/join/{room_id}"
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            try:
-                response = await client.post(
-                    join_url,
-                    headers={"Authorization": f"Bearer {self.access_token}"}
-                )
-                if response.status_code == 200:
-                    print(f"Successfully approved (joined) room: {room_id}")
-                    return True
-                else:
-                    print(f"Failed to approve room {room_id}: {response.status_code} - {response.text}")
-                    return False
-            except Exception as e:
-                print(f"Error while approving room {room_id}: {str(e)}")
-                return False
+        return (await self.approve_rooms([room_id]))[room_id]
+
+    async def approve_rooms(self, room_ids, concurrency=ROOM_ACTION_CONCURRENCY):
+        """
+        Accept (join) many rooms concurrently, at most `concurrency` joins at a time.
+        Returns {room_id: True/False}.
+        """
+        if not self.access_token:
+            print("Not logged in. Cannot approve rooms.")
+            return {room_id: False for room_id in room_ids}
+        return await self._room_batch(self._join_room, room_ids, concurrency)
+
+    async def leave_rooms(self, room_ids, concurrency=ROOM_ACTION_CONCURRENCY):
+        """
+        Leave many rooms concurrently, at most `concurrency` at a time. Returns {room_id: True/False}.
+        """
+        if not self.access_token:
+            print("Not logged in. Cannot leave rooms.")
+            return {room_id: False for room_id in room_ids}
+        return await self._room_batch(self._leave_room, room_ids, concurrency)
 
     async def disable_room(self, room_id):
         """
@@ -734,60 +1197,59 @@ class MultiPlatformMessageMonitor:
         if not self.access_token:
             print("Not logged in. Cannot disable room.")
             return False
-        leave_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/leave"
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        return (await self.leave_rooms([room_id]))[room_id]
+
+
+    async def _fetch_member_count(self, client, semaphore, room_id):
+        """
+        Number of joined members of a room from /joined_members (no membership event history).
+        """
+        async with semaphore:
             try:
-                response = await client.post(
-                    leave_url,
+                response = await client.get(
+                    f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/joined_members",
                     headers={"Authorization": f"Bearer {self.access_token}"}
                 )
                 if response.status_code == 200:
-                    print(f"Successfully disabled (left) room: {room_id}")
-                    return True
-                else:
-                    print(f"Failed to disable room {room_id}: {response.status_code} - {response.text}")
-                    return False
+                    num_members = len(response.json().get("joined", {}))
+                    self.room_cache.store(room_id, "num_members", num_members)
+                    return num_members
+                print(f"Failed to fetch members for room {room_id}: {response.status_code} - {response.text}")
             except Exception as e:
-                print(f"Error while disabling room {room_id}: {str(e)}")
-                return False
-
+                print(f"Error fetching members for room {room_id}: {e}")
+            return None
 
     async def get_room_stats(self, room_ids):
         """
         Given a list of room_ids, return a list of dicts with:
         - room_id
         - num_members (number of joined members)
+        Counts come from the room cache, which the sync room summaries keep current; the remaining
+        rooms are fetched concurrently from /joined_members.
         """
         if not self.access_token:
             print("Not logged in. Cannot get room stats.")
             return []
-        stats = []
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
-            for room_id in room_ids:
-                # Get number of members
-                members_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/members"
-                try:
-                    members_resp = await client.get(
-                        members_url,
-                        headers={"Authorization": f"Bearer {self.access_token}"}
-                    )
-                    if members_resp.status_code == 200:
-                        members = members_resp.json().get("chunk", [])
-                        num_members = len(members)
-                    else:
-                        num_members = None
-                except Exception as e:
-                    print(f"Error fetching members for room {room_id}: {e}")
-                    num_members = None
-                stats.append({
-                    "room_id": room_id,
-                    "num_members": num_members
-                })
-        return stats
-
-    async def change_password(self, new_password):
+        cache = self.room_cache
+        async with self._client_session() as client:
+            missing = [room_id for room_id in room_ids if not cache.fresh(room_id, "num_members")]
+            if any(cache.get(room_id, "membership") for room_id in missing):
+                # An incremental sync brings the summaries of rooms whose membership changed
+                await self.sync_rooms(client)
+                missing = [room_id for room_id in missing if not cache.fresh(room_id, "num_members")]
+            semaphore = asyncio.Semaphore(ROOM_FETCH_CONCURRENCY)
+            counts = await asyncio.gather(*(self._fetch_member_count(client, semaphore, room_id) for room_id in missing))
+        fetched = dict(zip(missing, counts))
+        cache.save()
+        return [{
+            "room_id": room_id,
+            "num_members": fetched[room_id] if room_id in fetched else cache.get(room_id, "num_members")
+        } for room_id in room_ids]
+
+    async def change_password(self, new_password, current_password=None):
         """
         Change the password for the current user using the Matrix client API.
+        The current password authenticates the request, it defaults to the one used to log in.
         """
         if not self.access_token:
             print("Not logged in. Cannot change password.")
@@ -797,11 +1259,11 @@ class MultiPlatformMessageMonitor:
             "auth": {
                 "type": "m.login.password",
                 "user": self.username,
-                "password": self.password
+                "password": current_password or self.password
             },
             "new_password": new_password
         }
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        async with self._client_session() as client:
             try:
                 response = await client.post(
                     change_url,
@@ -810,7 +1272,8 @@ class MultiPlatformMessageMonitor:
                 )
                 if response.status_code == 200:
                     print(f"Password changed successfully for user: {self.username}")
-                    self.password = new_password
+                    if self.password:  # monitors that dropped their password after login keep none
+                        self.password = new_password
                     return True
                 else:
                     print(f"Failed to change password: {response.status_code} - {response.text}")
@@ -826,15 +1289,21 @@ class MultiPlatformMessageMonitor:
         if not self.access_token:
             print("Not logged in. Cannot get room name.")
             return None
+        # Rooms tracked by the sync have an up-to-date name in the room cache
+        if self.room_cache.get(room_id, "membership") or self.room_cache.fresh(room_id, "name"):
+            return self.room_cache.get(room_id, "name")
         name_url = f"{self.synapse_url}/_matrix/client/v3/rooms/{room_id}/state/m.room.name"
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        async with self._client_session() as client:
             try:
                 response = await client.get(
                     name_url,
                     headers={"Authorization": f"Bearer {self.access_token}"}
                 )
                 if response.status_code == 200:
-                    return response.json().get("name")
+                    room_name = response.json().get("name")
+                    self.room_cache.store(room_id, "name", room_name)
+                    self.room_cache.save()
+                    return room_name
                 elif response.status_code == 404:
                     print(f"Room {room_id} does not exist or has no name.")
                     return None
@@ -861,11 +1330,12 @@ class MultiPlatformMessageMonitor:
         deactivate_user_url = f"{self.synapse_url}/_synapse/admin/v1/deactivate/{user_id}"
         headers = {"Authorization": f"Bearer {ADMIN_ACCESS_TOKEN}"}
         body = {"erase" : True}
-        async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+        async with self._client_session() as client:
             try:
                 response = await client.post(deactivate_user_url, headers=headers, json=body)
                 if response.status_code in [200, 204]:
                     print(f"Successfully deleted user: {user_id}")
+                    self._forget_tokens()
                     response = await client.delete(delete_media_url, headers=headers)
                     if response.status_code in [200, 204]:
                         print(f"Successfully deleted user's media: {user_id}")
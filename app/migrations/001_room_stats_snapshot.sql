@@ -0,0 +1,15 @@
+-- Room stats collected with the Synapse admin API (admin_collector.py, dbs.RoomStatsTable)
+-- The rows of each participant are replaced when the researcher Chats Overview collects their rooms.
+-- Apply once per database before deploying, e.g.:
+--   psql "$DATABASE_URL" -f migrations/001_room_stats_snapshot.sql
+CREATE TABLE IF NOT EXISTS room_stats_snapshot (
+    chatid VARCHAR NOT NULL,
+    userid VARCHAR NOT NULL,
+    roomname VARCHAR,
+    joined BOOLEAN,
+    joinedmembers INTEGER,
+    localmembers INTEGER,
+    stateevents INTEGER,
+    collectedat TIMESTAMP WITHOUT TIME ZONE,
+    PRIMARY KEY (chatid, userid)
+);
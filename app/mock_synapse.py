@@ -0,0 +1,549 @@
+# MockSynapse: in-process fake Matrix homeserver for exercising MultiPlatformMessageMonitor offline
+# Serves the client and admin endpoints the monitor uses (login, sync, rooms, messages, account data,
+# Synapse admin API) from memory through an httpx.MockTransport, with configurable latency and rate
+# limits. Fake bridge bots join the direct chats they are invited to and answer "login qr" with an
+# m.image QR code, like the mautrix bridges. Used by bench_monitor.py:
+#   mock = MockSynapse(latency=0.005)
+#   user_id = mock.add_user("alice", "password")
+#   mock.add_rooms(user_id, 100)
+#   async with mock.installed():  # m_monitor's shared client now talks to the mock
+#       ...
+
+import asyncio
+import json
+import random
+import re
+import secrets
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+import httpx
+
+DEFAULT_BOTS = {
+    "whatsapp": "@whatsappbot:{server}",
+    "signal": "@signalbot:{server}",
+    "telegram": "@telegrambot:{server}",
+}
+ROOM_NAME_WORDS = ["Family", "Friends", "Work", "Team", "Book Club", "Neighbors", "Football", "Project", "Trip", "Study Group"]
+
+
+def matrix_error(status_code, errcode, error, **extra):
+    return httpx.Response(status_code, json={"errcode": errcode, "error": error, **extra})
+
+
+class MockRoom:
+    """
+    A room: current state keyed by (type, state_key) and the full event history with stream positions.
+    """
+
+    def __init__(self, room_id):
+        self.room_id = room_id
+        self.state = {}
+        self.timeline = []  # [(stream position, event)]
+        self.member_changed = {}  # user_id -> stream position of the last membership change
+
+    def membership(self, user_id):
+        event = self.state.get(("m.room.member", user_id))
+        return event["content"].get("membership") if event else None
+
+    def joined_members(self):
+        return [key for (event_type, key), event in self.state.items() if event_type == "m.room.member" and event["content"].get("membership") == "join"]
+
+    @property
+    def name(self):
+        event = self.state.get(("m.room.name", ""))
+        return event["content"].get("name") if event else None
+
+
+class RateLimiter:
+    """
+    Token bucket per access token: `rate` requests per second with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}  # key -> (tokens, time of the last update)
+
+    def retry_after_ms(self, key):
+        """
+        Take a token for key. Returns None if one was available, else the milliseconds until there is one.
+        """
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            self.buckets[key] = (tokens - 1, now)
+            return None
+        self.buckets[key] = (tokens, now)
+        return int((1 - tokens) / self.rate * 1000) + 1
+
+
+class MockSynapse:
+    """
+    In-memory homeserver. Every request waits `latency` seconds (+/- `jitter` as a fraction);
+    with `rate_limit` set, POST and PUT requests of each access token are limited to that many per
+    second (bursts of `rate_limit_burst`) and answered with 429 M_LIMIT_EXCEEDED like Synapse does.
+    Bridge bots answer after `bot_delay` seconds. With `token_lifetime` (s) access tokens expire
+    and have to be refreshed.
+    """
+
+    def __init__(self, server_url="http://mock-synapse", latency=0.0, jitter=0.2, rate_limit=None,
+                 rate_limit_burst=10, bot_delay=0.05, admin_token="mock-admin-token", bots=None, token_lifetime=None):
+        self.server_url = server_url.rstrip("/")
+        self.server_name = self.server_url.split("//")[1].split(":")[0]
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limiter = RateLimiter(rate_limit, rate_limit_burst) if rate_limit else None
+        self.bot_delay = bot_delay
+        self.admin_token = admin_token
+        self.token_lifetime = token_lifetime
+        bots = bots or {platform: mxid.format(server=self.server_name) for platform, mxid in DEFAULT_BOTS.items()}
+        self.bots = {mxid: platform for platform, mxid in bots.items() if mxid}  # bot MXID -> platform
+        self.users = {}  # user_id -> password
+        self.access_tokens = {}  # access token -> (user_id, expiry time or None)
+        self.refresh_tokens = {}  # refresh token -> user_id
+        self.account_data = {}  # (user_id, type) -> content
+        self.rooms = {}  # room_id -> MockRoom
+        self.user_rooms = {}  # user_id -> ids of the rooms the user has a membership in
+        self.stream_position = 0
+        self.counter = 0
+        self.requests = Counter()  # route name -> requests served
+        self.rate_limited = 0
+        self._notify = None  # asyncio.Event set when new events arrive, wakes up long-polling syncs
+        self.routes = [
+            ("POST", r"/_matrix/client/v3/login", self.login, None),
+            ("POST", r"/_matrix/client/v3/refresh", self.refresh, None),
+            ("GET", r"/_matrix/client/v3/account/whoami", self.whoami, "user"),
+            ("POST", r"/_matrix/client/v3/account/password", self.change_password, "user"),
+            ("GET", r"/_matrix/client/v3/joined_rooms", self.joined_rooms, "user"),
+            ("GET", r"/_matrix/client/v3/sync", self.sync, "user"),
+            ("POST", r"/_matrix/client/v3/createRoom", self.create_room, "user"),
+            ("POST", r"/_matrix/client/v3/join/(?P<room_id>[^/]+)", self.join, "user"),
+            ("POST", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/join", self.join, "user"),
+            ("POST", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/leave", self.leave, "user"),
+            ("GET", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/state", self.room_state, "user"),
+            ("GET", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/state/(?P<event_type>[^/]+)(?:/(?P<state_key>[^/]*))?", self.room_state_event, "user"),
+            ("GET", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/joined_members", self.joined_members, "user"),
+            ("GET", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/members", self.members, "user"),
+            ("GET", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/messages", self.messages, "user"),
+            ("POST", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/send/(?P<event_type>[^/]+)", self.send, "user"),
+            ("PUT", r"/_matrix/client/v3/rooms/(?P<room_id>[^/]+)/send/(?P<event_type>[^/]+)/(?P<txn_id>[^/]+)", self.send, "user"),
+            ("GET", r"/_matrix/client/v3/user/(?P<target>[^/]+)/account_data/(?P<data_type>[^/]+)", self.get_account_data, "user"),
+            ("PUT", r"/_matrix/client/v3/user/(?P<target>[^/]+)/account_data/(?P<data_type>[^/]+)", self.put_account_data, "user"),
+            ("GET", r"/_synapse/admin/v2/users/(?P<user_id>[^/]+)", self.admin_query_user, "admin"),
+            ("PUT", r"/_synapse/admin/v2/users/(?P<user_id>[^/]+)", self.admin_register, "admin"),
+            ("GET", r"/_synapse/admin/v1/users/(?P<user_id>[^/]+)/joined_rooms", self.admin_joined_rooms, "admin"),
+            ("DELETE", r"/_synapse/admin/v1/users/(?P<user_id>[^/]+)/media", self.admin_delete_media, "admin"),
+            ("GET", r"/_synapse/admin/v1/rooms/(?P<room_id>[^/]+)", self.admin_room_details, "admin"),
+            ("POST", r"/_synapse/admin/v1/deactivate/(?P<user_id>[^/]+)", self.admin_deactivate, "admin"),
+        ]
+        self.routes = [(method, re.compile(pattern + "$"), handler, auth) for method, pattern, handler, auth in self.routes]
+
+    # Setup
+
+    def user_id(self, username):
+        return username if username.startswith("@") else f"@{username}:{self.server_name}"
+
+    def bot_mxid(self, platform):
+        return next((mxid for mxid, bot_platform in self.bots.items() if bot_platform == platform), None)
+
+    def add_user(self, username, password="password"):
+        user_id = self.user_id(username)
+        self.users[user_id] = password
+        self.user_rooms.setdefault(user_id, set())
+        return user_id
+
+    def add_rooms(self, user_id, count, membership="join", platforms=None, members=4, bridge_state_ratio=0.8, seed=0):
+        """
+        Create `count` bridged chats of a user, joined or with a pending invite from the bridge bot.
+        Each room has the bot, `members` puppet users and a name; `bridge_state_ratio` of them also carry
+        the bridge info state event, the others can only be recognised by their bot member.
+        Returns the room IDs.
+        """
+        rng = random.Random(seed)
+        platforms = platforms or list(dict.fromkeys(self.bots.values()))
+        room_ids = []
+        for _ in range(count):
+            platform = rng.choice(platforms)
+            bot = self.bot_mxid(platform)
+            room = self._new_room(bot)
+            self._add_state(room, bot, "m.room.name", "", {"name": f"{rng.choice(ROOM_NAME_WORDS)} {rng.randint(1, 9999)}"}, notify=False)
+            if rng.random() < bridge_state_ratio:
+                self._add_state(room, bot, "m.bridge", f"{platform}-{room.room_id}", {"protocol": {"id": platform}}, notify=False)
+            for i in range(members):
+                puppet = f"@{platform}_{rng.randint(10 ** 9, 10 ** 10)}:{self.server_name}"
+                self._set_membership(room, puppet, puppet, "join", notify=False)
+            self._set_membership(room, bot, user_id, membership, notify=False)
+            room_ids.append(room.room_id)
+        return room_ids
+
+    def transport(self):
+        return httpx.MockTransport(self.handle)
+
+    def client(self):
+        """
+        An httpx.AsyncClient whose requests are served by the mock.
+        """
+        return httpx.AsyncClient(transport=self.transport(), base_url=self.server_url)
+
+    @asynccontextmanager
+    async def installed(self):
+        """
+        Serve m_monitor's shared client of the running event loop from the mock (wrapped in a
+        ResilientClient like the real one), restoring the previous client on exit.
+        """
+        import m_monitor
+        from resilient_http import ResilientClient
+        loop = asyncio.get_running_loop()
+        client = ResilientClient(self.client())
+        with m_monitor._shared_clients_lock:
+            clients = m_monitor._shared_clients.setdefault(loop, {})
+            previous = dict(clients)
+            clients.update({True: client, False: client})
+        try:
+            yield client
+        finally:
+            with m_monitor._shared_clients_lock:
+                m_monitor._shared_clients[loop] = previous
+            await client.aclose()
+
+    def reset_stats(self):
+        self.requests.clear()
+        self.rate_limited = 0
+
+    # Events
+
+    def _next_id(self, prefix):
+        self.counter += 1
+        return f"{prefix}{self.counter}{secrets.token_hex(4)}"
+
+    def _new_room(self, creator):
+        room = MockRoom(self._next_id("!") + f":{self.server_name}")
+        self.rooms[room.room_id] = room
+        self._set_membership(room, creator, creator, "join", notify=False)
+        self._add_state(room, creator, "m.room.create", "", {"creator": creator}, notify=False)
+        return room
+
+    def _add_event(self, room, sender, event_type, content, state_key=None, notify=True):
+        self.stream_position += 1
+        event = {
+            "type": event_type,
+            "sender": sender,
+            "content": content,
+            "event_id": self._next_id("$"),
+            "origin_server_ts": int(time.time() * 1000),
+            "room_id": room.room_id,
+        }
+        if state_key is not None:
+            event["state_key"] = state_key
+            room.state[(event_type, state_key)] = event
+        room.timeline.append((self.stream_position, event))
+        if notify and self._notify is not None:
+            self._notify.set()
+            self._notify = None
+        return event
+
+    def _add_state(self, room, sender, event_type, state_key, content, notify=True):
+        return self._add_event(room, sender, event_type, content, state_key, notify)
+
+    def _set_membership(self, room, sender, user_id, membership, notify=True):
+        event = self._add_state(room, sender, "m.room.member", user_id, {"membership": membership}, notify)
+        room.member_changed[user_id] = self.stream_position
+        self.user_rooms.setdefault(user_id, set()).add(room.room_id)
+        # Bridge bots accept the invites to direct chats at once
+        if membership == "invite" and user_id in self.bots:
+            self._set_membership(room, user_id, user_id, "join", notify)
+        return event
+
+    def _bot_reply(self, room, bot, message):
+        """
+        Answer a message in a direct chat with a bridge bot after bot_delay seconds.
+        """
+        if message.strip().lower().startswith("login"):
+            content = {"msgtype": "m.image", "body": f"{self.bots[bot]}-login-{secrets.token_urlsafe(24)}",
+                       "url": f"mxc://{self.server_name}/{secrets.token_hex(12)}", "info": {"mimetype": "image/png"}}
+        else:
+            content = {"msgtype": "m.notice", "body": "Hello, I'm a bridge bot. Use `login qr` to log in."}
+        asyncio.get_running_loop().call_later(self.bot_delay, self._add_event, room, bot, "m.room.message", content)
+
+    # Request handling
+
+    async def handle(self, request):
+        if self.latency:
+            await asyncio.sleep(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+        path = request.url.path
+        for method, pattern, handler, auth in self.routes:
+            match = pattern.match(path)
+            if match is None or method != request.method:
+                continue
+            self.requests[handler.__name__] += 1
+            token = (request.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+            user_id = None
+            if auth == "admin" and token != self.admin_token:
+                return matrix_error(403, "M_FORBIDDEN", "You are not a server admin")
+            if auth == "user":
+                user_id, expires_at = self.access_tokens.get(token, (None, None))
+                if user_id is None:
+                    return matrix_error(401, "M_UNKNOWN_TOKEN", "Unrecognised access token", soft_logout=False)
+                if expires_at is not None and time.time() > expires_at:
+                    return matrix_error(401, "M_UNKNOWN_TOKEN", "Access token has expired", soft_logout=True)
+            if self.rate_limiter and method in ("POST", "PUT"):
+                retry_after_ms = self.rate_limiter.retry_after_ms(token or "anonymous")
+                if retry_after_ms is not None:
+                    self.rate_limited += 1
+                    return matrix_error(429, "M_LIMIT_EXCEEDED", "Too Many Requests", retry_after_ms=retry_after_ms)
+            try:
+                body = json.loads(request.content) if request.content else {}
+            except ValueError:
+                return matrix_error(400, "M_NOT_JSON", "Content not JSON.")
+            result = handler(request, user_id, body, **match.groupdict())
+            return await result if asyncio.iscoroutine(result) else result
+        self.requests["unrecognized"] += 1
+        return matrix_error(404, "M_UNRECOGNIZED", f"Unrecognized request: {request.method} {path}")
+
+    def _room(self, room_id, user_id, membership=("join",)):
+        room = self.rooms.get(room_id)
+        if room is None or room.membership(user_id) not in membership:
+            return None
+        return room
+
+    # Client API
+
+    def _issue_tokens(self, user_id, with_refresh_token):
+        access_token = self._next_id("syt_")
+        expires_at = time.time() + self.token_lifetime if self.token_lifetime and with_refresh_token else None
+        self.access_tokens[access_token] = (user_id, expires_at)
+        data = {"user_id": user_id, "access_token": access_token, "device_id": "MOCKDEVICE", "home_server": self.server_name}
+        if with_refresh_token:
+            refresh_token = self._next_id("syr_")
+            self.refresh_tokens[refresh_token] = user_id
+            data["refresh_token"] = refresh_token
+            if expires_at:
+                data["expires_in_ms"] = int(self.token_lifetime * 1000)
+        return data
+
+    def login(self, request, _, body):
+        identifier = body.get("identifier", {})
+        user_id = self.user_id(identifier.get("user") or body.get("user") or "")
+        if self.users.get(user_id) is None or self.users[user_id] != body.get("password"):
+            return matrix_error(403, "M_FORBIDDEN", "Invalid username or password")
+        return httpx.Response(200, json=self._issue_tokens(user_id, body.get("refresh_token", False)))
+
+    def refresh(self, request, _, body):
+        user_id = self.refresh_tokens.pop(body.get("refresh_token"), None)
+        if user_id is None:
+            return matrix_error(401, "M_UNKNOWN_TOKEN", "Unknown refresh token", soft_logout=False)
+        data = self._issue_tokens(user_id, True)
+        return httpx.Response(200, json={key: data[key] for key in ("access_token", "refresh_token", "expires_in_ms") if key in data})
+
+    def whoami(self, request, user_id, body):
+        return httpx.Response(200, json={"user_id": user_id, "device_id": "MOCKDEVICE"})
+
+    def change_password(self, request, user_id, body):
+        if body.get("auth", {}).get("password") != self.users.get(user_id):
+            return matrix_error(401, "M_FORBIDDEN", "Invalid password", flows=[{"stages": ["m.login.password"]}])
+        self.users[user_id] = body.get("new_password")
+        return httpx.Response(200, json={})
+
+    def joined_rooms(self, request, user_id, body):
+        rooms = [room_id for room_id in self.user_rooms.get(user_id, ()) if self.rooms[room_id].membership(user_id) == "join"]
+        return httpx.Response(200, json={"joined_rooms": rooms})
+
+    def create_room(self, request, user_id, body):
+        room = self._new_room(user_id)
+        if body.get("name"):
+            self._add_state(room, user_id, "m.room.name", "", {"name": body["name"]})
+        for invitee in body.get("invite", []):
+            self._set_membership(room, user_id, invitee, "invite")
+        return httpx.Response(200, json={"room_id": room.room_id})
+
+    def join(self, request, user_id, body, room_id):
+        room = self._room(room_id, user_id, membership=("invite", "join"))
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not invited to this room.")
+        if room.membership(user_id) != "join":
+            self._set_membership(room, user_id, user_id, "join")
+        return httpx.Response(200, json={"room_id": room_id})
+
+    def leave(self, request, user_id, body, room_id):
+        room = self._room(room_id, user_id, membership=("invite", "join"))
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not a member of this room.")
+        self._set_membership(room, user_id, user_id, "leave")
+        return httpx.Response(200, json={})
+
+    def room_state(self, request, user_id, body, room_id):
+        room = self._room(room_id, user_id)
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not joined to this room.")
+        return httpx.Response(200, json=list(room.state.values()))
+
+    def room_state_event(self, request, user_id, body, room_id, event_type, state_key=None):
+        room = self._room(room_id, user_id)
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not joined to this room.")
+        event = room.state.get((event_type, state_key or ""))
+        # Like Synapse, a member event of someone who left is still returned
+        if event is None:
+            return matrix_error(404, "M_NOT_FOUND", "Event not found.")
+        return httpx.Response(200, json=event["content"])
+
+    def joined_members(self, request, user_id, body, room_id):
+        room = self._room(room_id, user_id)
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not joined to this room.")
+        return httpx.Response(200, json={"joined": {member: {"display_name": None, "avatar_url": None} for member in room.joined_members()}})
+
+    def members(self, request, user_id, body, room_id):
+        room = self._room(room_id, user_id)
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not joined to this room.")
+        return httpx.Response(200, json={"chunk": [event for (event_type, _), event in room.state.items() if event_type == "m.room.member"]})
+
+    def messages(self, request, user_id, body, room_id):
+        room = self._room(room_id, user_id)
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not joined to this room.")
+        limit = int(request.url.params.get("limit", 10))
+        events = [event for _, event in room.timeline]
+        chunk = events[::-1][:limit] if request.url.params.get("dir", "b") == "b" else events[:limit]
+        return httpx.Response(200, json={"chunk": chunk, "start": str(self.stream_position), "end": str(max(0, self.stream_position - limit))})
+
+    def send(self, request, user_id, body, room_id, event_type, txn_id=None):
+        room = self._room(room_id, user_id)
+        if room is None:
+            return matrix_error(403, "M_FORBIDDEN", "You are not joined to this room.")
+        event = self._add_event(room, user_id, event_type, body)
+        if event_type == "m.room.message":
+            for bot in self.bots.keys() & set(room.joined_members()):
+                self._bot_reply(room, bot, body.get("body", ""))
+        return httpx.Response(200, json={"event_id": event["event_id"]})
+
+    def get_account_data(self, request, user_id, body, target, data_type):
+        if target != user_id:
+            return matrix_error(403, "M_FORBIDDEN", "Cannot get account data for other users.")
+        content = self.account_data.get((user_id, data_type))
+        if content is None:
+            return matrix_error(404, "M_NOT_FOUND", "Account data not found")
+        return httpx.Response(200, json=content)
+
+    def put_account_data(self, request, user_id, body, target, data_type):
+        if target != user_id:
+            return matrix_error(403, "M_FORBIDDEN", "Cannot add account data for other users.")
+        self.account_data[(user_id, data_type)] = body
+        return httpx.Response(200, json={})
+
+    # Sync
+
+    @staticmethod
+    def _filter_events(events, event_filter):
+        types = event_filter.get("types")
+        senders = event_filter.get("senders")
+        return [event for event in events if (types is None or event["type"] in types) and (senders is None or event["sender"] in senders)]
+
+    def _sync_response(self, user_id, since, sync_filter):
+        room_filter = sync_filter.get("room", {})
+        state_filter = room_filter.get("state", {})
+        timeline_filter = room_filter.get("timeline", {})
+        limit = timeline_filter.get("limit", 10)
+        allowed_rooms = set(room_filter["rooms"]) if "rooms" in room_filter else None
+        rooms = {"join": {}, "invite": {}, "leave": {}}
+        for room_id in self.user_rooms.get(user_id, ()):
+            if allowed_rooms is not None and room_id not in allowed_rooms:
+                continue
+            room = self.rooms[room_id]
+            membership = room.membership(user_id)
+            changed = room.member_changed.get(user_id, 0) > since
+            if membership == "join":
+                if since and not changed:
+                    new_events = [event for position, event in room.timeline if position > since]
+                    timeline = self._filter_events(new_events, timeline_filter)
+                    if not timeline:
+                        continue
+                    entry = {"timeline": {"events": timeline[-limit:], "limited": len(timeline) > limit}, "state": {"events": []}}
+                    if any(event["type"] == "m.room.member" for event in new_events):
+                        entry["summary"] = {"m.joined_member_count": len(room.joined_members())}
+                else:
+                    timeline = self._filter_events([event for _, event in room.timeline], timeline_filter)[-limit:]
+                    in_timeline = {event["event_id"] for event in timeline}
+                    state = [event for event in self._filter_events(list(room.state.values()), state_filter) if event["event_id"] not in in_timeline]
+                    entry = {"state": {"events": state}, "timeline": {"events": timeline, "limited": True},
+                             "summary": {"m.joined_member_count": len(room.joined_members())}}
+                rooms["join"][room_id] = entry
+            elif membership == "invite" and (not since or changed):
+                invite_state = [room.state[key] for key in (("m.room.name", ""), ("m.room.create", ""), ("m.room.member", user_id)) if key in room.state]
+                rooms["invite"][room_id] = {"invite_state": {"events": [
+                    {key: event[key] for key in ("type", "state_key", "sender", "content")} for event in invite_state
+                ]}}
+            elif membership == "leave" and since and changed:
+                rooms["leave"][room_id] = {"timeline": {"events": []}}
+        return {"next_batch": str(self.stream_position), "rooms": rooms, "account_data": {"events": []}, "presence": {"events": []}}
+
+    async def sync(self, request, user_id, body):
+        params = request.url.params
+        try:
+            sync_filter = json.loads(params.get("filter") or "{}")
+        except ValueError:
+            return matrix_error(400, "M_INVALID_PARAM", "Only inline JSON filters are supported")
+        since = int(params.get("since") or 0)
+        deadline = time.monotonic() + int(params.get("timeout") or 0) / 1000
+        while True:
+            if self._notify is None:
+                self._notify = asyncio.Event()
+            notify = self._notify  # replaced by the next event, so every waiter sees it set
+            data = self._sync_response(user_id, since, sync_filter)
+            remaining = deadline - time.monotonic()
+            if not since or any(data["rooms"].values()) or remaining <= 0:
+                return httpx.Response(200, json=data)
+            # Long-poll: wait for new events, then build the response again
+            try:
+                await asyncio.wait_for(notify.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    # Admin API
+
+    def admin_register(self, request, _, body, user_id):
+        created = user_id not in self.users
+        self.add_user(user_id, body.get("password"))
+        return httpx.Response(201 if created else 200, json={"name": user_id, "displayname": body.get("displayname"), "admin": False, "deactivated": False})
+
+    def admin_query_user(self, request, _, body, user_id):
+        if user_id not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        return httpx.Response(200, json={"name": user_id, "displayname": user_id[1:].split(":")[0], "admin": False, "deactivated": False})
+
+    def admin_joined_rooms(self, request, _, body, user_id):
+        if user_id not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        rooms = [room_id for room_id in self.user_rooms.get(user_id, ()) if self.rooms[room_id].membership(user_id) == "join"]
+        return httpx.Response(200, json={"joined_rooms": rooms, "total": len(rooms)})
+
+    def admin_room_details(self, request, _, body, room_id):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return matrix_error(404, "M_NOT_FOUND", "Room not found")
+        joined = room.joined_members()
+        return httpx.Response(200, json={
+            "room_id": room_id,
+            "name": room.name,
+            "joined_members": len(joined),
+            "joined_local_members": sum(1 for member in joined if member.endswith(f":{self.server_name}")),
+            "state_events": len(room.state),
+            "creator": room.state[("m.room.create", "")]["content"].get("creator"),
+        })
+
+    def admin_deactivate(self, request, _, body, user_id):
+        if user_id not in self.users:
+            return matrix_error(404, "M_NOT_FOUND", "User not found")
+        for room_id in list(self.user_rooms.get(user_id, ())):
+            room = self.rooms[room_id]
+            if room.membership(user_id) in ("join", "invite"):
+                self._set_membership(room, user_id, user_id, "leave")
+        self.users.pop(user_id)
+        self.access_tokens = {token: entry for token, entry in self.access_tokens.items() if entry[0] != user_id}
+        return httpx.Response(200, json={"id_server_unbind_result": "success"})
+
+    def admin_delete_media(self, request, _, body, user_id):
+        return httpx.Response(200, json={"deleted_media": [], "total": 0})
@@ -0,0 +1,93 @@
+# MonitorPool: one WebMonitor per user for the whole Streamlit process
+# All monitors run on the shared background loop, so they share its pooled HTTP client, and a user's
+# access token is reused by every browser tab and rerun. Monitors of users that were not seen for
+# MONITOR_IDLE_TIMEOUT seconds are evicted together with their background sync.
+# New monitors first try the tokens of an earlier login (token_store.py), so the password is only
+# needed when there are none or they can no longer be refreshed. Pooled monitors drop the password
+# once logged in; when their tokens can no longer be refreshed the user has to log in again.
+
+import os
+import threading
+import time
+from background_loop import run_async
+from web_monitor import WebMonitor
+
+MONITOR_IDLE_TIMEOUT = int(os.getenv("MONITOR_IDLE_TIMEOUT", "1800"))
+MONITOR_PLATFORMS = ["signal", "whatsapp", "telegram"]
+
+
+class MonitorPool:
+    """
+    Process-wide WebMonitor instances keyed by user ID, logged in once and evicted when idle.
+    """
+
+    def __init__(self, idle_timeout=MONITOR_IDLE_TIMEOUT, platforms=None):
+        self.idle_timeout = idle_timeout
+        self.platforms = platforms or MONITOR_PLATFORMS
+        self.lock = threading.Lock()
+        self.login_locks = {}  # user_id -> lock, so concurrent tabs of a user log in once
+        self.monitors = {}  # user_id -> WebMonitor
+        self.last_used = {}  # user_id -> time of the last get()
+
+    def run(self, coro, timeout=None):
+        """
+        Run a monitor coroutine on the shared background loop and return its result.
+        """
+        return run_async(coro, timeout)
+
+    def _session_valid(self, web_monitor):
+        # Refreshes the access token if it is about to expire, no request otherwise
+        return web_monitor is not None and self.run(web_monitor.monitor.ensure_session())
+
+    def get(self, user_id, password=None):
+        """
+        Return the logged-in WebMonitor of a user, logging in to Matrix only if the pool has none yet.
+        Without a password only the stored tokens can be used. Returns None if the login fails.
+        """
+        self.evict_idle()
+        with self.lock:
+            self.last_used[user_id] = time.time()
+            web_monitor = self.monitors.get(user_id)
+            login_lock = self.login_locks.setdefault(user_id, threading.Lock())
+        if self._session_valid(web_monitor):
+            return web_monitor
+        with login_lock:
+            with self.lock:
+                web_monitor = self.monitors.get(user_id)
+            if self._session_valid(web_monitor):
+                return web_monitor
+            web_monitor = WebMonitor(username=user_id, password=password, platforms=self.platforms)
+            login_result = self.run(web_monitor.login())
+            if login_result.get("status") != "success":
+                self.remove(user_id)
+                return None
+            web_monitor.forget_password()
+            with self.lock:
+                self.monitors[user_id] = web_monitor
+                self.last_used[user_id] = time.time()
+            return web_monitor
+
+    def remove(self, user_id):
+        """
+        Drop a user's monitor and stop its background sync (e.g. after the account was deleted).
+        """
+        with self.lock:
+            web_monitor = self.monitors.pop(user_id, None)
+            self.last_used.pop(user_id, None)
+            self.login_locks.pop(user_id, None)
+        if web_monitor is not None:
+            web_monitor.stop_background_sync()
+
+    def evict_idle(self):
+        """
+        Remove the monitors of users that were not seen for idle_timeout seconds.
+        """
+        now = time.time()
+        with self.lock:
+            idle = [user_id for user_id, last_used in self.last_used.items() if now - last_used > self.idle_timeout]
+        for user_id in idle:
+            print(f"MonitorPool: Evicting idle monitor of user {user_id}")
+            self.remove(user_id)
+
+
+monitor_pool = MonitorPool()
@@ -0,0 +1,241 @@
+# Bulk participant provisioning
+# Registers a CSV cohort of participants: passwords are hashed in a process pool, Synapse accounts
+# and server users are created concurrently under a rate limit, and the database rows are added
+# in one batch. Every participant gets an outcome row instead of the whole run stopping at the first error.
+
+import asyncio
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+import pandas as pd
+from background_loop import run_async_with_progress
+from m_monitor import MultiPlatformMessageMonitor
+
+PROVISION_CONCURRENCY = int(os.getenv("PROVISION_CONCURRENCY", "10"))  # requests in flight per endpoint
+PROVISION_RATE = float(os.getenv("PROVISION_RATE", "20"))  # requests started per second per endpoint, 0 = unlimited
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "0")) or None  # None = one worker per CPU
+USERNAME_PATTERN = r'^[a-z0-9=_.\-/+]+$'
+OUTCOME_COLUMNS = ["Username", "Password", "Status", "Step", "Message"]
+
+
+def hash_password(password):
+    """
+    bcrypt hash of a password, run in the worker processes.
+    """
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+
+def generate_password():
+    return secrets.token_urlsafe(12)
+
+
+def read_participants_csv(file):
+    """
+    Read a participants CSV with a 'username' column and an optional 'password' column.
+    Participants without a password get a generated one, which is returned in the outcome report.
+    """
+    df = pd.read_csv(file, dtype=str).fillna("")
+    df.columns = [c.strip().lower() for c in df.columns]
+    if "username" not in df.columns:
+        raise ValueError("The CSV file must have a 'username' column.")
+    participants = []
+    for _, row in df.iterrows():
+        username = row["username"].strip()
+        if not username:
+            continue
+        password = row.get("password", "").strip() if "password" in df.columns else ""
+        participants.append({"username": username, "password": password or generate_password()})
+    return participants
+
+
+class RateLimiter:
+    """
+    Caps the number of concurrent requests and spaces out request starts to at most `rate` per second.
+    """
+
+    def __init__(self, concurrency, rate):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.interval:
+            async with self.lock:
+                now = time.monotonic()
+                wait = self.next_start - now
+                self.next_start = max(now, self.next_start) + self.interval
+            if wait > 0:
+                await asyncio.sleep(wait)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+
+class BulkProvisioner:
+    """
+    Provision a cohort of participants: validate, hash, register on Synapse, add to the database
+    and create on the server. Returns one outcome per participant.
+    """
+
+    def __init__(self, users, creator_id, synapse_url, server_url, concurrency=PROVISION_CONCURRENCY, rate=PROVISION_RATE, hash_workers=HASH_WORKERS):
+        self.users = users
+        self.creator_id = creator_id
+        self.synapse_url = synapse_url
+        self.server_url = server_url
+        self.concurrency = concurrency
+        self.rate = rate
+        self.hash_workers = hash_workers
+
+    def validate(self, participants, outcomes):
+        """
+        Drop participants with an invalid, duplicated or already registered username.
+        """
+        valid = []
+        seen = set()
+        for participant in participants:
+            username = participant["username"]
+            if not re.match(USERNAME_PATTERN, username):
+                self._fail(outcomes, participant, "Validation", "Username can only contain: a-z, 0-9, = _ - . / +")
+            elif username in seen:
+                self._fail(outcomes, participant, "Validation", "Duplicate username in the file.")
+            else:
+                seen.add(username)
+                valid.append(participant)
+        existing = {u['UserID'] for u in self.users.get_users_by_ids([p["username"] for p in valid], primary=True)}
+        for participant in [p for p in valid if p["username"] in existing]:
+            self._fail(outcomes, participant, "Validation", "Username already exists.")
+        return [p for p in valid if p["username"] not in existing]
+
+    def hash_passwords(self, participants):
+        """
+        Hash all passwords in a process pool (bcrypt is deliberately slow, ~0.25s per password).
+        """
+        if not participants:
+            return
+        # spawn instead of fork: the Streamlit server is multi-threaded and holds open DB connections
+        with ProcessPoolExecutor(max_workers=self.hash_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            passwords = [p["password"] for p in participants]
+            chunksize = max(1, len(passwords) // ((self.hash_workers or os.cpu_count() or 1) * 4))
+            for participant, hashed_password in zip(participants, pool.map(hash_password, passwords, chunksize=chunksize)):
+                participant["hashed_password"] = hashed_password
+
+    async def register_on_synapse(self, participants, outcomes, progress):
+        """
+        Create the Matrix accounts concurrently. Returns the participants that were registered.
+        Participants whose Matrix account already exists are skipped: the admin registration is an
+        upsert and would otherwise reset the password of that account.
+        """
+        monitor = MultiPlatformMessageMonitor(username=self.creator_id, password=None, server_url=self.synapse_url)
+        limiter = RateLimiter(self.concurrency, self.rate)
+        done = 0
+
+        async def register(participant):
+            nonlocal done
+            async with limiter:
+                exists = await monitor.user_exists(participant["username"])
+            if exists is None:
+                result = None
+                self._fail(outcomes, participant, "Matrix registration", "Could not check whether the Matrix account already exists.")
+            elif exists:
+                result = None
+                self._fail(outcomes, participant, "Matrix registration", "Matrix account already exists, it was left unchanged.")
+            else:
+                async with limiter:
+                    result = await monitor.register(participant["username"], participant["password"])
+                if result is None:  # register() returns {} for an empty success body
+                    self._fail(outcomes, participant, "Matrix registration", "Registration failed.")
+            done += 1
+            progress("Registering on Matrix", done, len(participants))
+            return result
+
+        # The monitor uses the background loop's shared HTTP client, which stays open for other users
+        results = await asyncio.gather(*(register(p) for p in participants))
+        return [p for p, result in zip(participants, results) if result is not None]
+
+    async def create_on_server(self, participants, outcomes, progress):
+        """
+        Send the new users to the server's /api/user/create endpoint concurrently.
+        """
+        limiter = RateLimiter(self.concurrency, self.rate)
+        done = 0
+
+        async def create(client, participant):
+            nonlocal done
+            try:
+                async with limiter:
+                    response = await client.post(
+                        f"{self.server_url}/api/user/create",
+                        json={"username": participant["username"], "password": participant["password"]}
+                    )
+                data = response.json()
+                if data.get("success"):
+                    self._succeed(outcomes, participant)
+                else:
+                    self._fail(outcomes, participant, "Server", f"Error registering user on server: {data.get('message', 'Unknown error')}")
+            except Exception as e:
+                self._fail(outcomes, participant, "Server", f"Error registering user on server: {str(e)}")
+            done += 1
+            progress("Creating on server", done, len(participants))
+
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            await asyncio.gather(*(create(client, p) for p in participants))
+
+    def provision(self, participants, progress=None):
+        """
+        Run the whole pipeline and return the outcomes as a DataFrame (one row per participant).
+        progress(stage, done, total) is called as participants move through each stage.
+        """
+        progress = progress or (lambda stage, done, total: None)
+        outcomes = {}  # CSV row -> outcome
+        for row, participant in enumerate(participants):
+            participant["row"] = row
+        participants = self.validate(participants, outcomes)
+
+        progress("Hashing passwords", 0, len(participants))
+        self.hash_passwords(participants)
+
+        # Async stages run on the background loop, their progress is shown from this thread
+        registered = run_async_with_progress(lambda report: self.register_on_synapse(participants, outcomes, report), progress)
+
+        progress("Adding to the database", 0, len(registered))
+        added = set(self.users.add_users(
+            [(p["username"], p["hashed_password"]) for p in registered],
+            creator_id=self.creator_id,
+            role="User",
+            active=True,
+        ))
+        for participant in registered:
+            if participant["username"] not in added:
+                self._fail(outcomes, participant, "Database", "Failed to add the user to the database.")
+        added_participants = [p for p in registered if p["username"] in added]
+
+        run_async_with_progress(lambda report: self.create_on_server(added_participants, outcomes, report), progress)
+        return pd.DataFrame([outcomes[row] for row in sorted(outcomes)], columns=OUTCOME_COLUMNS)
+
+    @staticmethod
+    def _succeed(outcomes, participant):
+        outcomes[participant["row"]] = {
+            "Username": participant["username"],
+            "Password": participant["password"],
+            "Status": "Created",
+            "Step": "Done",
+            "Message": "User registered successfully.",
+        }
+
+    @staticmethod
+    def _fail(outcomes, participant, step, message):
+        outcomes[participant["row"]] = {
+            "Username": participant["username"],
+            "Password": "",
+            "Status": "Failed",
+            "Step": step,
+            "Message": message,
+        }
@@ -0,0 +1,282 @@
+# QueryStats: timing layer for SQLAlchemy engines
+# Records per-statement latency histograms keyed by the calling dbs.py / async_dbs.py method,
+# rows written, connection pool usage and wait time, and a slow-query log.
+# Rows are only counted for statements without a result (INSERT/UPDATE/DELETE): for SELECTs the
+# DB-API rowcount is -1 on most drivers and the rows are fetched after the statement events have fired.
+
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import event
+
+try:
+    import greenlet  # used by SQLAlchemy's asyncio layer, lets us find the awaiting async_dbs method
+except ImportError:
+    greenlet = None
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+# Write the per-method summary to the log every N statements (0 disables it)
+QUERY_SUMMARY_EVERY = int(os.getenv("QUERY_SUMMARY_EVERY", "1000"))
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+HISTOGRAM_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+TABLE_MODULES = {"dbs", "async_dbs"}
+
+
+def bucket_labels():
+    labels = [f"<= {b} ms" for b in HISTOGRAM_BUCKETS_MS]
+    labels.append(f"> {HISTOGRAM_BUCKETS_MS[-1]} ms")
+    return labels
+
+
+def bucket_index(elapsed_ms):
+    for i, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+        if elapsed_ms <= bound:
+            return i
+    return len(HISTOGRAM_BUCKETS_MS)
+
+
+def find_table_method(frame):
+    """
+    Walk up the stack and return 'Class.method' of the first table method in dbs.py or async_dbs.py.
+    """
+    while frame is not None:
+        if frame.f_globals.get("__name__") in TABLE_MODULES:
+            owner = frame.f_locals.get("self")
+            if owner is not None and not type(owner).__name__.endswith("Cache"):
+                return f"{type(owner).__name__}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def calling_method():
+    """
+    Return the dbs.py method that issued the current statement, or 'other'.
+    Async statements run inside a greenlet, so the awaiting coroutine is found on the parent greenlet.
+    """
+    method = find_table_method(sys._getframe(1))
+    if method is None and greenlet is not None:
+        parent = greenlet.getcurrent().parent
+        if parent is not None:
+            method = find_table_method(parent.gr_frame)
+    return method or "other"
+
+
+class QueryStats:
+    """
+    Thread-safe collector of query timings, fed by SQLAlchemy engine events.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_log_size=200, summary_every=QUERY_SUMMARY_EVERY):
+        self.slow_query_ms = slow_query_ms
+        self.summary_every = summary_every
+        self.total_queries = 0
+        self.lock = threading.Lock()
+        self.methods = {}  # method -> aggregated timings
+        self.pools = {}  # engine name -> connection pool usage
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def instrument(self, engine, engine_name):
+        """
+        Attach the timing listeners to an engine (for an AsyncEngine pass engine.sync_engine).
+        """
+        stats = self
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("query_start", []).append((time.perf_counter(), calling_method()))
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            start, method = conn.info["query_start"].pop()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            rows_written = None
+            if getattr(cursor, "description", None) is None:  # no result rows: a write (or DDL, rowcount -1)
+                rowcount = getattr(cursor, "rowcount", -1)
+                rows_written = rowcount if rowcount is not None and rowcount >= 0 else None
+            stats.record_query(method, engine_name, elapsed_ms, rows_written, statement)
+
+        @event.listens_for(engine, "handle_error")
+        def handle_error(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get("query_start"):
+                conn.info["query_start"].pop()
+
+        # Pool wait: from the start of engine.connect() (which checks out a pooled connection through
+        # raw_connection, also for AsyncEngine.connect) to the checkout event. It includes queueing for a
+        # free connection when the pool is exhausted, and opening a new one when none is idle.
+        # A context variable keeps concurrent checkouts apart (threads, and the greenlets of async sessions).
+        wait_started = contextvars.ContextVar(f"pool_wait_started_{engine_name}", default=None)
+        raw_connection = engine.raw_connection
+
+        def timed_raw_connection(*args, **kwargs):
+            token = wait_started.set(time.perf_counter())
+            try:
+                return raw_connection(*args, **kwargs)
+            finally:
+                wait_started.reset(token)
+
+        engine.raw_connection = timed_raw_connection
+
+        # Pool events registered on the engine stay attached when the pool is recreated (engine.dispose())
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            # starttime is set by the pool right before it opens the connection
+            stats.record_pool_event(engine_name, "connect", (time.time() - connection_record.starttime) * 1000)
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            now = time.perf_counter()
+            connection_record.info["checked_out_at"] = now
+            started = wait_started.get()
+            stats.record_pool_event(engine_name, "checkout", (now - started) * 1000 if started is not None else None)
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            checked_out_at = connection_record.info.pop("checked_out_at", None)
+            if checked_out_at is not None:
+                stats.record_pool_event(engine_name, "checkin", (time.perf_counter() - checked_out_at) * 1000)
+
+    def record_query(self, method, engine_name, elapsed_ms, rows_written, statement):
+        """
+        Record one statement. rows_written is the row count of a write, None for reads (not counted).
+        """
+        with self.lock:
+            entry = self.methods.setdefault(method, {
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "rows_written": 0,
+                "buckets": [0] * (len(HISTOGRAM_BUCKETS_MS) + 1), "engines": set(),
+            })
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["rows_written"] += rows_written or 0
+            entry["buckets"][bucket_index(elapsed_ms)] += 1
+            entry["engines"].add(engine_name)
+            self.total_queries += 1
+            log_summary = self.summary_every and self.total_queries % self.summary_every == 0
+        logger.debug(f"{method} on {engine_name}: {elapsed_ms:.1f} ms, rows written={rows_written}")
+        if elapsed_ms >= self.slow_query_ms:
+            statement_preview = " ".join(statement.split())[:500]
+            with self.lock:
+                self.slow_queries.append({
+                    "Time": datetime.now(),
+                    "Method": method,
+                    "Engine": engine_name,
+                    "Duration (ms)": round(elapsed_ms, 1),
+                    "Rows written": rows_written,
+                    "Statement": statement_preview,
+                })
+            logger.warning(f"Slow query ({elapsed_ms:.0f} ms) in {method} on {engine_name}: {statement_preview}")
+        if log_summary:
+            self.log_summary()
+
+    def record_pool_event(self, engine_name, kind, elapsed_ms=None):
+        """
+        Count a pool event: 'connect' (new connection, with the time to open it), 'checkout' (with the
+        time the caller waited for the connection, if known), or 'checkin' (with the time the connection was held).
+        """
+        with self.lock:
+            entry = self.pools.setdefault(engine_name, {
+                "checkouts": 0, "in_use": 0, "peak_in_use": 0, "connects": 0, "waits": 0, "wait_ms": 0.0, "max_wait_ms": 0.0,
+                "connect_ms": 0.0, "max_connect_ms": 0.0, "checkins": 0, "hold_ms": 0.0, "max_hold_ms": 0.0,
+            })
+            if kind == "connect":
+                entry["connects"] += 1
+                entry["connect_ms"] += elapsed_ms
+                entry["max_connect_ms"] = max(entry["max_connect_ms"], elapsed_ms)
+            elif kind == "checkout":
+                entry["checkouts"] += 1
+                entry["in_use"] += 1
+                entry["peak_in_use"] = max(entry["peak_in_use"], entry["in_use"])
+                if elapsed_ms is not None:
+                    entry["waits"] += 1
+                    entry["wait_ms"] += elapsed_ms
+                    entry["max_wait_ms"] = max(entry["max_wait_ms"], elapsed_ms)
+            elif kind == "checkin":
+                entry["checkins"] += 1
+                entry["in_use"] = max(0, entry["in_use"] - 1)
+                entry["hold_ms"] += elapsed_ms
+                entry["max_hold_ms"] = max(entry["max_hold_ms"], elapsed_ms)
+
+    def summary_df(self):
+        """
+        Per-method totals, sorted by total time spent.
+        """
+        with self.lock:
+            rows = [{
+                "Method": method,
+                "Engines": ", ".join(sorted(entry["engines"])),
+                "Calls": entry["calls"],
+                "Rows written": entry["rows_written"],
+                "Total (ms)": round(entry["total_ms"], 1),
+                "Mean (ms)": round(entry["total_ms"] / entry["calls"], 1),
+                "Max (ms)": round(entry["max_ms"], 1),
+            } for method, entry in self.methods.items()]
+        columns = ["Method", "Engines", "Calls", "Rows written", "Total (ms)", "Mean (ms)", "Max (ms)"]
+        return pd.DataFrame(rows, columns=columns).sort_values("Total (ms)", ascending=False, ignore_index=True)
+
+    def histogram_df(self):
+        """
+        Latency histogram per method (number of statements per latency bucket).
+        """
+        with self.lock:
+            data = {method: list(entry["buckets"]) for method, entry in self.methods.items()}
+        return pd.DataFrame.from_dict(data, orient="index", columns=bucket_labels()).rename_axis("Method").reset_index()
+
+    def pool_df(self):
+        """
+        Connection pool usage per engine. The wait is the time engine.connect() took to hand out a connection:
+        a mean wait well above the mean connect time, or a peak close to the pool size, means requests queue for connections.
+        """
+        with self.lock:
+            rows = [{
+                "Engine": name,
+                "Checkouts": entry["checkouts"],
+                "In use": entry["in_use"],
+                "Peak in use": entry["peak_in_use"],
+                "Mean wait (ms)": round(entry["wait_ms"] / entry["waits"], 1) if entry["waits"] else None,
+                "Max wait (ms)": round(entry["max_wait_ms"], 1),
+                "Connections opened": entry["connects"],
+                "Mean connect (ms)": round(entry["connect_ms"] / entry["connects"], 1) if entry["connects"] else None,
+                "Max connect (ms)": round(entry["max_connect_ms"], 1),
+                "Mean hold (ms)": round(entry["hold_ms"] / entry["checkins"], 1) if entry["checkins"] else None,
+                "Max hold (ms)": round(entry["max_hold_ms"], 1),
+            } for name, entry in self.pools.items()]
+        return pd.DataFrame(rows, columns=[
+            "Engine", "Checkouts", "In use", "Peak in use", "Mean wait (ms)", "Max wait (ms)", "Connections opened",
+            "Mean connect (ms)", "Max connect (ms)", "Mean hold (ms)", "Max hold (ms)",
+        ])
+
+    def slow_queries_df(self):
+        with self.lock:
+            rows = list(reversed(self.slow_queries))  # newest first
+        return pd.DataFrame(rows, columns=["Time", "Method", "Engine", "Duration (ms)", "Rows written", "Statement"])
+
+    def log_summary(self):
+        """
+        Write the per-method summary to the log.
+        """
+        summary = self.summary_df()
+        if not summary.empty:
+            logger.info("Query statistics:\n" + summary.to_string(index=False))
+
+    def reset(self):
+        with self.lock:
+            self.total_queries = 0
+            self.methods.clear()
+            # Connections checked out right now stay counted, so "In use" does not go wrong after a reset
+            for entry in self.pools.values():
+                in_use = entry["in_use"]
+                entry.update(checkouts=0, peak_in_use=in_use, waits=0, wait_ms=0.0, max_wait_ms=0.0, connects=0, connect_ms=0.0,
+                             max_connect_ms=0.0, checkins=0, hold_ms=0.0, max_hold_ms=0.0)
+            self.slow_queries.clear()
+
+
+query_stats = QueryStats()
@@ -1,9 +1,13 @@
 import bcrypt
 import streamlit as st
 import dbs
+from query_stats import query_stats
 import pandas as pd
 from datetime import datetime
 from web_monitor import WebMonitor
+from background_loop import run_async, run_async_with_progress
+from provisioning import BulkProvisioner, read_participants_csv
+from admin_collector import AdminStatsCollector
 import asyncio
 import requests
 import os
@@ -45,6 +49,7 @@ def researcher_app(userid, tables_dict):
         tables_dict["ChatsBlacklist"],
         tables_dict["MessagesTable"]
     )
+    room_stats = tables_dict["RoomStats"]
     user_data = users.get_user_by_id(userid)
 
     # Check if user data exists
@@ -65,9 +70,13 @@ def researcher_app(userid, tables_dict):
     st.sidebar.success(f"Welcome, {userid}!")
 
     # chats_ids = chats.get_chats_ids_by_user(userid)
-    all_users_ids = users.get_users()['UserID'].tolist()
+    all_users_ids = users.get_user_ids()
+    # The messages themselves live in the bucket, so they are still loaded in full; from the database
+    # only the chats that have messages are fetched, by key, instead of the whole chats table
     messages_df = messages.get_df(user_ids=all_users_ids)
-    chats_summary = messages.get_chats_summary(messages_df, chats.get_df())
+    chat_keys = messages_df[['ChatID', 'UserID']].drop_duplicates().itertuples(index=False) if not messages_df.empty else []
+    chats_with_messages_df = chats.get_chats_by_keys(chat_keys)
+    chats_summary = messages.get_chats_summary(messages_df, chats_with_messages_df)
 
     with st.sidebar:
         # --- Download options for messages_df ---
@@ -98,7 +107,7 @@ def researcher_app(userid, tables_dict):
     # Sidebar menu
     menu = st.sidebar.selectbox(
         "Dashboard Menu",
-        ["Chats Overview", "Chats Analysis", "User Management"]
+        ["Chats Overview", "Chats Analysis", "User Management", "Diagnostics"]
     )
     
         
@@ -111,12 +120,12 @@ def researcher_app(userid, tables_dict):
             with maincol1:
                 # --- Metrics Section ---
                 st.markdown("### Project Metrics")
-                chats_df = chats.get_df()
-                num_unique_chats = chats_df['ChatID'].nunique() if 'ChatID' in chats_df else 0
-                num_unique_donated_chats = chats_df[chats_df.get('Donated', False) == True]['ChatID'].nunique() if 'Donated' in chats_df else 0
-                num_total_chats = len(chats_df)
-                num_total_donated_chats = len(chats_df[chats_df.get('Donated', False) == True]) if 'Donated' in chats_df else 0
-                num_unique_users = chats_df['UserID'].nunique() if 'UserID' in chats_df else 0
+                project_metrics = chats.get_project_metrics()  # aggregated in SQL, no full table transfer
+                num_unique_chats = project_metrics['unique_chats']
+                num_unique_donated_chats = project_metrics['unique_donated_chats']
+                num_total_chats = project_metrics['total_chats']
+                num_total_donated_chats = project_metrics['total_donated_chats']
+                num_unique_users = project_metrics['unique_users']
 
                 # Use st.columns with a single argument for number of columns
                 col1, col2, col3= st.columns([1, 1, 1])
@@ -131,7 +140,7 @@ def researcher_app(userid, tables_dict):
             with maincol2:
                 # --- Platform Pie Chart ---
                 st.markdown("### Chats by Platform")
-                platform_counts = chats_df[chats_df['Donated']]['Platform'].value_counts()
+                platform_counts = project_metrics['platform_counts']
                 # Define color map for platforms
                 platform_color_map = {
                     'whatsapp': '#25D366',   # WhatsApp green
@@ -159,24 +168,101 @@ def researcher_app(userid, tables_dict):
                 chats_per_day = messages_df.groupby('Date')['MessageID'].nunique().sort_index()
                 st.line_chart(chats_per_day)
         with tab2:
+            # Member counts and membership of every participant's rooms, from the last admin API collection
+            room_stats_df = room_stats.get_df()
+            col1, col2 = st.columns([3, 1])
+            with col2:
+                if st.button("Collect Room Stats", help="Read the joined rooms and member counts of all participants with the Synapse admin API"):
+                    collector = AdminStatsCollector()
+                    if not collector.configured():
+                        st.error("ADMIN_ACCESS_TOKEN and SYNAPSE_URL must be set to collect room stats.")
+                    else:
+                        progress_bar = st.progress(0.0, text="Starting...")
+                        def show_collect_progress(stage, done, total):
+                            progress_bar.progress(done / total if total else 1.0, text=f"{stage}: {done}/{total}")
+                        # The displayed chats are passed along, so the snapshot also records the ones a participant is not in
+                        known_chats = list(chats_with_messages_df[['ChatID', 'UserID']].itertuples(index=False, name=None))
+                        rows, failed_user_ids = run_async_with_progress(
+                            lambda report: collector.collect(all_users_ids, known_chats=known_chats, progress=report), show_collect_progress
+                        )
+                        progress_bar.empty()
+                        # Participants whose rooms could not be read keep their previous rows
+                        failed = set(failed_user_ids)
+                        collected_user_ids = [user_id for user_id in all_users_ids if user_id not in failed]
+                        if not room_stats.replace_snapshot(rows, collected_user_ids):
+                            st.error("Failed to save the room stats.")
+                        else:
+                            if failed_user_ids:
+                                st.session_state["room_stats_message"] = (
+                                    f"Could not read the rooms of {len(failed_user_ids)} participants "
+                                    f"({', '.join(failed_user_ids[:10])}{', ...' if len(failed_user_ids) > 10 else ''}). Their previous stats are kept."
+                                )
+                            st.rerun()
+                # Shown once after the rerun of a partial collection
+                if st.session_state.get("room_stats_message"):
+                    st.warning(st.session_state.pop("room_stats_message"))
+            with col1:
+                if room_stats_df.empty:
+                    st.caption("Room stats have not been collected yet.")
+                else:
+                    st.caption(f"Room stats collected at {pd.to_datetime(room_stats_df['Collected At']).max():%Y-%m-%d %H:%M}")
+            if not room_stats_df.empty and not chats_summary.empty:
+                chats_summary = chats_summary.merge(
+                    room_stats_df[['ChatID', 'UserID', 'Joined', 'Members', 'Local Members']],
+                    left_on=['Chat ID', 'User'], right_on=['ChatID', 'UserID'], how='left'
+                ).drop(columns=['ChatID', 'UserID'])
+                # Chats without a row (participant not collected yet) stay unknown rather than "not joined"
+                chats_summary['Joined'] = chats_summary['Joined'].astype('boolean')
             st.dataframe(chats_summary, use_container_width=True, hide_index=True)
 
     # Chat Analysis Page
     elif menu == "Chats Analysis":
         st.header("Chats Analysis")
         st.markdown("Analyze chats for the selected project.")
-        # Get chat names and ids dictionary using the updated function signature
-        chats_df = chats.get_df()
+        # Only chats with messages can be analyzed. They were already fetched by key for the overview,
+        # so the search, platform filter and paging run over that frame and every page has chats to pick
+        fcol1, fcol2, fcol3 = st.columns([2, 1, 1])
+        with fcol1:
+            chat_search = st.text_input("Search by chat name", key="chats_search")
+        with fcol2:
+            platform_filter = st.selectbox("Platform", ["All", "whatsapp", "telegram", "signal"], key="chats_platform_filter")
+        with fcol3:
+            chats_page_size = st.selectbox("Page size", [50, 100, 250, 500], index=1, key="chats_page_size")
+        analysis_chats_df = chats_with_messages_df
+        if chat_search:
+            analysis_chats_df = analysis_chats_df[analysis_chats_df['Chat Name'].str.contains(chat_search, case=False, regex=False, na=False)]
+        if platform_filter != "All":
+            analysis_chats_df = analysis_chats_df[analysis_chats_df['Platform'] == platform_filter]
+        analysis_chats_df = analysis_chats_df.sort_values(['ChatID', 'UserID'])
+        chats_page_count = max(1, -(-len(analysis_chats_df) // chats_page_size))
+        # Go back to the first page whenever the search or filters change
+        chats_filters_key = (chat_search, platform_filter, chats_page_size)
+        if st.session_state.get("chats_filters_key") != chats_filters_key:
+            st.session_state["chats_filters_key"] = chats_filters_key
+            st.session_state["chats_page"] = 0
+        chats_page = min(st.session_state["chats_page"], chats_page_count - 1)
+        chats_df = analysis_chats_df.iloc[chats_page * chats_page_size:(chats_page + 1) * chats_page_size]
+        pcol1, pcol2, pcol3 = st.columns([1, 1, 4])
+        with pcol1:
+            if st.button("◀ Previous", key="chats_prev_page", disabled=chats_page == 0):
+                st.session_state["chats_page"] = chats_page - 1
+                st.rerun()
+        with pcol2:
+            if st.button("Next ▶", key="chats_next_page", disabled=chats_page >= chats_page_count - 1):
+                st.session_state["chats_page"] = chats_page + 1
+                st.rerun()
+        with pcol3:
+            st.caption(f"Page {chats_page + 1} of {chats_page_count} ({len(analysis_chats_df)} chats)")
         chat_name_to_id = messages.get_chats_ids_and_names(chats_df)
         col1, col2 = st.columns([0.5, 0.5])
         with col1:
-            if chat_name_to_id:
-                available_chats = [chat_name for chat_name, chat_id in chat_name_to_id.items() if chat_id in messages_df['ChatID'].unique()]
+            available_chats = list(chat_name_to_id)
+            if available_chats:
                 # Change the chat selection widget from a radio button to a dropdown (selectbox)
                 selected_chat_name = st.selectbox("Pick a chat to analyze:", options=available_chats, key="chat_select")
                 selected_chat_id = chat_name_to_id[selected_chat_name]
             else:
-                st.warning("No chats available to select.")
+                st.warning("No chats with messages match the search.")
                 return  # Exit early if no chats
         tab1, tab2 = st.tabs(["Chat Analytics", "Chat Messages"])
         with tab1:
@@ -349,11 +435,45 @@ def researcher_app(userid, tables_dict):
         tab1, tab2, tab3 = st.tabs(["Project's Users", "Register New User", "Account Settings"])
 
         with tab1: # project's users tab
-            # Fetch users in the project
-            users_df = users.get_users()
             # Display users in the project
             st.subheader("Users in Project")
-            if len(users_df) == 0: # if table is empty
+            # Search and filters run in SQL and only one page of users is fetched per view
+            fcol1, fcol2, fcol3, fcol4 = st.columns([2, 1, 1, 1])
+            with fcol1:
+                user_search = st.text_input("Search by username", key="users_search")
+            with fcol2:
+                role_filter = st.selectbox("Role", ["All", "User", "Researcher"], key="users_role_filter")
+            with fcol3:
+                active_filter = st.selectbox("Status", ["All", "Active", "Inactive"], key="users_active_filter")
+            with fcol4:
+                page_size = st.selectbox("Page size", [25, 50, 100, 250], index=1, key="users_page_size")
+            # Go back to the first page whenever the search or filters change
+            filters_key = (user_search, role_filter, active_filter, page_size)
+            if st.session_state.get("users_filters_key") != filters_key:
+                st.session_state["users_filters_key"] = filters_key
+                st.session_state["users_page_cursors"] = [None]
+            page_cursors = st.session_state["users_page_cursors"]  # stack of keyset cursors, one per visited page
+            users_df, next_cursor = users.get_users_page(
+                after=page_cursors[-1],
+                limit=page_size,
+                search=user_search or None,
+                role=None if role_filter == "All" else role_filter,
+                active=None if active_filter == "All" else active_filter == "Active",
+            )
+            pcol1, pcol2, pcol3 = st.columns([1, 1, 4])
+            with pcol1:
+                if st.button("◀ Previous", key="users_prev_page", disabled=len(page_cursors) == 1):
+                    page_cursors.pop()
+                    st.rerun()
+            with pcol2:
+                if st.button("Next ▶", key="users_next_page", disabled=next_cursor is None):
+                    page_cursors.append(next_cursor)
+                    st.rerun()
+            with pcol3:
+                st.caption(f"Page {len(page_cursors)}")
+            if len(users_df) == 0 and (user_search or role_filter != "All" or active_filter != "All"):
+                st.info("No users match the current search and filters.")
+            elif len(users_df) == 0: # if table is empty
                 st.info("No users are currently registered in this project.")
             else:
                 # users_df = pd.DataFrame(users_data)
@@ -447,7 +567,7 @@ def researcher_app(userid, tables_dict):
                             st.error("Please fill in all fields.")
                         elif password != confirm_password:
                             st.error("Passwords do not match.")
-                        elif username in users.get_users()['UserID'].tolist():
+                        elif users.get_user_by_id(username):
                             st.error("Username already exists. Please choose a different username.")
                         elif not re.match(allowed_pattern, username):
                             st.error("Username can only contain: a-z, 0-9, = _ - . / +")
@@ -464,7 +584,7 @@ def researcher_app(userid, tables_dict):
                                             server_url=server_url
                                         )
                                         # Properly await the async register method
-                                        result = asyncio.run(web_monitor.register()) # register on server
+                                        result = run_async(web_monitor.register()) # register on server
                                         if result:
                                             users.add_user(  # register user in the database
                                                 user_id=username, 
@@ -498,6 +618,50 @@ def researcher_app(userid, tables_dict):
                                         st.success(f"Researcher {username} registered successfully!")
                                 except Exception as e:
                                     st.error(f"Registration error: {str(e)}")
+            with col2:
+                # Bulk registration of a participant cohort from a CSV file
+                st.subheader("Bulk Register Participants")
+                st.info("Upload a CSV file with a 'username' column and an optional 'password' column. Missing passwords are generated.")
+                participants_file = st.file_uploader("Participants CSV", type=["csv"], key="bulk_register_file")
+                if participants_file is not None:
+                    try:
+                        participants = read_participants_csv(participants_file)
+                    except Exception as e:
+                        st.error(f"Could not read the CSV file: {str(e)}")
+                        participants = []
+                    st.write(f"{len(participants)} participants in file.")
+                    if participants and st.button("Register Participants", key="bulk_register_button"):
+                        progress_bar = st.progress(0.0, text="Starting...")
+                        def show_progress(stage, done, total):
+                            progress_bar.progress(done / total if total else 1.0, text=f"{stage}: {done}/{total}")
+                        provisioner = BulkProvisioner(
+                            users=users,
+                            creator_id=userid,
+                            synapse_url="http://vox-populi.dev:8008",  # same URL as the single registration form
+                            server_url=server,
+                        )
+                        with st.spinner("Registering participants..."):
+                            outcomes_df = provisioner.provision(participants, progress=show_progress)
+                        progress_bar.empty()
+                        # Only the outcomes without passwords are kept in the session
+                        st.session_state["bulk_register_outcomes"] = outcomes_df.drop(columns=["Password"])
+                        # The passwords of the created participants, to hand out to them, are only offered
+                        # in this run: the file is gone once the page reruns (e.g. after the download)
+                        st.warning("Download the results now, the generated passwords are not shown again.")
+                        st.download_button(
+                            "Download Results with Passwords",
+                            data=outcomes_df.to_csv(index=False),
+                            file_name="registered_participants.csv",
+                            mime="text/csv",
+                            key="bulk_register_download"
+                        )
+                if "bulk_register_outcomes" in st.session_state:
+                    outcomes_df = st.session_state["bulk_register_outcomes"]
+                    created = (outcomes_df['Status'] == "Created").sum()
+                    st.success(f"{created} of {len(outcomes_df)} participants registered.")
+                    if created < len(outcomes_df):
+                        st.warning(f"{len(outcomes_df) - created} participants failed, see the Step and Message columns.")
+                    st.dataframe(outcomes_df, use_container_width=True, hide_index=True)
 
         with tab3:
             # Account tab placeholder
@@ -553,3 +717,26 @@ def researcher_app(userid, tables_dict):
             #                     st.error(f"Failed to delete account: {str(e)}")
 
 
+    # Diagnostics Page
+    elif menu == "Diagnostics":
+        st.header("Diagnostics")
+        st.markdown("Database query timings and cache statistics for this app server process.")
+        if st.button("Reset Statistics", key="reset_query_stats"):
+            query_stats.reset()
+            st.rerun()
+        tab1, tab2, tab3 = st.tabs(["Queries", "Slow Queries", "Caches"])
+        with tab1:
+            st.subheader("Queries by Method")
+            st.caption("Rows written counts the rows changed by INSERT, UPDATE and DELETE statements; rows read by queries are not counted.")
+            st.dataframe(query_stats.summary_df(), use_container_width=True, hide_index=True)
+            st.subheader("Latency Histogram")
+            st.dataframe(query_stats.histogram_df(), use_container_width=True, hide_index=True)
+            st.subheader("Connection Pools")
+            st.caption("Wait is the time from requesting a connection until the pool handed one out, including opening a new connection.")
+            st.dataframe(query_stats.pool_df(), use_container_width=True, hide_index=True)
+        with tab2:
+            st.subheader(f"Queries Slower Than {query_stats.slow_query_ms:.0f} ms")
+            st.dataframe(query_stats.slow_queries_df(), use_container_width=True, hide_index=True)
+        with tab3:
+            st.subheader("Lookup Caches")
+            st.dataframe(dbs.cache_stats(), use_container_width=True, hide_index=True)
@@ -0,0 +1,183 @@
+# ResilientClient: retrying, rate-limit-aware wrapper around the pooled httpx client for Synapse
+# - 429 M_LIMIT_EXCEEDED responses are retried after the server's retry_after_ms (any method: the
+#   request was not processed)
+# - 5xx responses and connection errors are retried with jittered exponential backoff, but only for
+#   idempotent methods
+# - requests to the same endpoint are limited to MATRIX_ENDPOINT_CONCURRENCY at a time
+# - a circuit breaker per host fails fast while the server keeps failing; a request counts as one
+#   failure once its retries are exhausted, however many attempts it made
+
+import asyncio
+import os
+import random
+import re
+import time
+from urllib.parse import urlsplit
+import httpx
+
+MATRIX_MAX_RETRIES = int(os.getenv("MATRIX_MAX_RETRIES", "4"))
+MATRIX_BACKOFF_BASE = float(os.getenv("MATRIX_BACKOFF_BASE", "0.5"))  # seconds, doubled on every retry
+MATRIX_BACKOFF_MAX = float(os.getenv("MATRIX_BACKOFF_MAX", "10"))
+MATRIX_MAX_RETRY_AFTER = float(os.getenv("MATRIX_MAX_RETRY_AFTER", "60"))  # longer 429 waits are returned to the caller
+MATRIX_ENDPOINT_CONCURRENCY = int(os.getenv("MATRIX_ENDPOINT_CONCURRENCY", "10"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))  # consecutive failures that open the circuit
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))  # seconds before a trial request is let through
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+# Path segments that identify a room, user, alias or event, replaced to group requests by endpoint
+ID_SEGMENT = re.compile(r"^(?:[!@#$+]|%21|%40|%23|%24)")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of sending a request while the circuit of its host is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures. While open, requests fail at once; after
+    `reset_timeout` seconds one trial request is let through, and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None  # start of the trial request while half-open
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_request(self, host):
+        state = self.state
+        # A trial that never reported back (e.g. cancelled) stops blocking after reset_timeout
+        trial_running = self.trial_started is not None and time.monotonic() - self.trial_started < self.reset_timeout
+        if state == "open" or (state == "half-open" and trial_running):
+            raise CircuitOpenError(f"Circuit open for {host} after {self.failures} consecutive failures")
+        if state == "half-open":
+            self.trial_started = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_started = None
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+def endpoint_key(method, url):
+    """
+    Group a request by method and path template, e.g. 'POST /_matrix/client/v3/join/{id}'.
+    """
+    parts = urlsplit(str(url))
+    segments = ["{id}" if ID_SEGMENT.match(segment) else segment for segment in parts.path.split("/")]
+    return f"{method} {parts.netloc}{'/'.join(segments)}"
+
+
+def retry_after_seconds(response):
+    """
+    Seconds to wait before retrying a 429: retry_after_ms from the Matrix error body, else the Retry-After header.
+    """
+    try:
+        retry_after_ms = response.json().get("retry_after_ms")
+        if retry_after_ms is not None:
+            return float(retry_after_ms) / 1000
+    except (ValueError, AttributeError):
+        pass
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class ResilientClient:
+    """
+    Drop-in wrapper for httpx.AsyncClient (get/post/put/delete/request) used for all Synapse calls.
+    Belongs to one event loop, like the client it wraps.
+    """
+
+    def __init__(self, client, max_retries=MATRIX_MAX_RETRIES, endpoint_concurrency=MATRIX_ENDPOINT_CONCURRENCY):
+        self.client = client
+        self.max_retries = max_retries
+        self.endpoint_concurrency = endpoint_concurrency
+        self.semaphores = {}  # endpoint key -> asyncio.Semaphore
+        self.breakers = {}  # host -> CircuitBreaker
+
+    @property
+    def is_closed(self):
+        return self.client.is_closed
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads the retries of concurrent requests instead of sending them in waves
+        return random.uniform(0, min(MATRIX_BACKOFF_MAX, MATRIX_BACKOFF_BASE * 2 ** attempt))
+
+    async def request(self, method, url, **kwargs):
+        method = method.upper()
+        host = urlsplit(str(url)).netloc
+        breaker = self.breakers.setdefault(host, CircuitBreaker())
+        key = endpoint_key(method, url)
+        semaphore = self.semaphores.setdefault(key, asyncio.Semaphore(self.endpoint_concurrency))
+        # Long-poll syncs wait on the server by design, they would starve the endpoint's other requests
+        long_poll = bool((kwargs.get("params") or {}).get("timeout"))
+        attempt = 0
+        breaker.before_request(host)
+        while True:
+            try:
+                if long_poll:
+                    response = await self.client.request(method, url, **kwargs)
+                else:
+                    async with semaphore:
+                        response = await self.client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    breaker.record_failure()
+                    raise
+                delay = self._backoff(attempt)
+                print(f"{key}: {type(e).__name__}, retrying in {delay:.1f}s")
+            else:
+                if response.status_code in RETRY_STATUS_CODES:
+                    if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                        breaker.record_failure()
+                        return response
+                    delay = self._backoff(attempt)
+                    print(f"{key}: {response.status_code}, retrying in {delay:.1f}s")
+                elif response.status_code == 429:
+                    breaker.record_success()  # the server is up, just busy
+                    delay = retry_after_seconds(response)
+                    delay = self._backoff(attempt) if delay is None else delay
+                    if attempt >= self.max_retries or delay > MATRIX_MAX_RETRY_AFTER:
+                        return response
+                    print(f"{key}: rate limited, retrying in {delay:.1f}s")
+                else:
+                    breaker.record_success()
+                    return response
+            attempt += 1
+            await asyncio.sleep(delay)
+            # Other requests may have opened the circuit in the meantime
+            if breaker.state == "open":
+                raise CircuitOpenError(f"Circuit open for {host} after {breaker.failures} consecutive failures")
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request("DELETE", url, **kwargs)
@@ -0,0 +1,182 @@
+# RoomMetadataCache: per-user cache of Matrix room metadata
+# Keeps room names, platforms, membership and member counts together with the /sync token, persisted
+# as a JSON file so it survives Streamlit reruns and process restarts.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ROOM_CACHE_DIR = os.getenv("ROOM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "voxpopuli_room_cache"))
+# Seconds before fetched values (platform probes, member counts, names) are fetched again, and
+# before the whole cache is rebuilt from a full /sync
+ROOM_CACHE_TTL = int(os.getenv("ROOM_CACHE_TTL", "3600"))
+
+
+class RoomMetadataCache:
+    """
+    Room metadata of one Matrix user, keyed by room_id.
+
+    Values that come from /sync (name, membership, bridge platform) are kept up to date by the
+    incremental syncs and stay valid until the next full sync, which happens once the cache is
+    older than the TTL. Values fetched with separate requests (platform probes, member counts,
+    names of rooms not seen in the sync) expire individually after the TTL.
+    """
+
+    def __init__(self, user_key, cache_dir=ROOM_CACHE_DIR, ttl=ROOM_CACHE_TTL):
+        file_name = hashlib.sha256(user_key.encode("utf-8")).hexdigest()[:32] + ".json"
+        self.path = os.path.join(cache_dir, file_name)
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.rooms = {}
+        self.direct_rooms = {}  # bridge bot MXID -> room_id of the direct chat with it
+        self.next_batch = None
+        self.full_sync_at = None
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        """
+        Load the cache file, unless it is missing, unreadable or older than the TTL.
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read room cache {self.path}: {e}")
+            return
+        with self.lock:
+            if time.time() - (data.get("full_sync_at") or 0) > self.ttl:
+                return
+            self.rooms = data.get("rooms", {})
+            self.direct_rooms = data.get("direct_rooms", {})
+            self.next_batch = data.get("next_batch")
+            self.full_sync_at = data.get("full_sync_at")
+
+    def save(self):
+        """
+        Write the cache file if anything changed (atomically, readable by the owner only).
+        The cache is serialized while holding the lock, so concurrent updates cannot change the dicts
+        during serialization; only the file is written outside it.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            payload = json.dumps({"next_batch": self.next_batch, "full_sync_at": self.full_sync_at, "rooms": self.rooms, "direct_rooms": self.direct_rooms})
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write room cache {self.path}: {e}")
+
+    def needs_full_sync(self):
+        return self.next_batch is None or self.full_sync_at is None or time.time() - self.full_sync_at > self.ttl
+
+    def start_full_sync(self):
+        """
+        Drop everything before applying a full /sync response.
+        """
+        with self.lock:
+            self.rooms = {}
+            self.next_batch = None
+            self.full_sync_at = time.time()
+            self.dirty = True
+
+    def set_next_batch(self, next_batch):
+        with self.lock:
+            if next_batch and next_batch != self.next_batch:
+                self.next_batch = next_batch
+                self.dirty = True
+
+    def room(self, room_id):
+        """
+        Return the entry of a room, creating an empty one.
+        """
+        with self.lock:
+            entry = self.rooms.get(room_id)
+            if entry is None:
+                entry = self.rooms[room_id] = {"name": None, "platform": None, "membership": None, "num_members": None, "fetched": {}}
+                self.dirty = True
+            return entry
+
+    def get(self, room_id, field, default=None):
+        with self.lock:
+            entry = self.rooms.get(room_id)
+            return entry.get(field, default) if entry else default
+
+    def update(self, room_id, **fields):
+        """
+        Set values that come from /sync.
+        """
+        with self.lock:
+            entry = self.room(room_id)
+            for field, value in fields.items():
+                if entry.get(field) != value:
+                    entry[field] = value
+                    self.dirty = True
+
+    def fresh(self, room_id, field):
+        """
+        True if a fetched value of the room is cached and younger than the TTL.
+        """
+        with self.lock:
+            entry = self.rooms.get(room_id)
+            fetched_at = entry["fetched"].get(field) if entry else None
+            return fetched_at is not None and time.time() - fetched_at <= self.ttl
+
+    def store(self, room_id, field, value):
+        """
+        Cache a value fetched with a separate request.
+        """
+        with self.lock:
+            entry = self.room(room_id)
+            entry[field] = value
+            entry["fetched"][field] = time.time()
+            self.dirty = True
+
+    def invalidate(self, room_id, *fields):
+        """
+        Forget fetched values of a room, e.g. the member count after a membership change.
+        """
+        with self.lock:
+            entry = self.rooms.get(room_id)
+            if not entry:
+                return
+            for field in fields:
+                if entry["fetched"].pop(field, None) is not None:
+                    self.dirty = True
+
+    def remove(self, room_id):
+        with self.lock:
+            if self.rooms.pop(room_id, None) is not None:
+                self.dirty = True
+            for bot_mxid in [bot for bot, dm_room in self.direct_rooms.items() if dm_room == room_id]:
+                del self.direct_rooms[bot_mxid]
+                self.dirty = True
+
+    def get_direct_room(self, bot_mxid):
+        with self.lock:
+            return self.direct_rooms.get(bot_mxid)
+
+    def set_direct_room(self, bot_mxid, room_id):
+        """
+        Remember the direct chat with a bridge bot (None forgets it).
+        """
+        with self.lock:
+            if room_id is None:
+                changed = self.direct_rooms.pop(bot_mxid, None) is not None
+            else:
+                changed = self.direct_rooms.get(bot_mxid) != room_id
+                self.direct_rooms[bot_mxid] = room_id
+            self.dirty = self.dirty or changed
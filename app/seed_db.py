@@ -0,0 +1,247 @@
+# Seeding tool for offline benchmarking of the dbs.py tables
+# Generates realistic volumes of users, chats and blacklist entries on a local backend:
+#   DB_BACKEND=sqlite SQLITE_PATH=bench.db python seed_db.py --create-tables
+#   DB_BACKEND=postgres DATABASE_URL=postgresql+pg8000://... python seed_db.py --users 100000 --chats 1000000
+# Optionally times the main table calls afterwards (--benchmark).
+
+import argparse
+import random
+import string
+import sys
+import time
+from datetime import datetime, timedelta
+import bcrypt
+from sqlalchemy import insert, delete
+import connectors
+import dbs
+from query_stats import query_stats
+
+PLATFORMS = ["whatsapp", "signal", "telegram"]
+PLATFORM_WEIGHTS = [0.6, 0.25, 0.15]
+ROOM_DOMAIN = "vox-populi.dev"
+NAME_WORDS = [
+    "Family", "Friends", "Work", "Team", "Book Club", "Neighbors", "Class", "Parents", "Football",
+    "Running", "Project", "Trip", "Birthday", "Study Group", "Volunteers", "Building", "Alumni", "Kitchen",
+]
+
+
+def random_room_id(rng):
+    return "!" + "".join(rng.choices(string.ascii_letters, k=18)) + f":{ROOM_DOMAIN}"
+
+
+def random_chat_name(rng, platform):
+    name = " ".join(rng.sample(NAME_WORDS, rng.randint(1, 2)))
+    if rng.random() < 0.3:  # direct chats, named the way the bridges name them
+        suffix = {"whatsapp": "(WA)", "signal": "(Signal)", "telegram": "(Telegram)"}[platform]
+        return f"{rng.choice(NAME_WORDS)} {rng.randint(1, 999)} {suffix}"
+    return f"{name} {rng.randint(1, 99)}"
+
+
+def random_date(rng, now, days=365):
+    return now - timedelta(days=rng.random() * days)
+
+
+def chats_per_user(rng, num_users, num_chats):
+    """
+    Spread num_chats over users with a heavy-tailed distribution: most participants donate a few
+    chats, a few have hundreds.
+    """
+    weights = [rng.paretovariate(1.3) for _ in range(num_users)]
+    total_weight = sum(weights)
+    counts = [int(w / total_weight * num_chats) for w in weights]
+    for _ in range(num_chats - sum(counts)):
+        counts[rng.randrange(num_users)] += 1
+    return counts
+
+
+def insert_batches(table, rows, batch_size, label):
+    """
+    Insert rows (an iterable of dicts) in executemany batches, one transaction per batch.
+    """
+    batch = []
+    inserted = 0
+    start = time.perf_counter()
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            with connectors.engine.begin() as conn:
+                conn.execute(insert(table), batch)
+            inserted += len(batch)
+            batch = []
+            print(f"  {label}: {inserted:,} rows ({inserted / (time.perf_counter() - start):,.0f} rows/s)", end="\r")
+    if batch:
+        with connectors.engine.begin() as conn:
+            conn.execute(insert(table), batch)
+        inserted += len(batch)
+    print(f"  {label}: {inserted:,} rows in {time.perf_counter() - start:.1f}s" + " " * 20)
+    return inserted
+
+
+def generate_users(rng, num_users, num_researchers, hashed_password, now):
+    researchers = [f"researcher_{i:03d}" for i in range(num_researchers)]
+    user_ids = [f"participant_{i:06d}" for i in range(num_users)]
+    rows = []
+    for user_id in researchers:
+        rows.append({
+            "userid": user_id,
+            "hashedpassword": hashed_password,
+            "role": "Researcher",
+            "creator": researchers[0],
+            "active": True,
+            "createdat": random_date(rng, now, days=730),
+            "lastupdate": None,
+            "deleted": False,
+        })
+    for user_id in user_ids:
+        createdat = random_date(rng, now)
+        rows.append({
+            "userid": user_id,
+            "hashedpassword": hashed_password,
+            "role": "User",
+            "creator": rng.choice(researchers),
+            "active": rng.random() < 0.95,
+            "createdat": createdat,
+            "lastupdate": createdat if rng.random() < 0.5 else None,
+            "deleted": rng.random() < 0.02,
+        })
+    return user_ids, rows
+
+
+def generate_chats(rng, user_ids, num_chats, shared_ratio, donated_ratio, now):
+    """
+    Yield chat rows. A share of the chats reuse a room another participant already has,
+    like a group chat donated by several members.
+    """
+    group_pool = []
+    for user_id, count in zip(user_ids, chats_per_user(rng, len(user_ids), num_chats)):
+        seen = set()
+        while len(seen) < count:
+            if group_pool and rng.random() < shared_ratio:
+                chat_id, chat_name, platform = rng.choice(group_pool)
+                if chat_id in seen:
+                    continue
+            else:
+                platform = rng.choices(PLATFORMS, PLATFORM_WEIGHTS)[0]
+                chat_id, chat_name = random_room_id(rng), random_chat_name(rng, platform)
+                if len(group_pool) < 50000:
+                    group_pool.append((chat_id, chat_name, platform))
+                else:
+                    group_pool[rng.randrange(len(group_pool))] = (chat_id, chat_name, platform)
+            seen.add(chat_id)
+            createdat = random_date(rng, now)
+            yield {
+                "chatid": chat_id,
+                "chatname": chat_name,
+                "platform": platform,
+                "userid": user_id,
+                "createdat": createdat,
+                "updatedat": createdat,
+                "active": rng.random() < donated_ratio,
+            }
+
+
+def generate_blacklist(rng, user_ids, num_blacklist):
+    """
+    Yield blacklist rows. Blacklisted chats are deleted from the chats table, so they get new room ids.
+    """
+    seen = set()
+    while len(seen) < num_blacklist:
+        key = (random_room_id(rng), rng.choice(user_ids))
+        if key in seen:
+            continue
+        seen.add(key)
+        yield {"chatid": key[0], "userid": key[1]}
+
+
+def run_benchmark(rng, user_ids, rounds):
+    """
+    Time the main table calls against the seeded data and print the query statistics.
+    """
+    users, chats, chats_blacklist = dbs.UsersTable(), dbs.ChatsTable(), dbs.ChatsBlacklistTable()
+    sample = rng.sample(user_ids, min(rounds, len(user_ids)))
+    timings = {}
+
+    def timed(label, func, *args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.setdefault(label, []).append((time.perf_counter() - start) * 1000)
+        return result
+
+    query_stats.reset()
+    timed("get_project_metrics", chats.get_project_metrics)
+    cursor = None
+    for _ in range(rounds):
+        _, cursor = timed("get_users_page", users.get_users_page, after=cursor, limit=50)
+    timed("get_users_page (search)", users.get_users_page, search="0042", limit=50)
+    chat_cursor = None
+    for _ in range(rounds):
+        _, chat_cursor = timed("get_chats_page", chats.get_chats_page, after=chat_cursor, limit=50)
+    for user_id in sample:
+        timed("get_user_by_id (cold)", users.get_user_by_id, user_id)
+        timed("get_user_by_id (cached)", users.get_user_by_id, user_id)
+        timed("get_chats_by_user", chats.get_chats_by_user, user_id)
+        timed("get_all_ids (blacklist)", chats_blacklist.get_all_ids, user_id)
+    timed("get_df (full chats table)", chats.get_df)
+
+    print("\nCall latency (ms):")
+    for label, values in timings.items():
+        values.sort()
+        p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+        print(f"  {label:<28} n={len(values):<5} mean={sum(values) / len(values):9.2f}  p95={p95:9.2f}  max={values[-1]:9.2f}")
+    print("\nQuery statistics:")
+    print(query_stats.summary_df().to_string(index=False))
+    print("\nCache statistics:")
+    print(dbs.cache_stats().to_string(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a local database with realistic VoxPopuli data for benchmarking")
+    parser.add_argument("--users", type=int, default=100000, help="Number of participants (default: 100000)")
+    parser.add_argument("--researchers", type=int, default=20, help="Number of researchers (default: 20)")
+    parser.add_argument("--chats", type=int, default=1000000, help="Number of (chat, user) rows (default: 1000000)")
+    parser.add_argument("--blacklist", type=int, default=50000, help="Number of blacklist entries (default: 50000)")
+    parser.add_argument("--shared-ratio", type=float, default=0.2, help="Share of chats that reuse another participant's room (default: 0.2)")
+    parser.add_argument("--donated-ratio", type=float, default=0.4, help="Share of chats marked as donated (default: 0.4)")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows per insert batch (default: 10000)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed (default: 42)")
+    parser.add_argument("--create-tables", action="store_true", help="Create missing tables first")
+    parser.add_argument("--truncate", action="store_true", help="Delete all existing users, chats and blacklist rows first")
+    parser.add_argument("--skip-seed", action="store_true", help="Do not insert data (e.g. to only run --benchmark)")
+    parser.add_argument("--benchmark", action="store_true", help="Time the main table calls after seeding")
+    parser.add_argument("--benchmark-rounds", type=int, default=100, help="Users sampled / pages read by --benchmark (default: 100)")
+    parser.add_argument("--force", action="store_true", help="Allow running against the Cloud SQL backend")
+    args = parser.parse_args()
+
+    if connectors.db_backend == "cloudsql" and not args.force:
+        print("Refusing to seed the Cloud SQL database. Set DB_BACKEND=sqlite or DB_BACKEND=postgres (or pass --force).")
+        sys.exit(1)
+    print(f"Backend: {connectors.db_backend} ({connectors.engine.url.render_as_string(hide_password=True)})")
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+
+    if args.create_tables:
+        dbs.metadata.create_all(connectors.engine)
+    if args.truncate:
+        with connectors.engine.begin() as conn:
+            conn.execute(delete(dbs.chats_blacklist_table))
+            conn.execute(delete(dbs.chats_table))
+            conn.execute(delete(dbs.users_table))
+        print("Existing rows deleted.")
+
+    user_ids = [f"participant_{i:06d}" for i in range(args.users)]
+    if not args.skip_seed:
+        # One real bcrypt hash shared by all seeded users (password: "password"), hashing 100k is too slow
+        hashed_password = bcrypt.hashpw(b"password", bcrypt.gensalt()).decode("utf-8")
+        print("Seeding:")
+        user_ids, user_rows = generate_users(rng, args.users, args.researchers, hashed_password, now)
+        insert_batches(dbs.users_table, user_rows, args.batch_size, "users")
+        insert_batches(dbs.chats_table, generate_chats(rng, user_ids, args.chats, args.shared_ratio, args.donated_ratio, now), args.batch_size, "chats")
+        insert_batches(dbs.chats_blacklist_table, generate_blacklist(rng, user_ids, args.blacklist), args.batch_size, "chats_blacklist")
+
+    if args.benchmark:
+        run_benchmark(rng, user_ids, args.benchmark_rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+# SyncWorker: background Matrix /sync per logged-in participant
+# Each worker long-polls an incremental, filtered /sync on the background loop and publishes the
+# user's joined rooms, pending invites, room names and bridge bot direct chats to a shared SyncStore.
+# Rooms in the user's chat blacklist are neither resolved nor published.
+# The Streamlit pages read the store instead of querying Matrix inside a button handler.
+
+import asyncio
+import copy
+import os
+import threading
+import time
+from async_dbs import AsyncChatsBlacklistTable
+from background_loop import get_background_loop
+from m_monitor import get_shared_client
+
+SYNC_LONGPOLL_MS = int(os.getenv("SYNC_LONGPOLL_MS", "30000"))  # how long one /sync waits for changes
+SYNC_WORKER_IDLE = int(os.getenv("SYNC_WORKER_IDLE", "900"))  # stop a worker whose snapshot was not read for this many seconds
+SYNC_RETRY_MAX = 60  # longest wait (s) between retries after a failed sync
+
+
+class SyncStore:
+    """
+    Latest room snapshot of each user, shared by all Streamlit sessions of the process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshots = {}  # user_id -> snapshot
+        self.last_read = {}  # user_id -> time of the last get()
+
+    def publish(self, user_id, joined, invited, bot_dms):
+        """
+        Store a new snapshot. The version only changes when the rooms did, so readers can skip unchanged snapshots.
+        """
+        with self.lock:
+            previous = self.snapshots.get(user_id)
+            changed = previous is None or (previous["joined"], previous["invited"], previous["bot_dms"]) != (joined, invited, bot_dms)
+            self.snapshots[user_id] = {
+                "joined": joined if changed else previous["joined"],
+                "invited": invited if changed else previous["invited"],
+                "bot_dms": bot_dms if changed else previous["bot_dms"],
+                "version": (previous["version"] if previous else 0) + (1 if changed else 0),
+                "updated_at": time.time(),
+                "error": None,
+            }
+
+    def publish_error(self, user_id, message):
+        with self.lock:
+            if user_id in self.snapshots:
+                self.snapshots[user_id]["error"] = message
+
+    def get(self, user_id):
+        """
+        Return a copy of the user's snapshot, or None if no sync has finished yet.
+        """
+        with self.lock:
+            self.last_read[user_id] = time.time()
+            snapshot = self.snapshots.get(user_id)
+            return copy.deepcopy(snapshot) if snapshot else None
+
+    def touch(self, user_id):
+        with self.lock:
+            self.last_read[user_id] = time.time()
+
+    def idle_for(self, user_id):
+        with self.lock:
+            return time.time() - self.last_read.get(user_id, 0)
+
+    def remove(self, user_id):
+        with self.lock:
+            self.snapshots.pop(user_id, None)
+            self.last_read.pop(user_id, None)
+
+
+class SyncWorker:
+    """
+    Keeps one user's room cache up to date with long-poll /sync requests and publishes it to the store.
+    Stops when nobody has read the user's snapshot for idle_timeout seconds.
+    """
+
+    def __init__(self, monitor, store, longpoll_ms=SYNC_LONGPOLL_MS, idle_timeout=SYNC_WORKER_IDLE, chats_blacklist=None):
+        self.monitor = monitor
+        self.store = store
+        self.user_id = monitor.username
+        self.longpoll_ms = longpoll_ms
+        self.idle_timeout = idle_timeout
+        self.chats_blacklist = chats_blacklist or AsyncChatsBlacklistTable()
+
+    def publish(self, blacklist_ids):
+        monitor = self.monitor
+        self.store.publish(
+            self.user_id,
+            joined=monitor.cached_rooms("join", blacklist_ids),
+            invited=monitor.cached_rooms("invite", blacklist_ids),
+            bot_dms=dict(monitor.room_cache.direct_rooms),
+        )
+
+    async def run(self):
+        print(f"SyncWorker: Started for user {self.user_id}")
+        retry_delay = 1
+        first_sync = True
+        try:
+            while self.store.idle_for(self.user_id) <= self.idle_timeout:
+                try:
+                    client = get_shared_client()
+                    # The first sync returns at once so the store is filled quickly, the following ones wait for changes
+                    if not await self.monitor.sync_rooms(client, timeout=0 if first_sync else self.longpoll_ms):
+                        raise RuntimeError("sync request failed")
+                    # The blacklist comes from the shared lookup cache, so a newly blacklisted chat is dropped on the next sync
+                    blacklist_ids = await self.chats_blacklist.get_all_ids(self.user_id)
+                    await self.monitor.resolve_platforms(client, [room["ChatID"] for room in self.monitor.cached_rooms("join", blacklist_ids)])
+                    self.publish(blacklist_ids)
+                    first_sync = False
+                    retry_delay = 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Error in sync worker for user {self.user_id}: {str(e)}")
+                    self.store.publish_error(self.user_id, str(e))
+                    await asyncio.sleep(retry_delay)
+                    retry_delay = min(retry_delay * 2, SYNC_RETRY_MAX)
+            print(f"SyncWorker: Stopped idle worker for user {self.user_id}")
+        finally:
+            _forget_worker(self)
+
+
+sync_store = SyncStore()
+_workers = {}  # user_id -> (SyncWorker, concurrent.futures.Future)
+_workers_lock = threading.Lock()
+
+
+def _forget_worker(worker):
+    with _workers_lock:
+        entry = _workers.get(worker.user_id)
+        if entry and entry[0] is worker:
+            del _workers[worker.user_id]
+
+
+def start_sync_worker(monitor):
+    """
+    Make sure a worker is syncing for the monitor's user. A running worker is kept unless it belongs
+    to another monitor (e.g. after a new login), in which case it is replaced.
+    """
+    user_id = monitor.username
+    sync_store.touch(user_id)
+    with _workers_lock:
+        entry = _workers.get(user_id)
+        if entry and entry[0].monitor is monitor and not entry[1].done():
+            return entry[0]
+        if entry:
+            entry[1].cancel()
+        worker = SyncWorker(monitor, sync_store)
+        _workers[user_id] = (worker, get_background_loop().submit(worker.run()))
+        return worker
+
+
+def stop_sync_worker(user_id):
+    """
+    Stop the user's worker and drop the published snapshot (e.g. when the account is deleted).
+    """
+    with _workers_lock:
+        entry = _workers.pop(user_id, None)
+    if entry:
+        entry[1].cancel()
+    sync_store.remove(user_id)
@@ -0,0 +1,53 @@
+# Shared test setup: the app modules are imported from app/ against a throwaway SQLite database,
+# with room caches and Matrix tokens in a temporary directory and Synapse replaced by MockSynapse.
+# Run from the app folder with: python -m pytest tests
+
+import os
+import sys
+import tempfile
+import pytest
+
+TEST_DIR = tempfile.mkdtemp(prefix="voxpopuli_tests_")
+MOCK_URL = "http://mock-synapse"
+MOCK_ADMIN_TOKEN = "mock-admin-token"
+
+# Set before connectors, m_monitor and room_cache read them at import time. Empty values also keep
+# load_dotenv() from filling them in from a developer's app/.env, so tests never reach a real database.
+os.environ.update({
+    "DB_BACKEND": "sqlite",
+    "SQLITE_PATH": os.path.join(TEST_DIR, "test.db"),
+    "DATABASE_URL": "",
+    "READ_REPLICA_URLS": "",
+    "READ_REPLICA_CONNECTION_NAMES": "",
+    "ROOM_CACHE_DIR": os.path.join(TEST_DIR, "room_cache"),
+    "TOKEN_STORE_DIR": os.path.join(TEST_DIR, "tokens"),
+    "TOKEN_STORE_KEY": "",
+    "SYNAPSE_URL": MOCK_URL,
+    "ADMIN_ACCESS_TOKEN": MOCK_ADMIN_TOKEN,
+})
+for platform in ["whatsapp", "signal", "telegram"]:
+    os.environ[f"{platform.upper()}_BOT_MXID"] = f"@{platform}bot:{MOCK_URL.split('//')[1]}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def tables_created():
+    import connectors
+    import dbs
+    dbs.metadata.create_all(connectors.engine)
+
+
+@pytest.fixture
+def db(tables_created):
+    """
+    Empty tables and lookup caches for each test.
+    """
+    import connectors
+    import dbs
+    yield dbs
+    dbs.session.rollback()
+    with connectors.engine.begin() as conn:
+        for table in reversed(dbs.metadata.sorted_tables):
+            conn.execute(table.delete())
+    for cache in [dbs.users_cache, dbs.chats_cache, dbs.blacklist_cache, dbs.room_stats_cache]:
+        cache.clear()
@@ -0,0 +1,39 @@
+import asyncio
+from datetime import datetime
+from admin_collector import AdminStatsCollector
+from conftest import MOCK_URL
+from mock_synapse import MockSynapse
+
+
+def test_collect_reports_failed_participants_and_chats_they_are_not_in():
+    async def run():
+        mock = MockSynapse(MOCK_URL)
+        user_id = mock.add_user("alice", "password")
+        joined = mock.add_rooms(user_id, 3, membership="join", seed=1)
+        invited = mock.add_rooms(user_id, 1, membership="invite", seed=2)
+        known_chats = [(joined[0], "alice"), (invited[0], "alice"), ("!gone:mock-synapse", "ghost")]
+        async with mock.installed():
+            return joined, invited, await AdminStatsCollector().collect(["alice", "ghost", "alice"], known_chats=known_chats)
+
+    joined, invited, (rows, failed_user_ids) = asyncio.run(run())
+    assert failed_user_ids == ["ghost"]
+    assert {(row["chatid"], row["joined"]) for row in rows} == {(room_id, True) for room_id in joined} | {(invited[0], False)}
+    assert all(row["userid"] == "alice" and row["joinedmembers"] for row in rows)
+
+
+def test_collect_without_an_admin_token_fails_every_participant():
+    rows, failed_user_ids = asyncio.run(AdminStatsCollector(admin_token="", synapse_url=MOCK_URL).collect(["alice", "bob"]))
+    assert rows == [] and failed_user_ids == ["alice", "bob"]
+
+
+def test_replace_snapshot_keeps_the_rows_of_other_participants(db):
+    room_stats = db.RoomStatsTable()
+
+    def row(chat_id, user_id, joined):
+        return {"chatid": chat_id, "userid": user_id, "joined": joined, "collectedat": datetime.now()}
+
+    assert room_stats.replace_snapshot([row("!a:hs", "alice", True), row("!b:hs", "bob", True)], ["alice", "bob"])
+    # bob's collection failed this time, so only alice's rows are replaced
+    assert room_stats.replace_snapshot([row("!c:hs", "alice", False)], ["alice"])
+    df = room_stats.get_df()
+    assert sorted(zip(df["ChatID"], df["UserID"], df["Joined"])) == [("!b:hs", "bob", True), ("!c:hs", "alice", False)]
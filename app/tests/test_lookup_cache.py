@@ -0,0 +1,72 @@
+from dbs import LookupCache
+
+
+def test_get_or_load_loads_once_and_counts_hits():
+    cache = LookupCache("test")
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"value": 1}
+
+    assert cache.get_or_load("key", loader) == {"value": 1}
+    assert cache.get_or_load("key", loader) == {"value": 1}
+    assert len(calls) == 1
+    stats = cache.stats()
+    assert (stats["Hits"], stats["Misses"], stats["Size"]) == (1, 1, 1)
+
+
+def test_none_results_are_not_cached():
+    cache = LookupCache("test")
+    assert cache.get_or_load("missing", lambda: None) is None
+    assert cache.get_or_load("missing", lambda: {"value": 2}) == {"value": 2}
+
+
+def test_callers_get_copies():
+    cache = LookupCache("test")
+    cache.get_or_load("key", lambda: {"value": 1})["value"] = 99
+    assert cache.get_or_load("key", lambda: None) == {"value": 1}
+
+
+def test_load_finished_after_an_invalidation_is_not_stored():
+    cache = LookupCache("test")
+    hit, generation = cache.lookup("key")
+    assert not hit
+    cache.invalidate("key")  # a write while the value was loading
+    assert cache.store("key", {"value": "stale"}, generation) == {"value": "stale"}
+    assert cache.lookup("key")[0] is False
+
+
+def test_invalidate_where_drops_matching_keys():
+    cache = LookupCache("test")
+    for key in [("alice", None), ("alice", "!room"), ("bob", None)]:
+        cache.get_or_load(key, lambda: {"key": key})
+    cache.invalidate_where(lambda key: key[0] == "alice")
+    assert [cache.lookup(key)[0] for key in [("alice", None), ("alice", "!room"), ("bob", None)]] == [False, False, True]
+
+
+def test_user_lookup_sees_writes(db):
+    users = db.UsersTable()
+    users.add_user("alice", "hash", "researcher")
+    assert users.get_user_by_id("alice")["Active"] is True
+    assert users.get_user_by_id("alice")["Active"] is True  # served from the cache
+    assert users.change_active_status_for_user("alice") is False
+    assert users.get_user_by_id("alice")["Active"] is False
+
+
+def test_chat_lookups_see_writes(db):
+    db.UsersTable().add_user("alice", "hash", "researcher")
+    chats = db.ChatsTable()
+    chats.add_chat("!room", "Family", "whatsapp", "alice")
+    assert chats.get_chat_by_id("!room", "alice")["Chat Name"] == "Family"
+    assert chats.get_chats_by_user("alice")["Chat Name"].tolist() == ["Family"]
+    chats.update_chat_name("!room", "alice", "Family Group")
+    assert chats.get_chat_by_id("!room", "alice")["Chat Name"] == "Family Group"
+    assert chats.get_chats_by_user("alice")["Chat Name"].tolist() == ["Family Group"]
+
+
+def test_blacklist_lookup_sees_writes(db):
+    blacklist = db.ChatsBlacklistTable()
+    assert blacklist.get_all_ids("alice") == set()
+    blacklist.add_chat("!room", "alice")
+    assert blacklist.get_all_ids("alice") == {"!room"}
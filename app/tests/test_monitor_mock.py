@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from conftest import MOCK_URL
+from m_monitor import MultiPlatformMessageMonitor
+from mock_synapse import MockSynapse
+from token_store import token_store
+
+
+async def logged_in_monitor(mock, joined=0, invited=0):
+    username = f"monitor_{uuid.uuid4().hex[:8]}"
+    user_id = mock.add_user(username, "password")
+    mock.add_rooms(user_id, joined, membership="join", seed=1)
+    invites = mock.add_rooms(user_id, invited, membership="invite", seed=2)
+    monitor = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL, platforms=["whatsapp", "signal", "telegram"])
+    assert await monitor.login()
+    return monitor, user_id, invites
+
+
+def test_approving_invites_joins_every_room():
+    async def run():
+        mock = MockSynapse(MOCK_URL, bot_delay=0)
+        async with mock.installed():
+            monitor, user_id, invites = await logged_in_monitor(mock, joined=5, invited=40)
+            approved = await monitor.approve_rooms(invites)
+            joined = {room["ChatID"] for room in await monitor.list_rooms("joined")}
+            pending = await monitor.list_rooms("invited")
+        return approved, invites, joined, pending
+
+    approved, invites, joined, pending = asyncio.run(run())
+    assert approved == {room_id: True for room_id in invites}
+    assert set(invites) <= joined and len(joined) == 45
+    assert pending == []
+
+
+def qr_requests(room_count):
+    """
+    Requests the mock serves for two QR codes in a row, for a user with `room_count` joined rooms.
+    """
+    async def run():
+        mock = MockSynapse(MOCK_URL, bot_delay=0.01)
+        async with mock.installed():
+            monitor, user_id, _ = await logged_in_monitor(mock, joined=room_count)
+            await monitor.list_rooms("joined")
+            counts = []
+            for _ in range(2):
+                mock.reset_stats()
+                assert await monitor.generate_qr("whatsapp") is not None
+                counts.append(sum(mock.requests.values()))
+            # The direct chats with the bot are left once the QR code is received
+            bot_mxid = monitor.bridge_configs["whatsapp"].bot_mxid
+            assert not [room_id for room_id in mock.user_rooms[user_id] if set(mock.rooms[room_id].joined_members()) == {user_id, bot_mxid}]
+            assert monitor.room_cache.get_direct_room(bot_mxid) is None
+        return counts
+
+    return asyncio.run(run())
+
+
+def test_qr_code_requests_do_not_grow_with_the_number_of_rooms():
+    assert qr_requests(10) == qr_requests(300)
+
+
+def test_deleting_the_account_deactivates_it_and_forgets_the_tokens():
+    async def run():
+        mock = MockSynapse(MOCK_URL)
+        async with mock.installed():
+            monitor, user_id, _ = await logged_in_monitor(mock, joined=3)
+            assert await monitor.delete_user()
+            assert not await MultiPlatformMessageMonitor(monitor.username, "password", server_url=MOCK_URL).login()
+        return mock, user_id, monitor
+
+    mock, user_id, monitor = asyncio.run(run())
+    assert user_id not in mock.users
+    assert token_store.load(monitor.user_key) is None
@@ -0,0 +1,31 @@
+import uuid
+import pytest
+from background_loop import run_async
+from conftest import MOCK_URL
+from mock_synapse import MockSynapse
+
+pytest.importorskip("streamlit")  # web_monitor.py renders QR codes with Streamlit
+from monitor_pool import MonitorPool  # noqa: E402
+
+
+def test_pooled_monitors_do_not_keep_the_password():
+    mock = MockSynapse(MOCK_URL)
+    username = f"pool_{uuid.uuid4().hex[:8]}"
+    mock.add_user(username, "password")
+    # The pool runs its monitors on the background loop, so the mock is installed there
+    installed = mock.installed()
+    run_async(installed.__aenter__())
+    try:
+        pool = MonitorPool()
+        web_monitor = pool.get(username, "password")
+        assert web_monitor is not None
+        assert web_monitor.password is None and web_monitor.monitor.password is None
+        assert pool.get(username) is web_monitor
+        # Another process (or the pool after an eviction) continues from the stored tokens
+        mock.reset_stats()
+        restored = MonitorPool().get(username)
+        assert restored is not None and restored.monitor.password is None
+        assert mock.requests["login"] == 0
+        pool.remove(username)
+    finally:
+        run_async(installed.__aexit__(None, None, None))
@@ -0,0 +1,80 @@
+from datetime import date
+import pytest
+from sqlalchemy import insert
+
+
+@pytest.fixture
+def project(db):
+    """
+    37 users (every third a researcher, every fourth inactive, one deleted) with a few chats each,
+    plus "userx01", which only a search treating "_" as a wildcard would match.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(insert(db.users_table), [
+            {"userid": f"user_{i:02d}", "hashedpassword": "hash", "role": "Researcher" if i % 3 == 0 else "User",
+             "creator": "researcher", "active": i % 4 != 0, "deleted": i == 5}
+            for i in range(37)
+        ] + [{"userid": "userx01", "hashedpassword": "hash", "role": "User", "creator": "researcher", "active": True, "deleted": False}])
+        conn.execute(insert(db.chats_table), [
+            {"chatid": f"!room{n}", "chatname": f"Group {n} {'100%' if n == 3 else ''}".strip(), "platform": ["whatsapp", "signal", "telegram"][n % 3],
+             "userid": f"user_{i:02d}", "createdat": date(2025, 1, 1), "updatedat": date(2025, 1, 1), "active": (i + n) % 2 == 0}
+            for i in range(37) for n in range(i % 5)
+        ])
+    return db
+
+
+def read_all_pages(get_page, limit, **filters):
+    """
+    Follow the cursors until the last page and return the pages.
+    """
+    pages, cursor = [], None
+    while True:
+        df, cursor = get_page(after=cursor, limit=limit, **filters)
+        pages.append(df)
+        if cursor is None:
+            return pages
+
+
+def test_user_pages_cover_every_user_once(project):
+    users = project.UsersTable()
+    pages = read_all_pages(users.get_users_page, limit=10)
+    assert [len(page) for page in pages] == [10, 10, 10, 7]
+    assert [user for page in pages for user in page['UserID']] == sorted(users.get_users()['UserID'])
+
+
+def test_user_page_size_equal_to_the_result_has_no_next_page(project):
+    users = project.UsersTable()
+    df, cursor = users.get_users_page(limit=37)
+    assert len(df) == 37 and cursor is None
+
+
+def test_user_search_and_filters_run_before_paging(project):
+    users = project.UsersTable()
+    all_users = users.get_users()
+    pages = read_all_pages(users.get_users_page, limit=4, role="Researcher", active=True)
+    expected = all_users[(all_users['Role'] == "Researcher") & all_users['Active']]['UserID']
+    assert [user for page in pages for user in page['UserID']] == sorted(expected)
+    # The search is a case-insensitive substring, "_" is not a wildcard
+    assert users.get_users_page(search="USER_1")[0]['UserID'].tolist() == [f"user_{i}" for i in range(10, 20)]
+    assert users.get_users_page(search="r_0")[0]['UserID'].tolist() == [f"user_{i:02d}" for i in range(10) if i != 5]
+
+
+def test_chat_pages_cover_every_chat_once(project):
+    chats = project.ChatsTable()
+    pages = read_all_pages(chats.get_chats_page, limit=7)
+    keys = [key for page in pages for key in page[['ChatID', 'UserID']].itertuples(index=False, name=None)]
+    assert keys == sorted(chats.get_df()[['ChatID', 'UserID']].itertuples(index=False, name=None))
+    assert all(len(page) == 7 for page in pages[:-1])
+
+
+def test_chat_search_and_filters_run_before_paging(project):
+    chats = project.ChatsTable()
+    all_chats = chats.get_df()
+    pages = read_all_pages(chats.get_chats_page, limit=3, platform=["signal", "telegram"], donated=True)
+    found = [key for page in pages for key in page[['ChatID', 'UserID']].itertuples(index=False, name=None)]
+    expected = all_chats[all_chats['Platform'].isin(["signal", "telegram"]) & all_chats['Donated']]
+    assert found == sorted(expected[['ChatID', 'UserID']].itertuples(index=False, name=None))
+    assert set(chats.get_chats_page(user_id="user_04")[0]['ChatID']) == {"!room0", "!room1", "!room2", "!room3"}
+    # "%" in the search is matched literally
+    assert set(chats.get_chats_page(search="100%")[0]['ChatID']) == {"!room3"}
+    assert chats.get_chats_page(search="group 1")[0]['Chat Name'].unique().tolist() == ["Group 1"]
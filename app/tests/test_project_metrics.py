@@ -0,0 +1,68 @@
+import random
+from datetime import date
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+
+
+@pytest.fixture
+def chats(db):
+    """
+    A project with shared rooms (the same chat ID donated by several participants) and mixed donations.
+    """
+    rng = random.Random(7)
+    with db.engine.begin() as conn:
+        conn.execute(insert(db.users_table), [
+            {"userid": f"user{i}", "hashedpassword": "hash", "role": "User", "creator": "researcher", "active": True, "deleted": i == 9}
+            for i in range(10)
+        ])
+        conn.execute(insert(db.chats_table), [
+            {"chatid": f"!room{n}", "chatname": f"Chat {n}", "platform": ["whatsapp", "whatsapp", "signal", "telegram"][n % 4],
+             "userid": f"user{i}", "createdat": date(2025, 1, 1), "updatedat": date(2025, 1, 1), "active": rng.random() < 0.4}
+            for i in range(9) for n in rng.sample(range(25), 8)
+        ])
+    return db.ChatsTable()
+
+
+def expected_metrics(chats_df):
+    """
+    The metrics as the dashboard computed them with pandas from the full chats table.
+    """
+    donated = chats_df[chats_df['Donated'] == True]
+    return {
+        'unique_chats': chats_df['ChatID'].nunique(),
+        'unique_donated_chats': donated['ChatID'].nunique(),
+        'total_chats': len(chats_df),
+        'total_donated_chats': len(donated),
+        'unique_users': chats_df['UserID'].nunique(),
+        'platform_counts': donated['Platform'].value_counts().to_dict(),
+    }
+
+
+def test_project_metrics_match_pandas(chats):
+    metrics = chats.get_project_metrics()
+    assert {**metrics, 'platform_counts': metrics['platform_counts'].to_dict()} == expected_metrics(chats.get_df())
+    assert list(metrics['platform_counts']) == sorted(metrics['platform_counts'], reverse=True)
+
+
+def test_project_metrics_of_an_empty_project(db):
+    metrics = db.ChatsTable().get_project_metrics()
+    assert [metrics[key] for key in ['unique_chats', 'unique_donated_chats', 'total_chats', 'total_donated_chats', 'unique_users']] == [0] * 5
+    assert metrics['platform_counts'].empty
+
+
+def test_get_chats_by_keys_returns_only_the_requested_chats(chats):
+    chats_df = chats.get_df()
+    keys = list(chats_df[['ChatID', 'UserID']].sample(12, random_state=1).itertuples(index=False, name=None))
+    found = chats.get_chats_by_keys(keys + [("!missing", "user0")] + keys[:3], batch_size=5)
+    assert sorted(found[['ChatID', 'UserID']].itertuples(index=False, name=None)) == sorted(keys)
+    expected = chats_df.set_index(['ChatID', 'UserID']).loc[keys, 'Chat Name'].sort_index()
+    pd.testing.assert_series_equal(found.set_index(['ChatID', 'UserID'])['Chat Name'].sort_index(), expected)
+
+
+def test_get_chats_by_keys_without_keys(chats):
+    assert chats.get_chats_by_keys([]).empty
+
+
+def test_get_user_ids_skips_deleted_users(chats, db):
+    assert sorted(db.UsersTable().get_user_ids()) == [f"user{i}" for i in range(9)]
@@ -0,0 +1,40 @@
+import asyncio
+from conftest import MOCK_URL
+from mock_synapse import MockSynapse
+from provisioning import BulkProvisioner
+
+
+def participants(*usernames):
+    return [{"username": username, "password": f"{username}-password", "row": row} for row, username in enumerate(usernames)]
+
+
+def test_validate_rejects_invalid_duplicated_and_registered_usernames(db):
+    users = db.UsersTable()
+    users.add_user("taken", "hash", "researcher")
+    outcomes = {}
+    valid = BulkProvisioner(users, "researcher", MOCK_URL, "http://server").validate(
+        participants("new", "Bad Name", "new", "taken"), outcomes)
+    assert [p["username"] for p in valid] == ["new"]
+    assert {row: outcome["Message"] for row, outcome in outcomes.items()} == {
+        1: "Username can only contain: a-z, 0-9, = _ - . / +",
+        2: "Duplicate username in the file.",
+        3: "Username already exists.",
+    }
+
+
+def test_existing_matrix_accounts_are_not_overwritten():
+    async def run():
+        mock = MockSynapse(MOCK_URL)
+        mock.add_user("existing", "original-password")
+        outcomes = {}
+        async with mock.installed():
+            provisioner = BulkProvisioner(None, "researcher", MOCK_URL, "http://server")
+            registered = await provisioner.register_on_synapse(participants("existing", "fresh"), outcomes, lambda *args: None)
+        return mock, registered, outcomes
+
+    mock, registered, outcomes = asyncio.run(run())
+    assert [p["username"] for p in registered] == ["fresh"]
+    assert mock.users[mock.user_id("existing")] == "original-password"
+    assert mock.users[mock.user_id("fresh")] == "fresh-password"
+    assert outcomes[0]["Step"] == "Matrix registration" and outcomes[0]["Password"] == ""
+    assert mock.requests["admin_register"] == 1
@@ -0,0 +1,55 @@
+import asyncio
+import threading
+import time
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from query_stats import QueryStats
+
+
+def test_pool_wait_includes_queueing_for_a_connection(tmp_path):
+    stats = QueryStats()
+    engine = create_engine(f"sqlite:///{tmp_path / 'wait.db'}", pool_size=1, max_overflow=0)
+    stats.instrument(engine, "primary")
+    held = threading.Event()
+
+    def hold_the_only_connection():
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            held.set()
+            time.sleep(0.2)
+
+    holder = threading.Thread(target=hold_the_only_connection)
+    holder.start()
+    held.wait()
+    with engine.connect() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+        conn.execute(text("INSERT INTO t VALUES (1), (2)"))
+        conn.commit()
+    holder.join()
+
+    pool = stats.pool_df().iloc[0]
+    assert pool["Checkouts"] == 2
+    assert pool["Max wait (ms)"] >= 150 and pool["Mean wait (ms)"] >= 75
+    assert stats.summary_df()["Rows written"].sum() == 2
+    stats.reset()
+    assert stats.pool_df().iloc[0]["Mean wait (ms)"] is None
+
+
+def test_pool_wait_of_async_engines_is_measured(tmp_path):
+    stats = QueryStats()
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'wait.db'}", pool_size=1, max_overflow=0)
+        stats.instrument(engine.sync_engine, "async")
+
+        async def query(delay):
+            async with engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+                await asyncio.sleep(delay)
+
+        await asyncio.gather(query(0.2), query(0))
+        await engine.dispose()
+
+    asyncio.run(run())
+    pool = stats.pool_df().iloc[0]
+    assert pool["Checkouts"] == 2 and pool["Max wait (ms)"] >= 150
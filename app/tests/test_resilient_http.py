@@ -0,0 +1,136 @@
+import asyncio
+import time
+import httpx
+import pytest
+import resilient_http
+from conftest import MOCK_URL
+from mock_synapse import MockSynapse
+from resilient_http import CircuitBreaker, CircuitOpenError, ResilientClient, endpoint_key, retry_after_seconds
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(resilient_http, "MATRIX_BACKOFF_BASE", 0.001)
+
+
+def scripted_client(responses, calls=None):
+    """
+    A ResilientClient whose requests get the given responses (or raise the given exceptions) in order.
+    """
+    responses = list(responses)
+    calls = calls if calls is not None else []
+
+    def handler(request):
+        calls.append(request.method)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    return ResilientClient(httpx.AsyncClient(transport=httpx.MockTransport(handler)), max_retries=3)
+
+
+def test_circuit_opens_after_consecutive_failures_and_recovers():
+    breaker = CircuitBreaker(threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    for _ in range(3):
+        breaker.before_request("synapse")
+        breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("synapse")
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    breaker.before_request("synapse")  # the trial request
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request("synapse")  # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_circuit():
+    breaker = CircuitBreaker(threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    breaker.before_request("synapse")
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_endpoint_key_groups_requests_by_path_template():
+    assert endpoint_key("POST", "http://hs/_matrix/client/v3/join/!abc:hs") == "POST hs/_matrix/client/v3/join/{id}"
+    assert endpoint_key("GET", "http://hs/_matrix/client/v3/rooms/%21abc%3Ahs/state") == "GET hs/_matrix/client/v3/rooms/{id}/state"
+    assert endpoint_key("GET", "http://hs/_synapse/admin/v2/users/@alice:hs") == "GET hs/_synapse/admin/v2/users/{id}"
+
+
+def test_retry_after_prefers_the_matrix_error_body():
+    assert retry_after_seconds(httpx.Response(429, json={"retry_after_ms": 1500}, headers={"Retry-After": "9"})) == 1.5
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "2"})) == 2.0
+    assert retry_after_seconds(httpx.Response(429, text="busy")) is None
+
+
+def test_server_errors_are_retried_for_idempotent_requests_only():
+    async def run():
+        calls = []
+        client = scripted_client([httpx.Response(503), httpx.ConnectError("refused"), httpx.Response(200, json={})], calls)
+        assert (await client.get("http://hs/_matrix/client/v3/joined_rooms")).status_code == 200
+        assert calls == ["GET"] * 3
+        calls.clear()
+        client = scripted_client([httpx.Response(502), httpx.Response(200)], calls)
+        assert (await client.post("http://hs/_matrix/client/v3/createRoom", json={})).status_code == 502
+        assert calls == ["POST"]
+
+    asyncio.run(run())
+
+
+def test_rate_limited_requests_are_retried_after_retry_after_ms():
+    async def run():
+        calls = []
+        limited = httpx.Response(429, json={"errcode": "M_LIMIT_EXCEEDED", "retry_after_ms": 20})
+        client = scripted_client([limited, limited, httpx.Response(200, json={})], calls)
+        start = time.monotonic()
+        assert (await client.post("http://hs/_matrix/client/v3/createRoom", json={})).status_code == 200
+        assert calls == ["POST"] * 3 and time.monotonic() - start >= 0.04
+        # Waits longer than MATRIX_MAX_RETRY_AFTER go back to the caller
+        client = scripted_client([httpx.Response(429, json={"retry_after_ms": 3_600_000})])
+        assert (await client.post("http://hs/_matrix/client/v3/createRoom", json={})).status_code == 429
+
+    asyncio.run(run())
+
+
+def test_open_circuit_fails_fast():
+    async def run():
+        calls = []
+        client = scripted_client([httpx.Response(500)] * 10, calls)
+        client.breakers["hs"] = CircuitBreaker(threshold=2, reset_timeout=60)
+        # Each request counts as one failure after its retries, so the circuit opens after the second one
+        for _ in range(2):
+            assert (await client.get("http://hs/_matrix/client/v3/sync")).status_code == 500
+        assert len(calls) == 8 and client.breakers["hs"].state == "open"
+        with pytest.raises(CircuitOpenError):
+            await client.get("http://hs/_matrix/client/v3/joined_rooms")
+        assert len(calls) == 8
+
+    asyncio.run(run())
+
+
+def test_concurrent_requests_get_through_the_mock_rate_limit():
+    async def run():
+        mock = MockSynapse(MOCK_URL, rate_limit=50, rate_limit_burst=2)
+        mock.add_user("alice", "password")
+        client = ResilientClient(mock.client())
+        try:
+            login = await client.post(f"{MOCK_URL}/_matrix/client/v3/login", json={"type": "m.login.password", "user": "alice", "password": "password"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            responses = await asyncio.gather(*(
+                client.post(f"{MOCK_URL}/_matrix/client/v3/createRoom", headers=headers, json={"name": f"Room {i}"}) for i in range(5)
+            ))
+        finally:
+            await client.aclose()
+        assert [response.status_code for response in responses] == [200] * 5
+        assert mock.rate_limited > 0
+        assert len(mock.user_rooms[mock.user_id("alice")]) == 5
+
+    asyncio.run(run())
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import stat
+import time
+import uuid
+from conftest import MOCK_URL
+from m_monitor import MultiPlatformMessageMonitor
+from mock_synapse import MockSynapse
+from room_cache import RoomMetadataCache
+
+
+def test_cache_round_trips_through_its_file(tmp_path):
+    cache = RoomMetadataCache("hs|alice", cache_dir=tmp_path)
+    cache.start_full_sync()
+    cache.update("!a:hs", name="Family", membership="join")
+    cache.store("!a:hs", "num_members", 4)
+    cache.set_direct_room("@whatsappbot:hs", "!dm:hs")
+    cache.set_next_batch("s42")
+    cache.save()
+    assert stat.S_IMODE(os.stat(cache.path).st_mode) == 0o600
+
+    loaded = RoomMetadataCache("hs|alice", cache_dir=tmp_path)
+    assert (loaded.get("!a:hs", "name"), loaded.get("!a:hs", "num_members")) == ("Family", 4)
+    assert loaded.get_direct_room("@whatsappbot:hs") == "!dm:hs"
+    assert loaded.next_batch == "s42" and not loaded.needs_full_sync()
+    assert RoomMetadataCache("hs|bob", cache_dir=tmp_path).rooms == {}
+
+
+def test_cache_older_than_the_ttl_is_not_loaded(tmp_path):
+    cache = RoomMetadataCache("hs|alice", cache_dir=tmp_path)
+    cache.start_full_sync()
+    cache.update("!a:hs", name="Family")
+    cache.set_next_batch("s1")
+    cache.full_sync_at = time.time() - 7200
+    cache.save()
+    loaded = RoomMetadataCache("hs|alice", cache_dir=tmp_path, ttl=3600)
+    assert loaded.rooms == {} and loaded.needs_full_sync()
+
+
+def test_unreadable_cache_file_is_ignored(tmp_path):
+    path = RoomMetadataCache("hs|alice", cache_dir=tmp_path).path
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert RoomMetadataCache("hs|alice", cache_dir=tmp_path).rooms == {}
+
+
+def test_save_only_writes_changes(tmp_path):
+    cache = RoomMetadataCache("hs|alice", cache_dir=tmp_path)
+    cache.save()
+    assert not os.path.exists(cache.path)
+    cache.update("!a:hs", name="Family")
+    cache.save()
+    cache.update("!a:hs", name="Family")  # same value, nothing to write
+    assert not cache.dirty
+
+
+def test_fetched_values_expire_and_can_be_invalidated(tmp_path):
+    cache = RoomMetadataCache("hs|alice", cache_dir=tmp_path, ttl=0.05)
+    cache.store("!a:hs", "num_members", 3)
+    assert cache.fresh("!a:hs", "num_members")
+    cache.invalidate("!a:hs", "num_members")
+    assert not cache.fresh("!a:hs", "num_members")
+    cache.store("!a:hs", "num_members", 3)
+    time.sleep(0.06)
+    assert not cache.fresh("!a:hs", "num_members")
+    assert cache.get("!a:hs", "num_members") == 3  # still available, just due for a refetch
+
+
+def test_removing_a_room_forgets_it_as_a_bot_direct_chat(tmp_path):
+    cache = RoomMetadataCache("hs|alice", cache_dir=tmp_path)
+    cache.set_direct_room("@signalbot:hs", "!dm:hs")
+    cache.update("!dm:hs", membership="join")
+    cache.remove("!dm:hs")
+    assert cache.get("!dm:hs", "membership") is None and cache.get_direct_room("@signalbot:hs") is None
+
+
+def test_monitor_serves_later_listings_from_the_cache_and_incremental_syncs():
+    async def run():
+        mock = MockSynapse(MOCK_URL, bot_delay=0)
+        username = f"cache_{uuid.uuid4().hex[:8]}"
+        user_id = mock.add_user(username, "password")
+        joined = mock.add_rooms(user_id, 30, membership="join", seed=1)
+        async with mock.installed():
+            monitor = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL)
+            assert await monitor.login()
+            mock.reset_stats()
+            cold = await monitor.list_rooms("joined")
+            cold_requests = sum(mock.requests.values())
+
+            # A new session of the same user starts from the cache file instead of a full sync
+            monitor = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL)
+            assert await monitor.login()
+            mock.reset_stats()
+            warm = await monitor.list_rooms("joined")
+            assert sum(mock.requests.values()) < cold_requests and mock.requests["sync"] == 1
+
+            # Changes reach the cache through the incremental sync
+            room = mock.rooms[joined[0]]
+            mock._add_state(room, user_id, "m.room.name", "", {"name": "Renamed"})
+            invited = mock.add_rooms(user_id, 2, membership="invite", seed=2)
+            renamed = {room["ChatID"]: room["Chat Name"] for room in await monitor.list_rooms("joined")}
+            pending = await monitor.list_rooms("invited")
+        return cold, warm, renamed, pending, joined, invited
+
+    cold, warm, renamed, pending, joined, invited = asyncio.run(run())
+    assert sorted(room["ChatID"] for room in cold) == sorted(joined)
+    assert [(room["ChatID"], room["Chat Name"], room["Platform"]) for room in warm] == [(room["ChatID"], room["Chat Name"], room["Platform"]) for room in cold]
+    assert renamed[joined[0]] == "Renamed"
+    assert sorted(room["ChatID"] for room in pending) == sorted(invited)
@@ -0,0 +1,44 @@
+import asyncio
+import uuid
+import connectors
+from conftest import MOCK_URL
+from m_monitor import MultiPlatformMessageMonitor
+from mock_synapse import MockSynapse
+from sync_worker import SyncStore, SyncWorker
+
+
+def test_blacklisted_rooms_are_neither_resolved_nor_published(db):
+    async def run():
+        mock = MockSynapse(MOCK_URL, bot_delay=0)
+        username = f"worker_{uuid.uuid4().hex[:8]}"
+        user_id = mock.add_user(username, "password")
+        rooms = mock.add_rooms(user_id, 6, membership="join", seed=1)
+        blacklisted = set(rooms[:3])
+        chats_blacklist = db.ChatsBlacklistTable()
+        for room_id in blacklisted:
+            chats_blacklist.add_chat(room_id, username)
+        store = SyncStore()
+        async with mock.installed():
+            monitor = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL, platforms=["whatsapp", "signal", "telegram"])
+            assert await monitor.login()
+            resolved = []
+            resolve_platforms = monitor.resolve_platforms
+
+            async def record_resolved(client, room_ids):
+                resolved.extend(room_ids)
+                await resolve_platforms(client, room_ids)
+
+            monitor.resolve_platforms = record_resolved
+            store.touch(username)
+            task = asyncio.create_task(SyncWorker(monitor, store, longpoll_ms=10, idle_timeout=60).run())
+            while store.get(username) is None:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        # aiosqlite connections are bound to this test's event loop
+        await connectors.async_engine.dispose()
+        return resolved, store.get(username), rooms, blacklisted
+
+    resolved, snapshot, rooms, blacklisted = asyncio.run(run())
+    assert sorted(room["ChatID"] for room in snapshot["joined"]) == sorted(set(rooms) - blacklisted)
+    assert sorted(resolved) == sorted(set(rooms) - blacklisted)
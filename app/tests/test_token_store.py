@@ -0,0 +1,101 @@
+import asyncio
+import os
+import stat
+import uuid
+from cryptography.fernet import Fernet
+from conftest import MOCK_URL
+from m_monitor import MultiPlatformMessageMonitor
+from mock_synapse import MockSynapse
+from token_store import TokenStore, token_store
+
+TOKENS = {"access_token": "syt_secret", "refresh_token": "syr_secret", "expires_at": None, "user_id": "@alice:hs"}
+
+
+def test_tokens_are_stored_encrypted_and_owner_only(tmp_path):
+    store = TokenStore(store_dir=tmp_path, key=Fernet.generate_key())
+    assert store.persisted
+    store.save("hs|alice", TOKENS)
+    path = store._path("hs|alice")
+    with open(path, "rb") as f:
+        assert b"syt_secret" not in f.read()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert store.load("hs|alice") == TOKENS
+    assert store.load("hs|bob") is None
+    store.delete("hs|alice")
+    assert store.load("hs|alice") is None and not os.path.exists(path)
+
+
+def test_tokens_of_a_rotated_key_are_dropped(tmp_path):
+    TokenStore(store_dir=tmp_path, key=Fernet.generate_key()).save("hs|alice", TOKENS)
+    store = TokenStore(store_dir=tmp_path, key=Fernet.generate_key())
+    assert store.load("hs|alice") is None
+    assert not os.path.exists(store._path("hs|alice"))
+
+
+def test_without_a_valid_key_tokens_are_kept_in_memory(tmp_path):
+    for key in [None, "not-a-fernet-key"]:
+        store = TokenStore(store_dir=tmp_path, key=key)
+        assert not store.persisted
+        store.save("hs|alice", TOKENS)
+        assert store.load("hs|alice") == TOKENS
+        store.load("hs|alice")["access_token"] = "changed"  # callers get a copy
+        assert store.load("hs|alice") == TOKENS
+        store.delete("hs|alice")
+        assert store.load("hs|alice") is None
+    assert os.listdir(tmp_path) == []
+
+
+def new_user(mock):
+    username = f"tokens_{uuid.uuid4().hex[:8]}"
+    mock.add_user(username, "password")
+    return username
+
+
+def test_new_session_reuses_the_stored_tokens_without_the_password():
+    async def run():
+        mock = MockSynapse(MOCK_URL)
+        username = new_user(mock)
+        async with mock.installed():
+            assert await MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL).login()
+            mock.reset_stats()
+            monitor = MultiPlatformMessageMonitor(username, None, server_url=MOCK_URL)
+            assert await monitor.restore_session()
+        return mock.requests
+
+    requests = asyncio.run(run())
+    assert requests["login"] == 0 and requests["whoami"] == 1
+
+
+def test_expired_access_token_is_refreshed_on_restore():
+    async def run():
+        mock = MockSynapse(MOCK_URL, token_lifetime=1)
+        username = new_user(mock)
+        async with mock.installed():
+            first = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL)
+            assert await first.login()
+            mock.reset_stats()
+            # The token expires within TOKEN_REFRESH_MARGIN, so it is refreshed before use
+            monitor = MultiPlatformMessageMonitor(username, None, server_url=MOCK_URL)
+            assert await monitor.restore_session()
+            assert monitor.access_token != first.access_token
+            assert token_store.load(monitor.user_key)["access_token"] == monitor.access_token
+        return mock.requests
+
+    requests = asyncio.run(run())
+    assert requests["login"] == 0 and requests["refresh"] == 1
+
+
+def test_revoked_tokens_are_forgotten():
+    async def run():
+        mock = MockSynapse(MOCK_URL)
+        username = new_user(mock)
+        async with mock.installed():
+            monitor = MultiPlatformMessageMonitor(username, "password", server_url=MOCK_URL)
+            assert await monitor.login()
+            mock.access_tokens.clear()
+            mock.refresh_tokens.clear()
+            monitor = MultiPlatformMessageMonitor(username, None, server_url=MOCK_URL)
+            assert not await monitor.restore_session()
+            return token_store.load(monitor.user_key)
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,108 @@
+# TokenStore: encrypted per-user store of Matrix access and refresh tokens
+# A new session reuses the user's stored login (validated with a cheap /whoami, refreshed when it
+# expired) instead of sending the password to Synapse on every page entry. Tokens are encrypted with
+# Fernet using TOKEN_STORE_KEY and written to one file per user, readable by the owner only.
+# Without the key (or the cryptography package) the tokens are only kept in this process's memory:
+# they survive idle eviction of a user's monitor, but not a restart or a switch to another instance.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_STORE_DIR = os.getenv("TOKEN_STORE_DIR", os.path.join(tempfile.gettempdir(), "voxpopuli_tokens"))
+# Fernet key, e.g. the output of: python -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+TOKEN_STORE_KEY = os.getenv("TOKEN_STORE_KEY")
+
+
+class TokenStore:
+    """
+    Matrix tokens of each user ({"access_token", "refresh_token", "expires_at", "user_id"}), keyed
+    like the room cache by server URL and username.
+    """
+
+    def __init__(self, store_dir=TOKEN_STORE_DIR, key=TOKEN_STORE_KEY):
+        self.store_dir = store_dir
+        self.lock = threading.Lock()
+        self.fernet = None
+        self.memory = {}  # user_key -> tokens, used when the store is not persisted
+        if Fernet is None:
+            print("TokenStore: cryptography is not installed, Matrix tokens are kept in memory only")
+        elif not key:
+            print("TokenStore: TOKEN_STORE_KEY not set, Matrix tokens are kept in memory only")
+        else:
+            try:
+                self.fernet = Fernet(key)
+            except ValueError as e:
+                print(f"TokenStore: Invalid TOKEN_STORE_KEY, Matrix tokens are kept in memory only: {str(e)}")
+
+    @property
+    def persisted(self):
+        return self.fernet is not None
+
+    def _path(self, user_key):
+        file_name = hashlib.sha256(user_key.encode("utf-8")).hexdigest()[:32] + ".token"
+        return os.path.join(self.store_dir, file_name)
+
+    def load(self, user_key):
+        """
+        Return the stored tokens of a user, or None if there are none or they cannot be decrypted.
+        """
+        if not self.persisted:
+            with self.lock:
+                tokens = self.memory.get(user_key)
+            return dict(tokens) if tokens else None
+        path = self._path(user_key)
+        try:
+            with open(path, "rb") as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, InvalidToken) as e:
+            # InvalidToken also means the key was rotated, the user just logs in again
+            logger.warning(f"Could not read stored tokens {path}: {type(e).__name__}")
+            self.delete(user_key)
+            return None
+
+    def save(self, user_key, tokens):
+        """
+        Encrypt and write the tokens of a user (atomically, readable by the owner only).
+        """
+        if not self.persisted:
+            with self.lock:
+                self.memory[user_key] = dict(tokens)
+            return
+        path = self._path(user_key)
+        data = self.fernet.encrypt(json.dumps(tokens).encode("utf-8"))
+        with self.lock:
+            try:
+                os.makedirs(self.store_dir, mode=0o700, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning(f"Could not write stored tokens {path}: {e}")
+
+    def delete(self, user_key):
+        if not self.persisted:
+            with self.lock:
+                self.memory.pop(user_key, None)
+            return
+        try:
+            os.remove(self._path(user_key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not delete stored tokens of {user_key}: {e}")
+
+
+token_store = TokenStore()
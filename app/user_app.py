@@ -1,6 +1,6 @@
 import streamlit as st
 import pandas as pd
-from web_monitor import WebMonitor  # Import WebMonitor
+from monitor_pool import monitor_pool
 import asyncio
 import time
 import bcrypt
@@ -11,7 +11,68 @@ load_dotenv()
 
 server = os.getenv("SERVER")
 
-def user_app(userid, tables_dict, password):
+
+async def store_synced_chats(web_monitor, async_chats, async_blacklist, userid):
+    """
+    Store the chats published by the background sync in the DB, without any Matrix request.
+    Returns False if the background sync has not finished its first sync yet.
+    """
+    blacklist_ids = await async_blacklist.get_all_ids(userid)
+    synced = web_monitor.get_synced_chats(chats_blacklist=blacklist_ids)
+    if synced.get("status") != "success":
+        return False
+    all_chats = synced["joined_chats"] + synced["invited_chats"]
+    if all_chats:
+        await async_chats.update_all_chats(all_chats, userid=userid)
+    return True
+
+
+async def refresh_user_chats(web_monitor, async_chats, async_blacklist, userid):
+    """
+    Store the user's invited and joined chats in the DB: from the background sync if it is running,
+    otherwise fetched from Matrix.
+    The user's blacklist (a cached set) is passed down so blacklisted rooms are skipped before any Matrix requests.
+    """
+    if await store_synced_chats(web_monitor, async_chats, async_blacklist, userid):
+        return
+    blacklist_ids = await async_blacklist.get_all_ids(userid)
+    invited_result, joined_result = await asyncio.gather(
+        web_monitor.get_invited_chats(group=False, chats_blacklist=blacklist_ids),
+        web_monitor.get_joined_chats(group=False, chats_blacklist=blacklist_ids),
+    )
+    all_chats = joined_result.get("joined_chats", []) + invited_result.get("invited_chats", [])
+    if all_chats:
+        await async_chats.update_all_chats(all_chats, userid=userid)
+
+
+async def toggle_chats_donation(web_monitor, async_chats, chat_ids, userid):
+    """
+    Toggle the donation status of several chats in the DB (one transaction) while joining all their
+    rooms on Matrix concurrently. Returns the result of the batch room approval.
+    """
+    _, result = await asyncio.gather(
+        async_chats.change_active_status_for_chats(chat_ids, user_id=userid),
+        web_monitor.approve_rooms(chat_ids),
+    )
+    return result
+
+
+async def delete_account(web_monitor, async_chats, async_users, userid):
+    """
+    Delete the Matrix account, then disable the user's chats and soft-delete the user in the DB.
+    The DB is only changed once the Matrix deletion succeeded, so a failed deletion leaves a working account.
+    Returns the result of the Matrix deletion.
+    """
+    result = await web_monitor.delete_user()
+    if result.get('status') == 'success':
+        await asyncio.gather(
+            async_chats.disable_all_rooms_for_user(userid),
+            async_users.delete_user(userid),
+        )
+    return result
+
+
+def user_app(userid, tables_dict):
     """
     Main function for the User Dashboard.
     Handles chat/project management, QR code generation, and user actions.
@@ -23,24 +84,31 @@ def user_app(userid, tables_dict, password):
         tables_dict["ChatsBlacklist"],
         tables_dict["MessagesTable"]
     )
-    blacklist_ids = chats_blacklist.get_all_ids(userid)
+    # Async tables let DB calls run concurrently with Matrix calls in the same event loop
+    async_chats, async_users, async_blacklist = (
+        tables_dict["AsyncChats"],
+        tables_dict["AsyncUsers"],
+        tables_dict["AsyncChatsBlacklist"],
+    )
     
-    # Use a persistent web_monitor instance in session state, but ensure it matches the current user
-    if (
-        "web_monitor" not in st.session_state
-        or not hasattr(st.session_state["web_monitor"], "username")
-        or st.session_state["web_monitor"].username != userid
-    ):
-        # Explicitly set all platforms to ensure bridge_configs is populated
-        web_monitor = WebMonitor(username=userid, password=password, platforms=["signal", "whatsapp", "telegram"])
-        login_result = asyncio.run(web_monitor.login())
-        if login_result.get("status") == "success":
-            st.session_state["web_monitor"] = web_monitor
-        else:
-            st.error("Login failed. Please try again.")
-            return
-    else: # if a web monitor already exists, use it
-        web_monitor = st.session_state["web_monitor"]
+    # One logged-in monitor per user for the whole process (shared by all tabs), see monitor_pool.py.
+    # Its coroutines run on the shared background loop via monitor_pool.run.
+    web_monitor = monitor_pool.get(userid)
+    if web_monitor is None:
+        # No usable Matrix session (e.g. after a restart without a persisted token store):
+        # back to the login form, the password is needed to log in to Matrix again
+        st.session_state["logged_in"] = False
+        st.session_state["role"] = None
+        st.session_state["user"] = None
+        st.session_state["login_message"] = "Your chat server session has expired. Please log in again."
+        st.rerun()
+    # Keep rooms and invites up to date in the background, and store what changed since the last rerun
+    web_monitor.start_background_sync()
+    synced_version = web_monitor.get_synced_chats().get("version")
+    synced_version_key = f"synced_chats_version_{userid}"
+    if synced_version is not None and synced_version != st.session_state.get(synced_version_key):
+        monitor_pool.run(store_synced_chats(web_monitor, async_chats, async_blacklist, userid))
+        st.session_state[synced_version_key] = synced_version
     
 
     user_data = users.get_user_by_id(userid)
@@ -93,7 +161,7 @@ def user_app(userid, tables_dict, password):
             # Step 1: Send 'login qr' only when button is pressed
             if not st.session_state['telegram_login_qr_sent']:
                 if st.button("Start Telegram Login"):
-                    asyncio.run(web_monitor.send_message_to_telegram_bot('login qr'))
+                    monitor_pool.run(web_monitor.send_message_to_telegram_bot('login qr'))
                     st.session_state['telegram_login_qr_sent'] = True
                     st.rerun()
 
@@ -107,7 +175,7 @@ def user_app(userid, tables_dict, password):
                 phone_pattern = re.compile(r"^\+\d{10,15}$")
                 if phone_pattern.match(phone_number):
                     if st.button("Send Phone Number"):
-                        result = asyncio.run(web_monitor.send_message_to_telegram_bot(phone_number))
+                        result = monitor_pool.run(web_monitor.send_message_to_telegram_bot(phone_number))
                         if not result or result.get("status") != "success":
                             st.error("Failed to send phone number. Please try again.")
                         else:
@@ -121,7 +189,7 @@ def user_app(userid, tables_dict, password):
                     key="telegram_code_input"
                 )
                 if login_code and st.button("Send Login Code"):
-                    result = asyncio.run(web_monitor.send_message_to_telegram_bot(login_code))
+                    result = monitor_pool.run(web_monitor.send_message_to_telegram_bot(login_code))
                     if not result or result.get("status") != "success":
                         st.error("Failed to send login code. Please try again.")
                     else:
@@ -147,11 +215,14 @@ def user_app(userid, tables_dict, password):
                     try:
                         with st.sidebar:
                             st.spinner(f"Generating QR Code for {selected_platform}...")
-                            qr_code = asyncio.run(web_monitor.generate_qr_code_and_display(platform=selected_platform))
-                            st.sidebar.image(qr_code, caption="Generated QR Code", use_container_width=True)
-                            st.info("This QR code is valid for 5 minutes. Please generate a new one if needed.")
-                        st.session_state[cooldown_key] = time.time()  # Set cooldown for this user+platform
-                        st.session_state["last_qr_code"] = qr_code      # Store QR code
+                            qr_code = monitor_pool.run(web_monitor.generate_qr_code_and_display(platform=selected_platform))
+                            if isinstance(qr_code, dict):  # error result
+                                st.error(qr_code.get("message"))
+                            else:
+                                st.sidebar.image(qr_code, caption="Generated QR Code", use_container_width=True)
+                                st.info("This QR code is valid for 5 minutes. Please generate a new one if needed.")
+                                st.session_state[cooldown_key] = time.time()  # Set cooldown for this user+platform
+                                st.session_state["last_qr_code"] = qr_code      # Store QR code
                     except Exception as e:
                         pass
 
@@ -196,14 +267,7 @@ def user_app(userid, tables_dict, password):
             
             if st.button("Refresh My Chats"):
                 # Refresh chat lists from web_monitor and update local DB
-                donated_result = asyncio.run(web_monitor.get_invited_chats(group=False))
-                not_donated_result = asyncio.run(web_monitor.get_joined_chats(group=False))
-                not_donated_chats = donated_result.get("invited_chats", [])
-                donated_chats = not_donated_result.get("joined_chats", [])
-                all_chats = donated_chats + not_donated_chats
-                all_chats = [chat for chat in all_chats if chat["ChatID"] not in blacklist_ids] # Exclude blacklisted chats
-                if all_chats:
-                    chats.update_all_chats(all_chats, userid=userid)
+                monitor_pool.run(refresh_user_chats(web_monitor, async_chats, async_blacklist, userid))
                 st.rerun()
 
         with col2:
@@ -226,6 +290,7 @@ def user_app(userid, tables_dict, password):
         with col1:
             # Save changes to chat/project/blacklist state
             if not filtered_df.empty and st.button("Save Changes"):
+                toggled_rows = []
                 for _, row in edited_df.iterrows():
                     chat_id = row["ChatID"]
                     if row["Blacklist"]:
@@ -238,9 +303,12 @@ def user_app(userid, tables_dict, password):
                         continue
                     original_row = chats_df.loc[chats_df["ChatID"] == chat_id].iloc[0]
                     if row["Donated"] != original_row["Donated"]:
-                        chats.change_active_status_for_chat(chat_id=chat_id, user_id=userid)
-                        result = asyncio.run(web_monitor.approve_room(chat_id))
-                        if result.get("status") == "success":
+                        toggled_rows.append(row)
+                if toggled_rows:
+                    # All donation changes in one DB transaction and one concurrent batch of Matrix joins
+                    result = monitor_pool.run(toggle_chats_donation(web_monitor, async_chats, [row["ChatID"] for row in toggled_rows], userid))
+                    for row in toggled_rows:
+                        if result["results"].get(row["ChatID"]):
                             if row["Donated"]: 
                                 st.toast(f"Donated Chat: {row['Chat Name']}", icon="✅")
                             else: # Remove chat from project (room is still joined)
@@ -272,18 +340,21 @@ def user_app(userid, tables_dict, password):
         with col1:
             with st.form('change_password_form'):
                 st.subheader('Change Password')
+                current_password = st.text_input('Current Password', type='password')
                 new_password = st.text_input('New Password', type='password')
                 confirm_password = st.text_input('Confirm New Password', type='password')
                 hashed_password = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
                 submitted = st.form_submit_button('Change Password')
                 if submitted:
-                    if not new_password or not confirm_password:
-                        st.error('Please fill in both password fields.')
+                    if not current_password or not new_password or not confirm_password:
+                        st.error('Please fill in all password fields.')
                     elif new_password != confirm_password:
                         st.error('Passwords do not match.')
+                    elif not bcrypt.checkpw(current_password.encode('utf-8'), user_data['HashedPassword'].encode('utf-8')):
+                        st.error('Current password is incorrect.')
                     else:
                         with st.spinner('Changing password...'):
-                            result = asyncio.run(web_monitor.change_password(new_password))
+                            result = monitor_pool.run(web_monitor.change_password(new_password, current_password))
                             if result.get('status') == 'success':
                                 json = {   # send to server
                                                 "username": userid,
@@ -296,7 +367,6 @@ def user_app(userid, tables_dict, password):
                                 else:
                                     # st.success(f"User {userid} changed password successfully!")
                                     users.change_user_password(userid, hashed_password)
-                                    password = new_password  # Update session state password
                                     
                                     st.success('Password changed successfully!')
                             else:
@@ -334,19 +404,17 @@ def user_app(userid, tables_dict, password):
                                 }
                             )
                             
-                            chats.disable_all_rooms_for_user(userid) # can be removed if the user is deleted?
-                            result = asyncio.run(web_monitor.delete_user())
-                            users.delete_user(userid)
+                            result = monitor_pool.run(delete_account(web_monitor, async_chats, async_users, userid))
                             if result.get('status') == 'success':
                                 # users.delete_user(userid)
-                                st.success('User was deleted successfully!')
+                                monitor_pool.remove(userid)
+                                st.success('Your account has been deleted. Logging out...')
+                                st.session_state["logged_in"] = False
+                                st.session_state["role"] = None
+                                st.session_state["user"] = None
+                                st.rerun()
                             else:
                                 st.error(f"Failed to delete user: {result.get('message', 'Unknown error')}")
-                            st.success('Your account has been deleted. Logging out...')
-                            st.session_state["logged_in"] = False
-                            st.session_state["role"] = None
-                            st.session_state["user"] = None
-                            st.rerun()
                         except requests.exceptions.RequestException as e:
                             st.error(f"Failed to delete account: {str(e)}")
 
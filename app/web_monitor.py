@@ -1,5 +1,5 @@
-import asyncio
 from m_monitor import MultiPlatformMessageMonitor
+from sync_worker import sync_store, start_sync_worker, stop_sync_worker
 import streamlit as st
 from PIL import Image
 from io import BytesIO
@@ -19,10 +19,47 @@ class WebMonitor:
             platforms=self.platforms
         )
 
+    def forget_password(self):
+        """
+        Drop the password after a successful login, so an idle pooled monitor holds no credentials.
+        The session is kept alive with the stored and refreshed tokens (token_store.py).
+        """
+        self.password = None
+        self.monitor.password = None
+
+    def start_background_sync(self):
+        """Keep this user's rooms up to date in the background (see sync_worker.py). Safe to call on every rerun."""
+        start_sync_worker(self.monitor)
+
+    def stop_background_sync(self):
+        """Stop the background sync of this user and drop its published rooms."""
+        stop_sync_worker(self.username)
+
+    def get_synced_chats(self, chats_blacklist=None):
+        """
+        Return the joined and invited chats published by the background sync, without any Matrix request.
+        Returns an error status while the first sync has not finished yet.
+        """
+        snapshot = sync_store.get(self.username)
+        if snapshot is None:
+            return {"status": "error", "message": "Background sync has not finished yet."}
+        chats_blacklist = chats_blacklist or set()
+        return {
+            "status": "success",
+            "joined_chats": [chat for chat in snapshot["joined"] if chat["ChatID"] not in chats_blacklist],
+            "invited_chats": [chat for chat in snapshot["invited"] if chat["ChatID"] not in chats_blacklist],
+            "bot_dms": snapshot["bot_dms"],
+            "version": snapshot["version"],
+            "updated_at": snapshot["updated_at"],
+            "error": snapshot["error"],
+        }
+
     async def login(self):
         print(f"WebMonitor: Logging in using user {self.username}")
-        """Log in to the Matrix server."""
-        success = await self.monitor.login()
+        """Log in to the Matrix server, reusing the stored tokens of an earlier login if they are still valid."""
+        success = await self.monitor.restore_session()
+        if not success and self.password:
+            success = await self.monitor.login()
         if success:
             return {"status": "success", "message": "Logged in successfully."}
         else:
@@ -41,8 +78,7 @@ class WebMonitor:
         # Initialize the WebMonitor instance
         web_monitor = WebMonitor(username=username, password=password, server_url=server_url)
         # Call the register method
-        result = asyncio.run(web_monitor.register(username, password))
-        # result = await web_monitor.register()
+        result = await web_monitor.register()
         return result
 
     async def generate_qr_code(self):
@@ -66,7 +102,10 @@ class WebMonitor:
 
 
     async def generate_qr_code_and_display(self, platform='whatsapp'):
-        """Generate a QR code for the selected platform and display it in the web app."""
+        """
+        Generate a QR code for the selected platform and return it as a PNG buffer for the web app.
+        Returns an error dict on failure (this may run on the background loop, where st.* calls are not shown).
+        """
         try:
             qr_image = await self.monitor.generate_qr(platform=platform)
             if qr_image:
@@ -75,10 +114,8 @@ class WebMonitor:
                 buffer.seek(0)
                 return buffer
             else:
-                st.error(f"Failed to generate QR code for {platform}.")
                 return {"status": "error", "message": f"Failed to generate QR code for {platform}."}
         except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
             return {"status": "error", "message": f"An error occurred: {str(e)}"}
 
     async def register_and_display_status(self):
@@ -109,7 +146,7 @@ class WebMonitor:
             st.error(f"An error occurred during login: {str(e)}")
             return {"status": "error", "message": f"An error occurred: {str(e)}"}
     
-    async def get_joined_chats(self, group=False, chats_blacklist=[]):
+    async def get_joined_chats(self, group=False, chats_blacklist=None):
         """Return a list of joined rooms/chats with platform info."""
         print(f"WebMonitor: Get joined chats for user {self.username}") 
         try:
@@ -118,7 +155,7 @@ class WebMonitor:
         except Exception as e:
             return {"status": "error", "message": f"Failed to get joined chats: {str(e)}"}
 
-    async def get_invited_chats(self, group=False, chats_blacklist=[]):
+    async def get_invited_chats(self, group=False, chats_blacklist=None):
         print(f"WebMonitor: Get invited chats for user {self.username}") 
         """Return a list of invited (pending) rooms/chats with platform info."""
         try:
@@ -149,6 +186,28 @@ class WebMonitor:
         except Exception as e:
             return {"status": "error", "message": f"An error occurred: {str(e)}"}
     
+    async def approve_rooms(self, room_ids):
+        """Approve (join) many rooms concurrently. 'results' maps each room_id to True/False."""
+        try:
+            results = await self.monitor.approve_rooms(room_ids)
+            failed = [room_id for room_id, ok in results.items() if not ok]
+            if not failed:
+                return {"status": "success", "message": f"{len(results)} rooms approved (joined) successfully.", "results": results}
+            return {"status": "error", "message": f"Failed to approve (join) {len(failed)} of {len(results)} rooms.", "results": results}
+        except Exception as e:
+            return {"status": "error", "message": f"An error occurred: {str(e)}", "results": {room_id: False for room_id in room_ids}}
+
+    async def leave_rooms(self, room_ids):
+        """Leave many rooms concurrently. 'results' maps each room_id to True/False."""
+        try:
+            results = await self.monitor.leave_rooms(room_ids)
+            failed = [room_id for room_id, ok in results.items() if not ok]
+            if not failed:
+                return {"status": "success", "message": f"{len(results)} rooms left successfully.", "results": results}
+            return {"status": "error", "message": f"Failed to leave {len(failed)} of {len(results)} rooms.", "results": results}
+        except Exception as e:
+            return {"status": "error", "message": f"An error occurred: {str(e)}", "results": {room_id: False for room_id in room_ids}}
+
     async def get_room_stats(self, room_ids):
         """Get stats for a list of room_ids (number of members in each room)."""
         try:
@@ -157,10 +216,10 @@ class WebMonitor:
         except Exception as e:
             return {"status": "error", "message": f"Failed to get room stats: {str(e)}"}
     
-    async def change_password(self, new_password):
+    async def change_password(self, new_password, current_password=None):
         """Change the password for the current user via the Matrix API."""
         try:
-            result = await self.monitor.change_password(new_password)
+            result = await self.monitor.change_password(new_password, current_password)
             if result:
                 return {"status": "success", "message": "Password changed successfully."}
             else: